@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=3s)
+"""
+import gzip
+import json
+import os
+import unittest
+from tornado.testing import AsyncHTTPTestCase
+from lightmlboard.appml import LightMLBoard
+
+
+class TestLocalAppApi(AsyncHTTPTestCase):
+
+    def get_app(self):
+        this = os.path.dirname(__file__)
+        config = os.path.join(this, "upload_options.py")
+        return LightMLBoard.make_app(config=config, logged=dict(user='xd', pwd='pwd'))
+
+    def tearDown(self):
+        self._app.evaluation_queue.shutdown()
+        AsyncHTTPTestCase.tearDown(self)
+
+    def fetch_json(self, url, code=200):
+        response = self.fetch(url)
+        self.assertEqual(response.code, code)
+        if code != 200:
+            return None
+        self.assertEqual(response.headers['Content-Type'], 'application/json; charset=UTF-8')
+        self.assertNotIn(b', ', response.body)
+        return json.loads(response.body.decode('utf-8'))
+
+    def test_api(self):
+        res = self.fetch_json('/api/competitions')
+        self.assertEqual(res['columns'], ['cpt_id', 'cpt_name', 'link', 'description', 'metrics'])
+        self.assertEqual(res['rows'], [[0, 'compet1', 'http://...', 'desc', ['mean_squared_error']]])
+
+        url = '/api/leaderboard?cpt_id=0&metric=mean_squared_error'
+        self.assertEqual(self.fetch_json(url)['rows'], [])
+        db = self._app.evaluation_queue._adb.db
+        player_id = db.get_player_id_from_login('xd')
+        for i in range(30):
+            db.submit(0, player_id, "\n".join(["c1"] + ["0.{0}".format(i % 10)] * 115) + "\n")
+
+        res = self.fetch_json(url + '&top=100')
+        self.assertEqual(res['cpt_id'], 0)
+        self.assertEqual(res['columns'][:3], ['rank', 'player_name', 'team_name'])
+        self.assertEqual(len(res['rows']), 1)
+        self.assertEqual(res['rows'][0][:3], [1, 'xx', 'team1'])
+
+        res = self.fetch_json('/api/submissions')
+        self.assertEqual(res['player'], 'xd')
+        self.assertEqual(res['columns'], ['sub_id', 'cpt_id', 'date', 'metric', 'metric_value'])
+        self.assertEqual(len(res['rows']), 30)
+        self.assertEqual(len(self.fetch_json('/api/submissions?player=xd&cpt_id=0&limit=5')['rows']), 5)
+        self.assertEqual(len(self.fetch_json('/api/submissions?cpt_id=1')['rows']), 0)
+
+        # compression
+        response = self.fetch('/api/submissions', headers={'Accept-Encoding': 'gzip'},
+                              decompress_response=False)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.body))['rows']), 30)
+
+        # errors
+        self.fetch_json('/api/submissions?player=unknown', 404)
+        self.fetch_json('/api/leaderboard?cpt_id=a&metric=mean_squared_error', 400)
+        self.fetch_json('/api/leaderboard?cpt_id=0', 400)
+        # a negative limit would remove the limit of the query
+        self.fetch_json(url + '&top=-1', 400)
+        self.fetch_json(url + '&top=0', 400)
+        self.fetch_json('/api/submissions?limit=-1', 400)
+        self.assertEqual(len(self.fetch_json('/api/submissions?limit=1')['rows']), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -27,6 +27,7 @@ class TestLocalAppChallenge(AsyncHTTPTestCase):
         self.assertEqual(response.code, 200)
         self.assertIn(b"<p>La m", response.body)
         self.assertIn(b"<table border", response.body)
+        self.assertIn(b"Soumissions", response.body)
         temp = get_temp_folder(__file__, "temp_local_challe nge")
         page = os.path.join(temp, "challenge.html")
         with open(page, "wb") as f:
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=3s)
+"""
+import os
+import unittest
+from tornado.testing import AsyncHTTPTestCase
+from lightmlboard.appml import LightMLBoard
+
+
+class TestLocalAppEtag(AsyncHTTPTestCase):
+
+    def get_app(self):
+        this = os.path.dirname(__file__)
+        config = os.path.join(this, "upload_options.py")
+        return LightMLBoard.make_app(config=config, logged=dict(user='xd', pwd='pwd'))
+
+    def tearDown(self):
+        self._app.evaluation_queue.shutdown()
+        AsyncHTTPTestCase.tearDown(self)
+
+    def test_etag(self):
+        db = self._app.evaluation_queue._adb.db
+        response = self.fetch('/competition?cpt_id=0')
+        self.assertEqual(response.code, 200)
+        etag = response.headers['Etag']
+        self.assertEqual(response.headers['Vary'], 'Cookie, Accept-Encoding')
+
+        # conditional request, the database is not queried
+        calls = []
+        db.get_competition = lambda *args: calls.append(args)
+        response = self.fetch('/competition?cpt_id=0', headers={'If-None-Match': etag})
+        self.assertEqual(response.code, 304)
+        self.assertEqual(response.body, b'')
+        # the page comes from the cache
+        response = self.fetch('/competition?cpt_id=0')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['Etag'], etag)
+        self.assertEqual(calls, [])
+        del db.get_competition
+        # other arguments, other page
+        response = self.fetch('/competition?cpt_id=0&limit=5')
+        self.assertNotEqual(response.headers['Etag'], etag)
+
+        # a submission changes the version
+        pred = "\n".join(["c1"] + ["0.5"] * 115) + "\n"
+        db.submit(0, db.get_player_id_from_login('xd'), pred)
+        response = self.fetch('/competition?cpt_id=0', headers={'If-None-Match': etag})
+        self.assertEqual(response.code, 200)
+        self.assertNotEqual(response.headers['Etag'], etag)
+        self.assertIn(b"0.25", response.body)
+        self.assertEqual(self.fetch('/competition?cpt_id=a').code, 400)
+        self.assertEqual(self.fetch('/competition?cpt_id=0&top=a').code, 400)
+        self.assertEqual(self.fetch('/competition?cpt_id=0&top=-1').code, 400)
+        self.assertEqual(self.fetch('/competition?cpt_id=0&top=5000').code, 200)
+        self.assertEqual(self.fetch('/competition?cpt_id=0&limit=a').code, 400)
+        # a negative limit would return the whole history
+        self.assertEqual(self.fetch('/competition?cpt_id=0&limit=-2').code, 400)
+        self.assertEqual(self.fetch('/competition?cpt_id=0&after=abc').code, 400)
+        self.assertEqual(self.fetch('/competition?cpt_id=0&after=a:b').code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=3s)
+"""
+import asyncio
+import json
+import os
+import unittest
+from tornado.testing import AsyncHTTPTestCase, gen_test
+from lightmlboard.appml import LightMLBoard
+from lightmlboard.live import LiveBroadcaster
+
+
+class _Subscriber:
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+    def stop(self):
+        pass
+
+
+class TestLocalAppLive(AsyncHTTPTestCase):
+
+    def get_app(self):
+        this = os.path.dirname(__file__)
+        config = os.path.join(this, "upload_options.py")
+        return LightMLBoard.make_app(config=config, logged=dict(user='xd', pwd='pwd'))
+
+    def tearDown(self):
+        self._app.evaluation_queue.shutdown()
+        AsyncHTTPTestCase.tearDown(self)
+
+    async def wait_for(self, cond):
+        for _ in range(200):
+            if cond():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("timeout")
+
+    @gen_test
+    async def test_live(self):
+        live = self._app.live
+        db = self._app.evaluation_queue._adb.db
+        chunks = []
+        fut = self.http_client.fetch(self.get_url('/live?cpt_id=0'), streaming_callback=chunks.append,
+                                     headers={'Accept-Encoding': 'gzip'}, decompress_response=False)
+        await self.wait_for(lambda: live.count(0) == 1)
+        pred = "\n".join(["c1"] + ["0.5"] * 115) + "\n"
+        db.submit(0, db.get_player_id_from_login('xd'), pred)
+        await self.wait_for(lambda: b"event: score" in b"".join(chunks))
+        live.close()
+        response = await fut
+        self.assertEqual(response.headers['Content-Type'], 'text/event-stream')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(live.count(), 0)
+
+        events = b"".join(chunks).decode('utf-8').split("\n\n")
+        self.assertEqual(events[0], "retry: 5000")
+        lines = events[1].split("\n")
+        self.assertEqual(lines[:2], ["id: 1", "event: score"])
+        data = json.loads(lines[2][len("data: "):])
+        self.assertEqual(data['cpt_id'], 0)
+        self.assertEqual(data['version'], 1)
+        delta = data['deltas'][0]
+        self.assertEqual(delta['player'], 'xx')
+        self.assertEqual(delta['metric'], 'mean_squared_error')
+        self.assertEqual(delta['rank'], 1)
+        self.assertAlmostEqual(delta['score'], 0.25)
+
+        # a client which missed events is asked to reload
+        chunks.clear()
+        fut = self.http_client.fetch(self.get_url('/live?cpt_id=0'), streaming_callback=chunks.append,
+                                     headers={'Last-Event-ID': '0'})
+        await self.wait_for(lambda: b"event: reload" in b"".join(chunks))
+        live.close()
+        await fut
+
+    @gen_test
+    async def test_live_watch(self):
+        # the versions are changed by another process
+        versions = {0: 3}
+        live = LiveBroadcaster(heartbeat=0)
+        live.watch(versions.get, interval=0.01)
+        sub = _Subscriber()
+        live.subscribe(0, sub)
+        await asyncio.sleep(0.05)
+        self.assertEqual(sub.messages, [])
+        versions[0] = 4
+        await self.wait_for(lambda: len(sub.messages) == 1)
+        self.assertEqual(sub.messages[0], b'id: 4\nevent: reload\ndata: {"cpt_id":0,"version":4}\n\n')
+        # an event published by this process is not sent twice
+        versions[0] = 5
+        live.publish(0, 5, [])
+        await self.wait_for(lambda: len(sub.messages) == 2)
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(sub.messages), 2)
+        self.assertIn(b"event: score", sub.messages[1])
+        live.unsubscribe(0, sub)
+        self.assertIsNone(live._watcher)
+
+    def test_live_errors(self):
+        self.assertEqual(self.fetch('/live?cpt_id=a').code, 400)
+        self.assertEqual(self.fetch('/live?cpt_id=7').code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
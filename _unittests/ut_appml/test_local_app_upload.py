@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=3s)
+"""
+import json
+import os
+import time
+import unittest
+from tornado.testing import AsyncHTTPTestCase
+from lightmlboard.appml import LightMLBoard
+
+
+class TestLocalAppUpload(AsyncHTTPTestCase):
+
+    def get_app(self):
+        this = os.path.dirname(__file__)
+        config = os.path.join(this, "upload_options.py")
+        return LightMLBoard.make_app(config=config, logged=dict(user='xd', pwd='pwd'))
+
+    def tearDown(self):
+        self._app.evaluation_queue.shutdown()
+        AsyncHTTPTestCase.tearDown(self)
+
+    def test_local_upload(self):
+        boundary = "----lightmlboard"
+        pred = "\n".join(["c1"] + ["0.5"] * 115) + "\n"
+        body = "\r\n".join([
+            "--" + boundary,
+            'Content-Disposition: form-data; name="competition"', "", "0",
+            "--" + boundary,
+            'Content-Disposition: form-data; name="_xsrf"', "", "xsrftoken",
+            "--" + boundary,
+            'Content-Disposition: form-data; name="filearg"; filename="pred.csv"',
+            "Content-Type: text/csv", "", pred,
+            "--" + boundary + "--", ""])
+        headers = {"Content-Type": "multipart/form-data; boundary=" + boundary,
+                   "Cookie": "_xsrf=xsrftoken"}
+        response = self.fetch('/upload', method="POST", body=body, headers=headers)
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"/status?job=", response.body)
+        job_id = response.body.split(b"/status?job=")[1].split(b'"')[0].decode('ascii')
+
+        for _ in range(200):
+            response = self.fetch('/status?job=' + job_id)
+            self.assertEqual(response.code, 200)
+            status = json.loads(response.body.decode('utf-8'))
+            if status['status'] in ('done', 'failed'):
+                break
+            time.sleep(0.05)
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(list(status['scores']), ['mean_squared_error'])
+        self.assertEqual(status['info']['method'], 'typed')
+
+        response = self.fetch('/status?job=unknown')
+        self.assertEqual(response.code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=3s)
+"""
+import hashlib
+import os
+import unittest
+from tornado.testing import AsyncHTTPTestCase
+from lightmlboard.appml import LightMLBoard
+
+
+class TestLocalAppUploadStream(AsyncHTTPTestCase):
+
+    boundary = "----lightmlboard"
+    pred = "\n".join(["c1"] + ["0.5"] * 115) + "\n"
+
+    def get_app(self):
+        this = os.path.dirname(__file__)
+        expected = os.path.join(this, "..", "ut_db", "data", "off_eval_all_Y.txt")
+        config = dict(allowed_users=os.path.join(this, "users.txt"), upload_max_bytes=10000,
+                      competitions=[dict(cpt_id=0, name="compet1", link="", description="",
+                                         expected_values=expected, metric="mean_squared_error"),
+                                    dict(cpt_id=1, name="compet2", link="", description="",
+                                         expected_values=expected, metric="mean_squared_error",
+                                         schema=dict(columns=1, max_bytes=300))])
+        return LightMLBoard.make_app(config=config, logged=dict(user='xd', pwd='pwd'))
+
+    def tearDown(self):
+        self._app.evaluation_queue.shutdown()
+        AsyncHTTPTestCase.tearDown(self)
+
+    def upload(self, pred, cpt_id=0, xsrf="xsrftoken", url='/upload', headers=None, body=None):
+        parts = []
+        if xsrf is not None:
+            parts.extend(["--" + self.boundary,
+                          'Content-Disposition: form-data; name="_xsrf"', "", xsrf])
+        parts.extend([
+            "--" + self.boundary,
+            'Content-Disposition: form-data; name="competition"', "", str(cpt_id),
+            "--" + self.boundary,
+            'Content-Disposition: form-data; name="filearg"; filename="pred.csv"',
+            "Content-Type: text/csv", "", pred,
+            "--" + self.boundary + "--", ""])
+        if body is None:
+            body = "\r\n".join(parts)
+        all_headers = {"Content-Type": "multipart/form-data; boundary=" + self.boundary,
+                       "Cookie": "_xsrf=xsrftoken"}
+        all_headers.update(headers or {})
+        return self.fetch(url, method="POST", body=body, headers=all_headers, raise_error=False)
+
+    def test_upload_stream(self):
+        response = self.upload(self.pred)
+        self.assertEqual(response.code, 200)
+        job_id = response.body.split(b"/status?job=")[1].split(b'"')[0].decode('ascii')
+        db = self._app.evaluation_queue._adb.db
+        job = db.get_job(job_id)
+        key = hashlib.sha256(self.pred.encode('ascii')).hexdigest()
+        self.assertEqual(list(db.execute("SELECT data FROM jobs WHERE job_id=?", (job_id,))), [(key,)])
+        self.assertEqual(db.get_payload(key), self.pred)
+        self.assertEqual(job['cpt_id'], 0)
+
+        # token in a header
+        response = self.upload(self.pred, xsrf=None, headers={"X-Xsrftoken": "xsrftoken"})
+        self.assertEqual(response.code, 200)
+
+    def test_upload_errors(self):
+        # missing or wrong token
+        self.assertEqual(self.upload(self.pred, xsrf=None).code, 403)
+        self.assertEqual(self.upload(self.pred, xsrf="wrong").code, 403)
+        # the body is larger than the application limit
+        self.assertEqual(self.upload("c1\n" + "0.5\n" * 30000).code, 413)
+        # the file is larger than the limit of the competition
+        self.assertEqual(self.upload(self.pred, cpt_id=1).code, 413)
+        self.assertEqual(self.upload(self.pred, cpt_id=1, url='/upload?competition=1').code, 413)
+        self.assertEqual(self.upload("c1\n0.5\n", cpt_id=1).code, 200)
+        # malformed requests
+        self.assertEqual(self.upload(self.pred, cpt_id=5).code, 400)
+        self.assertEqual(self.upload(self.pred, body="--" + self.boundary + "\r\n").code, 400)
+        self.assertEqual(self.upload(self.pred, headers={"Content-Type": "text/csv"}).code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
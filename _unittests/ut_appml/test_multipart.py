@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import unittest
+from pyquickhelper.pycode import ExtTestCase
+from lightmlboard.multipart import MultipartStreamParser, parse_boundary, parse_disposition
+
+
+class TestMultipart(ExtTestCase):
+
+    body = b"\r\n".join([
+        b"--xyz",
+        b'Content-Disposition: form-data; name="competition"', b"", b"0",
+        b"--xyz",
+        b'Content-Disposition: form-data; name="filearg"; filename="pred.csv"',
+        b"Content-Type: text/csv", b"", b"c1\r\n0.5\r\n--xy\r\n",
+        b"--xyz--", b""])
+
+    def _parse(self, chunk_size):
+        parser = MultipartStreamParser(b"xyz")
+        events = []
+        for i in range(0, len(self.body), chunk_size):
+            events.extend(parser.feed(self.body[i:i + chunk_size]))
+        parser.close()
+        # data events are merged
+        merged = []
+        for ev in events:
+            if ev[0] == 'data' and merged and merged[-1][0] == 'data':
+                merged[-1] = ('data', merged[-1][1] + ev[1])
+            else:
+                merged.append(ev)
+        return merged
+
+    def test_parse_boundary(self):
+        self.assertEqual(parse_boundary("multipart/form-data; boundary=xyz"), b"xyz")
+        self.assertEqual(parse_boundary('multipart/form-data; boundary="x y"'), b"x y")
+        self.assertRaise(lambda: parse_boundary("application/json"), ValueError)
+        self.assertRaise(lambda: parse_boundary(None), ValueError)
+        self.assertRaise(lambda: parse_boundary("multipart/form-data"), ValueError)
+        self.assertEqual(parse_disposition('form-data; name="a"; filename="b \\"c\\".csv"'),
+                         dict(name="a", filename='b "c".csv'))
+
+    def test_parse(self):
+        expected = None
+        for size in [len(self.body), 1, 3, 7, 64]:
+            events = self._parse(size)
+            self.assertEqual([ev[0] for ev in events], ['begin', 'data', 'end', 'begin', 'data', 'end'])
+            self.assertEqual(events[0][1:3], ('competition', None))
+            self.assertEqual(events[1][1], b"0")
+            self.assertEqual(events[3][1:3], ('filearg', 'pred.csv'))
+            self.assertEqual(events[3][3]['content-type'], 'text/csv')
+            self.assertEqual(events[4][1], b"c1\r\n0.5\r\n--xy\r\n")
+            if expected is None:
+                expected = events
+            self.assertEqual(events, expected)
+
+    def test_errors(self):
+        parser = MultipartStreamParser(b"xyz")
+        parser.feed(self.body[:-10])
+        self.assertFalse(parser.done)
+        self.assertRaise(parser.close, ValueError)
+        self.assertRaise(lambda: MultipartStreamParser(b"xyz").feed(b"--xyzAB"), ValueError)
+        self.assertRaise(lambda: MultipartStreamParser(b"xyz").feed(b"--xyz\r\n\r\n\r\n"), ValueError)
+        self.assertRaise(lambda: MultipartStreamParser(b"xyz", max_header_size=10).feed(
+            b"--xyz\r\n" + b"a" * 20), ValueError)
+        self.assertRaise(lambda: MultipartStreamParser(b"xyz", max_parts=1).feed(self.body), ValueError)
+
+
+if __name__ == "__main__":
+    unittest.main()
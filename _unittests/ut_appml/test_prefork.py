@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=10s)
+"""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import unittest
+import urllib.request
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from lightmlboard.appml import LightMLBoard
+from lightmlboard.prefork import PreforkSupervisor
+
+
+class TestPrefork(ExtTestCase):
+
+    def test_prefork_errors(self):
+        this = os.path.dirname(__file__)
+        config = os.path.join(this, "upload_options.py")
+        self.assertRaise(lambda: LightMLBoard.start_app(processes=2, config=config), ValueError)
+        self.assertRaise(lambda: PreforkSupervisor(-1), ValueError)
+        self.assertEqual(PreforkSupervisor(0).processes, os.cpu_count() or 1)
+
+    def fetch(self, port, path):
+        with urllib.request.urlopen("http://127.0.0.1:{0}{1}".format(port, path), timeout=5) as f:
+            return json.loads(f.read().decode('utf-8'))
+
+    @unittest.skipIf(sys.platform == "win32", reason="os.fork is not available")
+    def test_prefork(self):
+        temp = get_temp_folder(__file__, "temp_prefork")
+        dbfile = os.path.join(temp, "prefork.db3")
+        if os.path.exists(dbfile):
+            os.remove(dbfile)
+        config = os.path.join(os.path.dirname(__file__), "upload_options.py")
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        src = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+        code = ("from lightmlboard.appml import LightMLBoard\n"
+                "LightMLBoard.start_app(port={0}, processes=2, shutdown_timeout=5, config={1!r}, "
+                "dbfile={2!r}, logged=dict(user='xd', pwd='pwd'))").format(port, config, dbfile)
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join([src, env.get('PYTHONPATH', '')])
+        proc = subprocess.Popen([sys.executable, "-c", code], env=env)
+        try:
+            for _ in range(300):
+                try:
+                    res = self.fetch(port, "/api/competitions")
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            else:
+                raise AssertionError("The server did not start.")
+            self.assertEqual([r[0] for r in res['rows']], [0])
+
+            # the processes are restarted one after another
+            proc.send_signal(signal.SIGHUP)
+            begin = time.perf_counter()
+            while time.perf_counter() - begin < 2:
+                res = self.fetch(port, "/api/competitions")
+                self.assertEqual(len(res['rows']), 1)
+                time.sleep(0.05)
+
+            proc.send_signal(signal.SIGTERM)
+            self.assertEqual(proc.wait(timeout=30), 0)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,14 @@
+import os
+
+
+class TestUploadOptions:
+
+    allowed_users = os.path.join(os.path.dirname(__file__), "users.txt")
+
+    competitions = [dict(cpt_id=0,
+                         name="compet1",
+                         link="http://...",
+                         expected_values=os.path.join(
+                             os.path.dirname(__file__), "..", "ut_db", "data", "off_eval_all_Y.txt"),
+                         description="desc",
+                         metric="mean_squared_error")]
@@ -3,9 +3,11 @@
 @brief      test log(time=1s)
 """
 import unittest
+import pandas
 from pyquickhelper.pycode import ExtTestCase
 from lightmlboard.competition import Competition
 from lightmlboard.default_options import LightMLBoardDefaultOptions
+from lightmlboard.metrics.streaming import StreamingJaccard
 
 
 class TestCompetition(ExtTestCase):
@@ -17,6 +19,23 @@ class TestCompetition(ExtTestCase):
         ds2 = [v.to_dict() for v in vals2]
         self.assertEqual(ds, ds2)
 
+    def test_competition_keys(self):
+        # the first column holds the keys, it is not scored
+        exp = pandas.DataFrame({'id': ['a', 'b'], 'v': ['x', 'z']})
+        cpt = Competition(0, "/c", "c", "d", "multi_label_jaccard", expected_values=exp)
+        self.assertEqual(cpt.evaluate("id,v\na,y\nb,w\n"), {'multi_label_jaccard': 0.})
+        self.assertEqual(cpt.evaluate("id,v\nb,z\na,x\n"), {'multi_label_jaccard': 1.})
+        stream = StreamingJaccard().update(exp, pandas.DataFrame({'id': ['a', 'b'], 'v': ['y', 'w']}))
+        self.assertEqual(stream.result(), 0.)
+
+        exp = pandas.DataFrame({'id': [0, 1], 'v': [10., 100.]})
+        cpt = Competition(0, "/c", "c", "d", "l1_reg_max", expected_values=exp)
+        res = cpt.evaluate("id,v\n0,20\n1,200\n")
+        self.assertAlmostEqual(res['l1_reg_max'], (10. / 180 + 80. / 180) / 2)
+        res = cpt.evaluate_batch(["id,v\n1,200\n0,20\n", "id,v\n0,10\n1,100\n"])
+        self.assertAlmostEqual(res['l1_reg_max'][0], 0.25)
+        self.assertEqual(res['l1_reg_max'][1], 0.)
+
 
 if __name__ == "__main__":
     unittest.main()
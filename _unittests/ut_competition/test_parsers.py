@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import unittest
+import numpy
+from pyquickhelper.pycode import ExtTestCase
+from lightmlboard.competition import Competition
+from lightmlboard.parsers import PredictionSchema, parse_predictions
+
+
+class TestParsers(ExtTestCase):
+
+    def test_schema(self):
+        sch = PredictionSchema(names=["a", "b"], dtype='float32')
+        self.assertEqual(sch.columns, 2)
+        self.assertEqual(PredictionSchema.load(sch.to_json()), sch)
+        self.assertEqual(PredictionSchema.load(sch.to_dict()), sch)
+        self.assertIsNone(PredictionSchema.load(None))
+        self.assertRaise(lambda: PredictionSchema(dtype='str'), ValueError)
+        self.assertRaise(lambda: PredictionSchema(columns=1, names=["a", "b"]), ValueError)
+        self.assertRaise(lambda: PredictionSchema.load(5), TypeError)
+
+    def test_parse_typed(self):
+        data = b"a,b\n0.5,1\n0.25,2\n"
+        df, info = parse_predictions(data, PredictionSchema(names=["a", "b"]))
+        self.assertEqual(info['method'], 'typed')
+        self.assertEqual(info['rows'], 2)
+        self.assertGreater(info['parse_time'], 0)
+        self.assertEqual(list(df.dtypes), [numpy.float64, numpy.float64])
+        self.assertEqual(df.values.tolist(), [[0.5, 1], [0.25, 2]])
+        df, info = parse_predictions(data.decode('ascii'), dict(dtype='float32'))
+        self.assertEqual(info['method'], 'typed')
+        self.assertEqual(list(df.dtypes), [numpy.float32, numpy.float32])
+        # BOM and quotes in the header
+        df, info = parse_predictions(b'\xef\xbb\xbf"a",b\n1,2\n', PredictionSchema(names=["a", "b"]))
+        self.assertEqual(list(df.columns), ["a", "b"])
+
+    def test_parse_errors(self):
+        sch = PredictionSchema(names=["a", "b"])
+        self.assertRaise(lambda: parse_predictions(b"a,c\n1,2\n", sch), ValueError)
+        self.assertRaise(lambda: parse_predictions(b"a\n1\n", sch), ValueError)
+        self.assertRaise(lambda: parse_predictions(b"a\n1\n", PredictionSchema(columns=2)), ValueError)
+        self.assertRaise(lambda: parse_predictions(b"", sch), ValueError)
+        self.assertRaise(lambda: parse_predictions(b"\xff\xfe\n1\n", sch), ValueError)
+        self.assertRaise(lambda: parse_predictions(5, sch), TypeError)
+        # a row with more values than the header is not shifted
+        self.assertRaise(lambda: parse_predictions(b"a,b\n1,2,3\n", sch), ValueError)
+        self.assertRaise(lambda: parse_predictions("a,b\n1,2,3\n4,5\n", sch), ValueError)
+        self.assertRaise(lambda: parse_predictions(b"a,b\n1,2\n1,2,3\n", sch), ValueError)
+        df, _ = parse_predictions(b"a,b\n1,2,\n3,4,\n", sch)
+        self.assertEqual(df.to_dict('list'), {'a': [1., 3.], 'b': [2., 4.]})
+
+    def test_parse_fallback(self):
+        df, info = parse_predictions(b"a,b\n1,x\n2,y\n")
+        self.assertEqual(info['method'], 'pandas')
+        self.assertEqual(list(df['b']), ['x', 'y'])
+        df, info = parse_predictions(b"a\n1\n\n2\n", dict(dtype='int64'))
+        self.assertEqual(info['method'], 'typed')
+        df, info = parse_predictions(b"a\n1\nNA\n2\n", dict(dtype='int64'))
+        self.assertEqual(info['method'], 'pandas')
+        self.assertEqual(list(df.dtypes), [numpy.float64])
+        self.assertRaise(lambda: parse_predictions(b"a\n1\n1,2\n"), ValueError)
+
+    def test_competition(self):
+        cp = Competition(cpt_id=0, link='', name='', description='', metric='mse',
+                         expected_values=[1., 0., 1.], schema=dict(columns=1))
+        res = cp.evaluate(b"p\n1\n0\n0\n")
+        self.assertEqual(res, {'mse': 1. / 3})
+        self.assertEqual(cp.parse_info['method'], 'typed')
+        self.assertEqual(cp.evaluate([1., 0., 1.]), {'mse': 0.})
+        self.assertIsNone(cp.parse_info)
+        self.assertRaise(lambda: cp.evaluate(b"p,q\n1,2\n"), ValueError)
+        d = cp.to_dict()
+        self.assertEqual(d['schema'], PredictionSchema(columns=1).to_dict())
+        self.assertEqual(Competition(**d).schema, cp.schema)
+
+
+if __name__ == "__main__":
+    unittest.main()
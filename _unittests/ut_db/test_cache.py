@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import os
+import unittest
+from io import StringIO
+import numpy
+import pandas
+from pyquickhelper.pycode import ExtTestCase
+from lightmlboard.cache import GroundTruthCache, fingerprint
+from lightmlboard.dbmanager import DatabaseCompetition
+
+
+class TestCache(ExtTestCase):
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint("a,b\n1,2\n"), fingerprint(b"a,b\n1,2\n"))
+        self.assertNotEqual(fingerprint("a,b\n1,2\n"), fingerprint("a,b\n1,3\n"))
+
+    def test_cache_lru(self):
+        cache = GroundTruthCache(max_bytes=160)
+        a = numpy.zeros((10,), dtype=numpy.float64)
+        cache.put(0, "f0", a)
+        cache.put(1, "f1", a + 1)
+        self.assertEqual(len(cache), 2)
+        self.assertEqualArray(cache.get(0, "f0"), a)
+        cache.put(2, "f2", a + 2)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(1, "f1"))
+        self.assertEqualArray(cache.get(0, "f0"), a)
+        st = cache.stats()
+        self.assertEqual(st['hits'], 2)
+        self.assertEqual(st['misses'], 1)
+        self.assertEqual(st['evictions'], 1)
+        self.assertEqual(st['nbytes'], 160)
+
+    def test_cache_invalidate(self):
+        cache = GroundTruthCache()
+        a = numpy.zeros((10,), dtype=numpy.float64)
+        cache.put(0, "f0", a)
+        cache.put(0, "f1", a + 1)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get(0, "f0"))
+        self.assertEqual(cache.get(0, "g", lambda: a + 2)[0], 2)
+        self.assertEqual(len(cache), 1)
+        cache.invalidate(0)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nbytes, 0)
+
+    def test_cache_too_big(self):
+        cache = GroundTruthCache(max_bytes=8)
+        cache.put(0, "f0", numpy.zeros((10,)))
+        self.assertEqual(len(cache), 0)
+
+    def test_submission_cache(self):
+        data = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+        fname = os.path.join(data, "off_eval_all_Y.txt")
+        df = pandas.read_csv(fname)
+        pred = [0.9 if v else 0.1 for v in df.hasE]
+        dfpred = pandas.DataFrame(pred, columns=["c1"])
+        s = StringIO()
+        dfpred.to_csv(s, index=False)
+        sub = s.getvalue()
+
+        db = DatabaseCompetition(":memory:")
+        opt = os.path.join(data, "ex_default_options.py")
+        db.init_from_options(opt)
+        db.connect()
+        db.submit(0, 0, sub)
+        db.submit(0, 0, sub)
+        st = db.cache_stats()
+        self.assertEqual(st['misses'], 1)
+        self.assertEqual(st['hits'], 1)
+        self.assertEqual(st['size'], 1)
+        subs = list(db.execute("SELECT metric_value FROM submissions"))
+        db.close()
+        self.assertEqual(len(subs), 3)
+        self.assertEqual(subs[1], subs[2])
+        db.invalidate_cache()
+        self.assertEqual(db.cache_stats()['size'], 0)
+
+        # a missing fingerprint is computed and stored
+        db.connect()
+        fp = list(db.execute("SELECT expected_fingerprint FROM competitions"))[0][0]
+        self.assertEqual(len(fp), 40)
+        with db.transaction():
+            db.execute("UPDATE competitions SET expected_fingerprint=NULL")
+        db.submit(0, 0, sub)
+        fp2 = list(db.execute("SELECT expected_fingerprint FROM competitions"))[0][0]
+        self.assertEqual(fp, fp2)
+        db.submit(0, 0, sub)
+        self.assertEqual(db.cache_stats()['hits'], 2)
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
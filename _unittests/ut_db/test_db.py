@@ -19,7 +19,8 @@ class TestDb(ExtTestCase):
         dbl = db.get_table_list()
         db.close()
         self.assertEqual(
-            dbl, ['competitions', 'players', 'submissions', 'teams'])
+            dbl, ['competitions', 'jobs', 'leaderboard', 'leaderboard_teams', 'payloads', 'players',
+                  'schema_version', 'submissions', 'teams', 'versions'])
 
     def test_creation_file(self):
         temp = get_temp_folder(__file__, "temp_creation_file")
@@ -29,7 +30,8 @@ class TestDb(ExtTestCase):
         dbl = db.get_table_list()
         db.close()
         self.assertEqual(
-            dbl, ['competitions', 'players', 'submissions', 'teams'])
+            dbl, ['competitions', 'jobs', 'leaderboard', 'leaderboard_teams', 'payloads', 'players',
+                  'schema_version', 'submissions', 'teams', 'versions'])
         self.assertExists(name)
 
     def test_creation_db(self):
@@ -42,11 +44,19 @@ class TestDb(ExtTestCase):
         dfp = db.to_df("players")
         dfc = db.to_df("competitions")
         dfs = db.to_df("submissions")
+        chunks = list(db.to_df("players", chunksize=1))
+        dfp2 = db.to_df("players", columns=["player_id", "login"], where="player_id >= ?",
+                        params=(0,))
+        empty = db.to_df("players", columns=["login"], where="player_id < 0")
         db.close()
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0].shape, (1, 7))
+        self.assertEqual(dfp2.shape, (1, 2))
+        self.assertEqual(empty.shape, (0, 1))
         self.assertEqual(dft.shape, (1, 2))
         self.assertEqual(dft.iloc[0, 1], "team1")  # pylint: disable=E1101
         self.assertEqual(dfp.shape, (1, 7))
-        self.assertEqual(dfc.shape, (1, 7))
+        self.assertEqual(dfc.shape, (1, 9))
         self.assertEqual(dfs.shape, (1, 7))
 
     def test_submission(self):
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import os
+import unittest
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from lightmlboard.dbengine import Database
+from lightmlboard.dbmanager import DatabaseCompetition
+
+
+class TestDbMigration(ExtTestCase):
+
+    def test_schema_version(self):
+        db = DatabaseCompetition(":memory:")
+        db.connect()
+        self.assertEqual(db.get_schema_version(),
+                         DatabaseCompetition._migrations[-1][0])
+        db.close()
+
+    def test_query_plan(self):
+        db = DatabaseCompetition(":memory:")
+        data = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+        db.init_from_options(os.path.join(data, "ex_default_options.py"))
+        db.connect()
+        plan = "\n".join(str(row) for row in db.execute(
+            "EXPLAIN QUERY PLAN " + DatabaseCompetition._sql_results, (0,)))
+        self.assertIn("idx_submissions_cpt", plan)
+        self.assertIn("idx_players", plan)
+        self.assertIn("idx_teams", plan)
+        self.assertNotIn("SCAN A", plan)
+
+        plan = "\n".join(str(row) for row in db.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM submissions WHERE player_id=? AND cpt_id=? "
+            "ORDER BY date", (0, 0)))
+        self.assertIn("idx_submissions_player", plan)
+        plan = "\n".join(str(row) for row in db.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM competitions WHERE cpt_id=?", (0,)))
+        self.assertIn("idx_competitions", plan)
+        db.close()
+
+    def test_upgrade(self):
+        temp = get_temp_folder(__file__, "temp_upgrade")
+        name = os.path.join(temp, "old.db3")
+        if os.path.exists(name):
+            os.remove(name)
+        # database created by the first version of the module
+        old = Database(name)
+        old.connect()
+        cols = DatabaseCompetition._col_competitions()
+        old.create_table("competitions", [c for c in cols if c[0] != 'expected_fingerprint'])
+        old.create_table("teams", DatabaseCompetition._col_teams())
+        old.create_table("players", DatabaseCompetition._col_players())
+        old.create_table("submissions", DatabaseCompetition._col_submissions())
+        old.execute("INSERT INTO teams (team_id, team_name) VALUES (0, 't')")
+        old.commit()
+        old.close()
+
+        db = DatabaseCompetition(name)
+        db.connect()
+        self.assertEqual(db.get_schema_version(),
+                         DatabaseCompetition._migrations[-1][0])
+        self.assertIn("expected_fingerprint", db.get_column_names("competitions"))
+        indexes = set(row[0] for row in db.execute(
+            "SELECT name FROM sqlite_master WHERE type='index'"))
+        self.assertTrue(indexes.issuperset(set(i[0] for i in DatabaseCompetition._indexes)))
+        self.assertEqual(list(db.execute("SELECT * FROM teams")), [(0, 't')])
+        nb = list(db.execute("SELECT COUNT(*) FROM schema_version"))[0][0]
+        db.close()
+
+        # nothing happens the second time
+        db = DatabaseCompetition(name)
+        db.connect()
+        self.assertEqual(list(db.execute("SELECT COUNT(*) FROM schema_version"))[0][0], nb)
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
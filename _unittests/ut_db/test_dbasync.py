@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import os
+import threading
+import time
+import unittest
+from io import StringIO
+import pandas
+from tornado.testing import AsyncTestCase, gen_test
+from tornado import gen
+from pyquickhelper.pycode import get_temp_folder
+from lightmlboard.dbmanager import DatabaseCompetition
+from lightmlboard.dbasync import AsyncDatabaseCompetition, QueueFullError
+
+
+class TestDbAsync(AsyncTestCase):
+
+    def _data(self):
+        data = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+        df = pandas.read_csv(os.path.join(data, "off_eval_all_Y.txt"))
+        s = StringIO()
+        pandas.DataFrame([0.9 if v else 0.1 for v in df.hasE],
+                         columns=["c1"]).to_csv(s, index=False)
+        return os.path.join(data, "ex_default_options.py"), s.getvalue()
+
+    @gen_test
+    async def test_async_memory(self):
+        opt, sub = self._data()
+        db = DatabaseCompetition(":memory:")
+        db.init_from_options(opt)
+        adb = AsyncDatabaseCompetition(db, max_workers=4)
+        self.assertEqual(adb.max_workers, 1)
+        cpts = await adb.get_competitions()
+        self.assertEqual(cpts, [(0, 'compet1')])
+        await adb.submit(0, 0, sub)
+        board = await adb.get_leaderboard(0, "mean_squared_error")
+        self.assertEqual(board.shape[0], 1)
+        cpt = await adb.get_competition(0)
+        self.assertEqual(cpt.name, 'compet1')
+        res = await adb.get_results(0)
+        self.assertEqual(res.shape[0], 1)
+        self.assertEqual(adb.pending, 0)
+        adb.shutdown()
+
+    @gen_test
+    async def test_async_pool(self):
+        opt, sub = self._data()
+        temp = get_temp_folder(__file__, "temp_async_pool")
+        name = os.path.join(temp, "pool.db3")
+        if os.path.exists(name):
+            os.remove(name)
+        db = DatabaseCompetition(name, pool=True)
+        db.connect()
+        db.init_from_options(opt)
+        adb = AsyncDatabaseCompetition(db, max_workers=3)
+        main = threading.get_ident()
+        threads = await gen.multi([adb.run(threading.get_ident) for i in range(10)])
+        self.assertNotIn(main, threads)
+        await gen.multi([adb.submit(0, 0, sub) for i in range(5)])
+        res = await adb.get_results(0)
+        self.assertEqual(res.shape[0], 5)
+        adb.shutdown()
+        db.close()
+
+    @gen_test
+    async def test_queue_full(self):
+        db = DatabaseCompetition(":memory:")
+        adb = AsyncDatabaseCompetition(db, queue_depth=2)
+        futs = [adb.run(time.sleep, 0.2) for i in range(2)]
+        waiting = gen.multi(futs)
+        await gen.sleep(0.01)
+        self.assertEqual(adb.pending, 2)
+        with self.assertRaises(QueueFullError):
+            await adb.run(time.sleep, 0)
+        await waiting
+        adb.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
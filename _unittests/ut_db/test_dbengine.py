@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import gc
+import io
+import json
+import os
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from lightmlboard.dbengine import Database, DBException
+
+
+class TestDbEngine(ExtTestCase):
+
+    def test_execute_params(self):
+        db = Database(":memory:")
+        db.connect()
+        db.create_table("t", [('a', int), ('b', str), ('c', bytes)])
+        db.execute("INSERT INTO t (a, b, c) VALUES (?, ?, ?)", (1, "x'y", b"\x00\x01"))
+        db.executemany("INSERT INTO t (a, b, c) VALUES (?, ?, ?)",
+                       [(2, "u", None), (3, "v", None)])
+        db.commit()
+        res = list(db.execute("SELECT a, b, c FROM t WHERE a=?", (1,)))
+        self.assertEqual(res, [(1, "x'y", b"\x00\x01")])
+        res = list(db.execute("SELECT COUNT(*) FROM t"))
+        self.assertEqual(res, [(3,)])
+        self.assertRaise(lambda: db.executemany("INSERT INTO u VALUES (?)", [(1,)]),
+                         DBException)
+        db.close()
+
+    def test_insert_rows(self):
+        db = Database(":memory:")
+        db.connect()
+        db.create_table("t", [('a', int), ('b', str)])
+        self.assertEqual(db.insert_rows("t", []), 0)
+        self.assertEqual(db.insert_rows("t", [dict(a=1, b="r"), dict(b="s", a=2)]), 2)
+        self.assertEqual(db.insert_rows("t", [(3, "t")], columns=["a", "b"]), 1)
+        self.assertRaise(lambda: db.insert_rows("t", [(3, "t")]), ValueError)
+        db.commit()
+        res = list(db.execute("SELECT a, b FROM t ORDER BY a"))
+        self.assertEqual(res, [(1, "r"), (2, "s"), (3, "t")])
+        self.assertTrue(db.has_rows("t"))
+        db.close()
+
+    def test_pool(self):
+        self.assertRaise(lambda: Database(":memory:", pool=True), ValueError)
+        temp = get_temp_folder(__file__, "temp_pool")
+        name = os.path.join(temp, "pool.db3")
+        if os.path.exists(name):
+            os.remove(name)
+        db = Database(name, pool=True, pragmas=dict(cache_size=-1024))
+        db.connect()
+        db.connect()
+        mode = list(db.execute("PRAGMA journal_mode"))[0][0]
+        self.assertEqual(mode.lower(), "wal")
+        with db.transaction():
+            db.create_table("t", [('a', int), ('b', str)])
+            self.assertEqual(db.get_table_list(), ['t'])
+        db.insert_rows("t", [(i, str(i)) for i in range(100)], columns=["a", "b"])
+        db.commit()
+
+        def read(i):
+            res = list(db.execute("SELECT COUNT(*), SUM(a) FROM t WHERE a >= ?", (i,)))
+            return res[0], threading.get_ident()
+
+        with db.transaction():
+            # readers do not see uncommitted rows and are not blocked
+            db.execute("INSERT INTO t (a, b) VALUES (?, ?)", (1000, "w"))
+            with ThreadPoolExecutor(4) as exe:
+                res = list(exe.map(read, [0] * 20))
+            self.assertEqual(set(r[0] for r in res), {(100, 4950)})
+        self.assertEqual(read(0)[0], (101, 5950))
+        self.assertRaise(lambda: db.execute("INSERT INTO t (a, b) VALUES (?, ?)", ("r",)),
+                         DBException)
+        self.assertTrue(Database._is_read_request("WITH a AS (SELECT 1) SELECT * FROM a"))
+        self.assertFalse(Database._is_read_request(
+            "WITH a AS (SELECT 1) INSERT INTO t (a) SELECT * FROM a"))
+        self.assertTrue(Database._is_read_request("PRAGMA journal_mode"))
+        self.assertFalse(Database._is_read_request("PRAGMA journal_mode=WAL"))
+        self.assertEqual(list(db.execute("WITH c AS (SELECT a FROM t) SELECT COUNT(*) FROM c")),
+                         [(101,)])
+        db.close()
+        db.connect()
+        self.assertEqual(read(0)[0], (101, 5950))
+
+        # connections of ended threads are released
+        nb = db._reader_count()
+        threads = [threading.Thread(target=read, args=(0,)) for i in range(5)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        del threads
+        gc.collect()
+        self.assertEqual(db._reader_count(), nb)
+        db.close()
+
+    def test_transaction_rollback(self):
+        db = Database(":memory:")
+        db.connect()
+        db.create_table("t", [('a', int)])
+        db.commit()
+
+        def fail():
+            with db.transaction():
+                db.execute("INSERT INTO t (a) VALUES (1)")
+                raise RuntimeError("rollback")
+
+        self.assertRaise(fail, RuntimeError)
+        self.assertFalse(db.has_rows("t"))
+        db.close()
+
+    def test_iter_rows(self):
+        db = Database(":memory:")
+        db.connect()
+        db.create_table("t", [('a', int), ('b', str), ('c', bytes)])
+        db.insert_rows("t", [(i, str(i), b"\x00" if i == 0 else None) for i in range(25)],
+                       columns=["a", "b", "c"])
+        db.commit()
+        batches = list(db.iter_rows("t", batch_size=10))
+        self.assertEqual([len(b) for b in batches], [10, 10, 5])
+        batches = list(db.iter_rows("t", columns=["b"], where="a >= ?", params=(20,)))
+        self.assertEqual(batches, [[("20",), ("21",), ("22",), ("23",), ("24",)]])
+        dfs = list(db.iter_df("t", columns=["a"], where="a < 3", batch_size=2))
+        self.assertEqual([df.shape for df in dfs], [(2, 1), (1, 1)])
+        self.assertRaise(lambda: list(db.iter_rows("u")), DBException)
+        self.assertRaise(lambda: list(db.iter_rows("t", columns=["a; DROP TABLE t"])),
+                         DBException)
+
+        st = io.StringIO()
+        self.assertEqual(db.export_csv(st, "t", where="a < ?", params=(3,), batch_size=2,
+                                       converters=dict(b=lambda v: "x" + v)), 3)
+        self.assertEqual(st.getvalue().split("\r\n"),
+                         ["a,b,c", "0,x0,AA==", "1,x1,", "2,x2,", ""])
+        st = io.StringIO()
+        self.assertEqual(db.export_jsonl(st, "t", columns=["a", "c"], where="a < 2"), 2)
+        rows = [json.loads(line) for line in st.getvalue().strip().split("\n")]
+        self.assertEqual(rows, [dict(a=0, c="AA=="), dict(a=1, c=None)])
+        st = io.StringIO()
+        self.assertEqual(db.export_csv(st, "t", columns=["a"], where="a < 0"), 0)
+        self.assertEqual(st.getvalue(), "a\r\n")
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
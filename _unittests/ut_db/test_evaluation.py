@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=2s)
+"""
+import os
+import unittest
+from io import StringIO
+import pandas
+from tornado.testing import AsyncTestCase, gen_test
+from tornado import gen
+from lightmlboard.dbmanager import DatabaseCompetition
+from lightmlboard.dbasync import AsyncDatabaseCompetition
+from lightmlboard.evaluation import EvaluationQueue
+
+
+class TestEvaluation(AsyncTestCase):
+
+    def _data(self):
+        data = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+        df = pandas.read_csv(os.path.join(data, "off_eval_all_Y.txt"))
+        s = StringIO()
+        pandas.DataFrame([0.9 if v else 0.1 for v in df.hasE],
+                         columns=["c1"]).to_csv(s, index=False)
+        return os.path.join(data, "ex_default_options.py"), s.getvalue()
+
+    def test_jobs(self):
+        opt, sub = self._data()
+        db = DatabaseCompetition(":memory:")
+        db.init_from_options(opt)
+        db.connect()
+        with self.assertRaises(ValueError):
+            db.add_job(5, 0, sub)
+        with self.assertRaises(ValueError):
+            db.add_job(0, 5, sub)
+        job_id = db.add_job(0, 0, sub)
+        self.assertEqual(db.get_pending_jobs(), [job_id])
+        self.assertEqual(db.get_job(job_id)['status'], 'pending')
+        tasks, data = db.start_job(job_id)
+        self.assertEqual(data, sub.encode('utf-8'))
+        job = db.get_job(job_id)
+        self.assertEqual(job['status'], 'running')
+        self.assertEqual(job['worker'], os.getpid())
+        # a job is claimed once
+        self.assertIsNone(db.start_job(job_id))
+        self.assertEqual(db.get_pending_jobs(), [])
+        # jobs left running by another process
+        self.assertEqual(db.release_jobs(os.getpid() + 1), 0)
+        self.assertEqual(db.release_jobs(os.getpid()), 1)
+        self.assertEqual(db.get_pending_jobs(), [job_id])
+        self.assertIsNone(db.get_job(job_id)['worker'])
+        tasks, data = db.start_job(job_id)
+        scores, info = DatabaseCompetition.evaluate_submission(tasks, data, return_info=True)
+        self.assertEqual(info['method'], 'typed')
+        db.finish_job(job_id, scores=scores, info=info)
+        job = db.get_job(job_id)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['info']['rows'], 115)
+        self.assertEqual(job['scores'], {'mean_squared_error': 0.009999999999999997})
+        self.assertEqual(db.get_pending_jobs(), [])
+        self.assertEqual(db.get_results(0).shape[0], 1)
+        self.assertIsNone(db.get_job("unknown"))
+        db.close()
+
+    @gen_test(timeout=30)
+    async def test_queue(self):
+        opt, sub = self._data()
+        db = DatabaseCompetition(":memory:")
+        db.init_from_options(opt)
+        adb = AsyncDatabaseCompetition(db)
+        for processes in [False, True]:
+            queue = EvaluationQueue(adb, max_workers=2, processes=processes)
+            jobs = await gen.multi([queue.enqueue(0, 0, sub) for i in range(3)])
+            jobs.append(await queue.enqueue(0, 0, "c1\nr\n"))
+            scores = await gen.multi([queue.run(job_id) for job_id in jobs])
+            self.assertEqual(scores[:3], [{'mean_squared_error': 0.009999999999999997}] * 3)
+            self.assertIsNone(scores[3])
+            status = await queue.status(jobs[3])
+            self.assertEqual(status['status'], 'failed')
+            self.assertIn("Error", status['error'])
+            queue.shutdown()
+        res = await adb.get_results(0)
+        self.assertEqual(res.shape[0], 6)
+
+        # jobs interrupted by a restart are evaluated again
+        queue = EvaluationQueue(adb, processes=False)
+        job_id = await queue.enqueue(0, 0, sub)
+        self.assertEqual(await queue.recover(), [job_id])
+        for i in range(100):
+            status = await queue.status(job_id)
+            if status['status'] == 'done':
+                break
+            await gen.sleep(0.05)
+        self.assertEqual(status['status'], 'done')
+        queue.shutdown()
+
+        # a closed queue leaves the jobs pending
+        queue = EvaluationQueue(adb, processes=False)
+        queue.close()
+        job_id = await adb.run(db.add_job, 0, 0, sub)
+        self.assertIsNone(await queue.run(job_id))
+        self.assertEqual((await queue.status(job_id))['status'], 'pending')
+        self.assertEqual(queue.running, 0)
+        queue.shutdown()
+
+        # a failure while recording the scores marks the job as failed
+        queue = EvaluationQueue(adb, processes=False)
+        job_id = await adb.run(db.add_job, 0, 0, sub)
+        with db.transaction():
+            db.execute("DELETE FROM players WHERE player_id=0")
+        self.assertIsNone(await queue.run(job_id))
+        status = await queue.status(job_id)
+        self.assertEqual(status['status'], 'failed')
+        self.assertIn("ValueError", status['error'])
+        # unknown job, the failure cannot be recorded
+        self.assertIsNone(await queue.run("unknown"))
+        self.assertEqual(queue.running, 0)
+        queue.shutdown()
+        adb.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import os
+import unittest
+from io import StringIO
+import pandas
+from pyquickhelper.pycode import ExtTestCase
+from lightmlboard.dbmanager import DatabaseCompetition
+from lightmlboard.metrics import greater_is_better
+
+
+class TestLeaderboard(ExtTestCase):
+
+    def setUp(self):
+        self.data = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+        self.expected = pandas.read_csv(os.path.join(self.data, "off_eval_all_Y.txt"))
+
+    def _make_db(self):
+        db = DatabaseCompetition(":memory:")
+        db.init_from_options(os.path.join(self.data, "ex_default_options.py"))
+        db.connect()
+        with db.transaction():
+            db.insert_rows("teams", [(1, "team2")], columns=["team_id", "team_name"])
+            db.insert_rows("players", [(1, 0, "p1", "p1", "p1"), (2, 1, "p2", "p2", "p2")],
+                           columns=["player_id", "team_id", "player_name", "login", "pwd"])
+        return db
+
+    def _sub(self, q):
+        pred = [q if v else 1 - q for v in self.expected.hasE]
+        s = StringIO()
+        pandas.DataFrame(pred, columns=["c1"]).to_csv(s, index=False)
+        return s.getvalue()
+
+    def test_greater_is_better(self):
+        self.assertFalse(greater_is_better("mse"))
+        self.assertFalse(greater_is_better("mean_squared_error"))
+        self.assertFalse(greater_is_better("log_loss"))
+        self.assertTrue(greater_is_better("roc_auc_score_micro"))
+
+    def test_leaderboard(self):
+        db = self._make_db()
+        met = "mean_squared_error"
+        db.submit(0, 0, self._sub(0.9))
+        db.submit(0, 1, self._sub(0.8))
+        db.submit(0, 2, self._sub(0.6))
+        db.submit(0, 0, self._sub(0.7))
+        db.submit(0, 2, self._sub(1.))
+
+        board = db.get_leaderboard(0, met, top=10)
+        self.assertEqual(list(board.player_id), [2, 0, 1])
+        self.assertEqual(list(board['rank']), [1, 2, 3])
+        self.assertEqual(list(board.player_name), ["p2", "xx", "p1"])
+        self.assertAlmostEqual(board.metric_value[1], 0.01)
+        self.assertEqual(list(db.get_leaderboard(0, met, top=2).player_id), [2, 0])
+
+        columns, rows = db.get_leaderboard_rows(0, met, top=10)
+        self.assertEqual(columns, list(board.columns))
+        self.assertEqual([row[:3] for row in rows], [(1, "p2", "team2"), (2, "xx", "team1"),
+                                                     (3, "p1", "team1")])
+        columns, rows = db.get_player_submissions(2)
+        self.assertEqual(columns, ['sub_id', 'cpt_id', 'date', 'metric', 'metric_value'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(len(db.get_player_submissions(2, cpt_id=1)[1]), 0)
+        self.assertEqual(len(db.get_player_submissions(2, limit=1)[1]), 1)
+
+        teams = db.get_leaderboard(0, met, teams=True)
+        self.assertEqual(list(teams.team_id), [1, 0])
+        self.assertEqual(list(teams.player_id), [2, 0])
+
+        before = list(db.execute("SELECT * FROM leaderboard ORDER BY player_id"))
+        before_teams = list(db.execute("SELECT * FROM leaderboard_teams ORDER BY team_id"))
+        with db.transaction():
+            db.execute("DELETE FROM leaderboard")
+        db.rebuild_leaderboard(0)
+        self.assertEqual(list(db.execute("SELECT * FROM leaderboard ORDER BY player_id")), before)
+        db.rebuild_leaderboard()
+        self.assertEqual(list(db.execute("SELECT * FROM leaderboard_teams ORDER BY team_id")),
+                         before_teams)
+
+        plan = "\n".join(str(row) for row in db.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM leaderboard WHERE cpt_id == ? AND metric == ? "
+            "ORDER BY metric_value ASC LIMIT ?", (0, met, 5)))
+        self.assertIn("idx_leaderboard_score", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        db.close()
+
+    def test_listener(self):
+        db = self._make_db()
+        met = "mean_squared_error"
+        events = []
+        db.add_listener(lambda *args: events.append(args))
+        db.submit(0, 1, self._sub(0.8))
+        db.submit(0, 2, self._sub(0.9))
+        db.submit(0, 1, self._sub(0.6))
+        self.assertEqual([e[:2] for e in events], [(0, 1), (0, 2), (0, 3)])
+        delta = events[1][2][0]
+        self.assertEqual(delta['player'], 'p2')
+        self.assertEqual(delta['metric'], met)
+        self.assertEqual(delta['rank'], 1)
+        self.assertTrue(delta['improved'])
+        self.assertAlmostEqual(delta['score'], 0.01)
+        delta = events[2][2][0]
+        self.assertEqual((delta['rank'], delta['improved']), (2, False))
+        self.assertAlmostEqual(delta['best'], 0.04)
+
+        # nothing is sent if the transaction is rolled back
+        def fail():
+            with db.transaction():
+                db.record_submission(0, 1, "c1\n0.5\n", {met: 0.5})
+                raise RuntimeError("rollback")
+        self.assertRaise(fail, RuntimeError)
+        self.assertEqual(len(events), 3)
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
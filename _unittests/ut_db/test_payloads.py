@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import os
+import unittest
+from io import BytesIO, StringIO
+import pandas
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from lightmlboard.dbmanager import DatabaseCompetition
+from lightmlboard.storage import payload_key, compress_payload, decompress_payload
+from lightmlboard.storage import compress_stream, stream_key
+
+
+class TestPayloads(ExtTestCase):
+
+    def test_compress_payload(self):
+        for comp in [None, 'zlib', 'lzma']:
+            blob = compress_payload("a,b\n1,2\n", comp)
+            self.assertEqual(decompress_payload(blob, comp), b"a,b\n1,2\n")
+        self.assertEqual(len(payload_key("r")), 64)
+        self.assertEqual(payload_key("r"), payload_key(b"r"))
+        self.assertRaise(lambda: compress_payload("r", "rar"), ValueError)
+
+    def test_compress_stream(self):
+        data = b"a,b\n" + b"1,2\n" * 1000
+        for comp in [None, 'zlib', 'lzma']:
+            blob, size = compress_stream(BytesIO(data), comp, chunk_size=100)
+            self.assertEqual(size, len(data))
+            self.assertEqual(blob, compress_payload(data, comp))
+        stream = BytesIO(data)
+        stream.seek(4)
+        self.assertEqual(stream_key(stream, chunk_size=100), payload_key(data[4:]))
+        self.assertEqual(stream.tell(), 4)
+        self.assertRaise(lambda: compress_stream(BytesIO(data), "rar"), ValueError)
+
+    def test_submission_payload(self):
+        data = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+        fname = os.path.join(data, "off_eval_all_Y.txt")
+        df = pandas.read_csv(fname)
+        pred = [0.9 if v else 0.1 for v in df.hasE]
+        s = StringIO()
+        pandas.DataFrame(pred, columns=["c1"]).to_csv(s, index=False)
+        sub = s.getvalue()
+
+        db = DatabaseCompetition(":memory:")
+        db.init_from_options(os.path.join(data, "ex_default_options.py"))
+        db.connect()
+        db.submit(0, 0, sub)
+        db.submit(0, 0, sub)
+        keys = [r[0] for r in db.execute("SELECT data FROM submissions WHERE cpt_id=0")]
+        self.assertEqual(keys, [payload_key(sub)] * 2)
+        payloads = list(db.execute("SELECT hash, size, compression FROM payloads"))
+        self.assertEqual(payloads, [(payload_key(sub), len(sub), 'zlib')])
+        self.assertEqual(db.get_payload(keys[0]), sub)
+        key = db.store_payload(BytesIO(sub.encode('utf-8') + b"0.5\n"))
+        self.assertEqual(db.get_payload(key), sub + "0.5\n")
+        self.assertEqual(db.store_payload(BytesIO(sub.encode('utf-8'))), keys[0])
+        self.assertRaise(lambda: db.get_payload("unknown"), KeyError)
+        db.close()
+
+    def test_migration_payloads(self):
+        temp = get_temp_folder(__file__, "temp_migration_payloads")
+        name = os.path.join(temp, "old.db3")
+        if os.path.exists(name):
+            os.remove(name)
+        db = DatabaseCompetition(name)
+        db.connect()
+        with db.transaction():
+            db.insert_rows("submissions", [("s1", 0, 0, "d", "a\n1\n", "mse", 0.5),
+                                           ("s2", 0, 0, "d", "a\n1\n", "mse", 0.5)],
+                           columns=[c[0] for c in db._col_submissions()])
+            db.execute("DELETE FROM payloads")
+            db.execute("DELETE FROM schema_version WHERE version >= 4")
+        db.close()
+
+        db = DatabaseCompetition(name)
+        db.connect()
+        keys = set(r[0] for r in db.execute("SELECT data FROM submissions"))
+        self.assertEqual(keys, {payload_key("a\n1\n")})
+        self.assertEqual(db.get_payload(payload_key("a\n1\n")), "a\n1\n")
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import os
+import unittest
+from io import StringIO
+import pandas
+from pyquickhelper.pycode import ExtTestCase
+from lightmlboard.dbmanager import DatabaseCompetition
+from lightmlboard.dbresults import ResultsPage
+
+
+class TestResultsPage(ExtTestCase):
+
+    def _make_db(self):
+        data = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+        db = DatabaseCompetition(":memory:")
+        db.init_from_options(os.path.join(data, "ex_default_options.py"))
+        db.connect()
+        expected = pandas.read_csv(os.path.join(data, "off_eval_all_Y.txt"))
+        for q in [0.9, 0.8, 0.6, 0.7, 1., 0.8, 0.55]:
+            pred = [q if v else 1 - q for v in expected.hasE]
+            s = StringIO()
+            pandas.DataFrame(pred, columns=["c1"]).to_csv(s, index=False)
+            db.submit(0, 0, s.getvalue())
+        return db
+
+    def test_cursor(self):
+        token = ResultsPage.encode_cursor((0.1, "a:b"))
+        self.assertEqual(ResultsPage.decode_cursor(token), (0.1, "a:b"))
+
+    def test_pages(self):
+        db = self._make_db()
+        met = "mean_squared_error"
+        full = db.get_results(0, metric=met)
+        self.assertIsInstance(full, pandas.DataFrame)
+        self.assertEqual(full.shape[0], 7)
+        expected = list(full.sort_values(["metric_value", "sub_id"]).sub_id)
+
+        seen = []
+        after = None
+        nb = 0
+        while True:
+            page = db.get_results(0, metric=met, limit=3, after=after,
+                                  columns=["sub_id", "metric_value", "player_name"])
+            self.assertIsInstance(page, ResultsPage)
+            self.assertLesser(len(page), 3)
+            seen.extend(r[0] for r in page)
+            nb += 1
+            if page.next_cursor is None:
+                break
+            after = ResultsPage.decode_cursor(page.next_token)
+        self.assertEqual(nb, 3)
+        self.assertEqual(seen, expected)
+        df = page.to_df()
+        self.assertEqual(list(df.columns), ["sub_id", "metric_value", "player_name"])
+        self.assertIn("<table", page.to_html())
+
+        page = db.get_results(0, limit=10)
+        self.assertEqual(len(page), 7)
+        self.assertIsNone(page.next_cursor)
+        self.assertNotIn("data", page.columns)
+        values = [r[page.columns.index("metric_value")] for r in page]
+        self.assertEqual(values, sorted(values, reverse=True))
+        self.assertRaise(lambda: db.get_results(0, limit=2, columns=["pwd"]), ValueError)
+
+        plan = "\n".join(str(row) for row in db.execute(
+            "EXPLAIN QUERY PLAN SELECT A.sub_id FROM submissions AS A "
+            "WHERE A.cpt_id == ? AND A.metric == ? AND A.metric_value IS NOT NULL "
+            "AND (A.metric_value, A.sub_id) > (?, ?) "
+            "ORDER BY A.metric_value ASC, A.sub_id ASC LIMIT ?", (0, met, 0., "", 3)))
+        self.assertIn("idx_submissions_cpt", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import os
+import unittest
+from io import StringIO
+import numpy
+import pandas
+from pyquickhelper.pycode import ExtTestCase
+from lightmlboard.storage import array_to_blob, blob_to_array, is_blob
+from lightmlboard.competition import Competition
+from lightmlboard.dbmanager import DatabaseCompetition
+
+
+class TestStorage(ExtTestCase):
+
+    def test_blob(self):
+        for dtype in [numpy.float32, numpy.float64, numpy.int64, numpy.bool_]:
+            for compression in [None, 'zlib', 'lzma']:
+                arr = (numpy.arange(12).reshape((4, 3)) % 2).astype(dtype)
+                blob = array_to_blob(arr, compression=compression)
+                self.assertTrue(is_blob(blob))
+                arr2, cols = blob_to_array(blob)
+                self.assertIsNone(cols)
+                self.assertEqual(arr2.dtype, arr.dtype)
+                self.assertEqualArray(arr, arr2)
+
+    def test_blob_zero_copy(self):
+        arr = numpy.arange(5).astype(numpy.float64)
+        blob = array_to_blob(arr)
+        arr2 = blob_to_array(blob)[0]
+        self.assertFalse(arr2.flags.writeable)
+        self.assertFalse(arr2.flags.owndata)
+
+    def test_blob_dataframe(self):
+        df = pandas.DataFrame(dict(a=[0.5, 0.6], b=[1, 2]))
+        arr, cols = blob_to_array(array_to_blob(df))
+        self.assertEqual(cols, ['a', 'b'])
+        self.assertEqualArray(arr, df.values)
+        self.assertRaise(lambda: array_to_blob(pandas.DataFrame(dict(a=["r"]))),
+                         TypeError)
+        self.assertRaise(lambda: array_to_blob(arr, compression="rar"),
+                         ValueError)
+        self.assertRaise(lambda: blob_to_array(b"abc"), ValueError)
+
+    def test_competition_binary(self):
+        compet = Competition(0, link="/compet", name="compet1",
+                             description="description", metric="mse",
+                             expected_values=[[0, 1, 2]])
+        d = compet.to_dict(storage='binary', compression='zlib')
+        self.assertIsInstance(d['expected_values'], bytes)
+        compet2 = Competition(**d)
+        self.assertEqual(compet2.evaluate([[0, 4, 2]]), {'mse': 3.0})
+        self.assertEqual(compet.to_dict(), compet2.to_dict())
+
+    def test_convert_expected_values(self):
+        data = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+        opt = os.path.join(data, "ex_default_options.py")
+        db = DatabaseCompetition(":memory:")
+        db.init_from_options(opt, storage='csv')
+        db.connect()
+        exp = list(db.execute("SELECT expected_values FROM competitions"))[0][0]
+        self.assertIsInstance(exp, str)
+        self.assertEqual(db.convert_expected_values(compression='zlib'), 1)
+        self.assertEqual(db.convert_expected_values(compression='zlib'), 0)
+        exp = list(db.execute("SELECT expected_values FROM competitions"))[0][0]
+        self.assertTrue(is_blob(exp))
+
+        fname = os.path.join(data, "off_eval_all_Y.txt")
+        df = pandas.read_csv(fname)
+        pred = [0.9 if v else 0.1 for v in df.hasE]
+        s = StringIO()
+        pandas.DataFrame(pred, columns=["c1"]).to_csv(s, index=False)
+        db.submit(0, 0, s.getvalue())
+        subs = list(db.execute("SELECT metric, metric_value FROM submissions"))
+        cpt = db.get_competition(0)
+        db.close()
+        self.assertEqual(subs[-1], ('mean_squared_error', 0.009999999999999997))
+        self.assertEqual(list(cpt.expected_values.columns), ['hasE'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import os
+import unittest
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from lightmlboard.dbmanager import DatabaseCompetition
+from lightmlboard.cache import PageCache
+
+
+class TestVersions(ExtTestCase):
+
+    def test_versions(self):
+        temp = get_temp_folder(__file__, "temp_versions")
+        name = os.path.join(temp, "versions.db3")
+        if os.path.exists(name):
+            os.remove(name)
+        data = os.path.join(os.path.dirname(__file__), "data", "ex_default_options.py")
+        db = DatabaseCompetition(name)
+        db.connect()
+        db.init_from_options(data)
+        self.assertEqual(db.get_version(0), 0)
+        sub = "c1\n" + "0.5\n" * 115
+        db.submit(0, 0, sub)
+        self.assertEqual(db.get_version(0), 1)
+
+        # a rolled back submission does not change the version
+        def fail():
+            with db.transaction():
+                db.record_submission(0, 0, sub, {'mean_squared_error': 0.5})
+                self.assertEqual(db.get_version(0), 1)
+                raise RuntimeError("rollback")
+
+        self.assertRaise(fail, RuntimeError)
+        self.assertEqual(db.get_version(0), 1)
+        db.record_submission(0, 0, sub, {'mean_squared_error': 0.5})
+        self.assertEqual(db.get_version(0), 2)
+        db.close()
+
+        # the versions are persistent
+        db = DatabaseCompetition(name)
+        self.assertEqual(db.get_version(0), 2)
+        self.assertEqual(db.get_version(5), 0)
+
+    def test_shared_versions(self):
+        temp = get_temp_folder(__file__, "temp_shared_versions")
+        name = os.path.join(temp, "versions.db3")
+        if os.path.exists(name):
+            os.remove(name)
+        data = os.path.join(os.path.dirname(__file__), "data", "ex_default_options.py")
+        self.assertRaise(lambda: DatabaseCompetition(":memory:", shared=True), ValueError)
+        db1 = DatabaseCompetition(name, shared=True)
+        db1.connect()
+        db1.init_from_options(data)
+        db2 = DatabaseCompetition(name, shared=True)
+        db2.connect()
+        self.assertEqual(db1.get_version(0), 0)
+        self.assertEqual(db2.get_version(0), 0)
+        sub = "c1\n" + "0.5\n" * 115
+        db1.submit(0, 0, sub)
+        # db2 sees the submission recorded through another connection
+        self.assertEqual(db2.get_version(0), 1)
+        db2.submit(0, 0, sub)
+        self.assertEqual(db2.get_version(0), 2)
+        self.assertEqual(db1.get_version(0), 2)
+
+        # a database not shared keeps its own versions
+        db3 = DatabaseCompetition(name, pool=True)
+        db3.connect()
+        db1.submit(0, 0, sub)
+        self.assertEqual(db3.get_version(0), 2)
+        self.assertEqual(db2.get_version(0), 3)
+        for db in [db1, db2, db3]:
+            db.close()
+
+    def test_on_commit(self):
+        db = DatabaseCompetition(":memory:")
+        db.connect()
+        calls = []
+        db.on_commit(lambda: calls.append(0))
+        with db.transaction():
+            with db.transaction():
+                db.on_commit(lambda: calls.append(1))
+            self.assertEqual(calls, [0])
+        self.assertEqual(calls, [0, 1])
+
+    def test_page_cache(self):
+        cache = PageCache(max_bytes=10)
+        cache.put((0, 1, 'u', ()), b"abc")
+        cache.put((1, 1, 'u', ()), b"abcd")
+        self.assertEqual(cache.get((0, 1, 'u', ())), b"abc")
+        self.assertIsNone(cache.get((0, 1, 'v', ())))
+        # a new version drops the previous pages of the competition
+        cache.put((0, 2, 'u', ()), b"ab")
+        self.assertIsNone(cache.get((0, 1, 'u', ())))
+        cache.put((1, 1, 'v', ()), b"abcde")
+        self.assertEqual(len(cache), 2)
+        cache.put((2, 1, 'v', ()), b"a" * 11)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['nbytes'], 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
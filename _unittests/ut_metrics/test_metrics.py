@@ -3,8 +3,14 @@
 @brief      test log(time=1s)
 """
 import unittest
+import warnings
+import numpy
+from scipy import sparse as scipy_sparse
+from sklearn.metrics import roc_auc_score
 from pyquickhelper.pycode import ExtTestCase
 from lightmlboard.competition import Competition
+from lightmlboard.metrics import roc_auc_scores, evaluate_metrics, sklearn_metric, reshape
+from lightmlboard.metrics.classification import one_hot, RocAucEngine
 
 
 class TestMetrics(ExtTestCase):
@@ -58,6 +64,116 @@ class TestMetrics(ExtTestCase):
         res = compet.evaluate([[0.1, 0.9, 0.1, 0.9]])
         self.assertEqual(res, {'roc_auc_score_micro': 1.0})
 
+    def test_roc_auc_scores(self):
+        rnd = numpy.random.RandomState(0)
+        for n, c in [(50, 1), (200, 3), (1000, 5)]:
+            exp = (rnd.rand(n, c) > 0.6).astype(numpy.int64)
+            # rounding creates ties
+            val = numpy.round(rnd.rand(n, c), 1)
+            if c == 1:
+                exp, val = exp.ravel(), val.ravel()
+            res = roc_auc_scores(exp, val)
+            for av in ['micro', 'macro']:
+                self.assertAlmostEqual(res[av], roc_auc_score(exp, val, average=av), places=12)
+        self.assertEqual(roc_auc_scores([1, 2, 2, 1], [.1, .2, .3, .3], averages=('macro',)),
+                         {'macro': 0.625})
+        self.assertRaise(lambda: roc_auc_scores([0.5, 0.1, 0.2], [0, 1, 0]), ValueError)
+        self.assertRaise(lambda: roc_auc_scores([0, 1], [0.5, numpy.nan]), ValueError)
+        self.assertRaise(lambda: roc_auc_scores([0, 1], [0.5, 0.4], averages=('weighted',)),
+                         ValueError)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            res = roc_auc_scores([[0, 1], [0, 1], [1, 1]], [[.1, .2], [.3, .4], [.5, .6]])
+        self.assertEqual(res['micro'], 0.875)
+        self.assertTrue(numpy.isnan(res['macro']))
+
+    def test_evaluate_metrics(self):
+        exp = [0, 1, 0, 1]
+        val = [[0.1, 0.9], [0.1, 0.9], [0.1, 0.9], [0.9, 0.1]]
+        res = evaluate_metrics(['roc_auc_score_micro', 'roc_auc_score_macro', 'mse'], exp, val)
+        self.assertEqual(list(res), ['roc_auc_score_micro', 'roc_auc_score_macro', 'mse'])
+        self.assertEqual(res['roc_auc_score_micro'], 0.25)
+        self.assertEqual(res['roc_auc_score_macro'], 0.25)
+        # exp is one-hot encoded by reshape
+        self.assertAlmostEqual(res['mse'], 0.61)
+        compet = Competition(0, link="/compet", name="compet1",
+                             description="description",
+                             metric="roc_auc_score_micro,roc_auc_score_macro",
+                             expected_values=exp)
+        self.assertEqual(compet.evaluate(val), {'roc_auc_score_micro': 0.25,
+                                                'roc_auc_score_macro': 0.25})
+
+    def test_one_hot(self):
+        labels = numpy.array([2, 0, 1, 2])
+        dense = one_hot(labels, (4, 3))
+        self.assertEqual(dense.dtype, numpy.uint8)
+        self.assertEqualArray(dense, numpy.eye(3, dtype=numpy.uint8)[labels])
+        sp = one_hot(labels.astype(numpy.float64), (4, 3), sparse=True)
+        self.assertTrue(scipy_sparse.issparse(sp))
+        self.assertEqualArray(sp.toarray(), dense)
+        self.assertRaise(lambda: one_hot(labels, (4, 2)), ValueError)
+        self.assertRaise(lambda: one_hot([-1, 0, 0, 0], (4, 2)), ValueError)
+
+        val = numpy.random.rand(4, 3)
+        cache = {}
+        exp1, _ = reshape(labels, val, sparse=True, cache=cache)
+        exp2, _ = reshape(labels, val, sparse=True, cache=cache)
+        self.assertIs(exp1, exp2)
+        self.assertEqual(len(cache), 1)
+
+    def test_sparse_metrics(self):
+        rnd = numpy.random.RandomState(0)
+        n, c = 500, 40
+        labels = rnd.randint(0, c, n)
+        val = rnd.rand(n, c)
+        val /= val.sum(axis=1, keepdims=True)
+        dense = numpy.eye(c)[labels]
+        res = roc_auc_scores(labels, val)
+        self.assertAlmostEqual(res['micro'], roc_auc_score(dense, val, average='micro'), places=12)
+        self.assertAlmostEqual(res['macro'], roc_auc_score(dense, val, average='macro'), places=12)
+        sp = one_hot(labels, val.shape, sparse=True)
+        # accepted as sparse by scikit-learn
+        self.assertAlmostEqual(sklearn_metric("label_ranking_average_precision_score", sp, val),
+                               sklearn_metric("label_ranking_average_precision_score", dense, val))
+        # converted into a dense matrix
+        self.assertAlmostEqual(sklearn_metric("log_loss", sp, val),
+                               sklearn_metric("log_loss", dense, val))
+
+        compet = Competition(0, link="/compet", name="compet1", description="description",
+                             metric="roc_auc_score_micro,roc_auc_score_macro,log_loss",
+                             expected_values=labels)
+        res = compet.evaluate(val)
+        self.assertAlmostEqual(res['roc_auc_score_macro'],
+                               roc_auc_score(dense, val, average='macro'), places=12)
+        self.assertEqual(set(compet._reshape_cache), {((n, c), True), ('auc', (n, c))})
+        self.assertEqual(compet.evaluate(val), res)
+
+    def test_roc_auc_engine(self):
+        rnd = numpy.random.RandomState(1)
+        n, c = 2000, 7
+        exp = (rnd.rand(n, c) > 0.8).astype(numpy.int64)
+        engine = RocAucEngine(exp)
+        self.assertEqualArray(engine.npos_columns, exp.sum(axis=0))
+        self.assertEqual(engine.npos, exp.sum())
+        for dtype in [numpy.float64, numpy.float32]:
+            for decimals in [None, 2]:
+                val = rnd.rand(n, c).astype(dtype)
+                if decimals is not None:
+                    val = numpy.round(val, decimals)
+                expected = {av: roc_auc_score(exp, val, average=av) for av in ['micro', 'macro']}
+                for n_jobs in [1, 3]:
+                    res = engine.compute(val, n_jobs=n_jobs)
+                    for av in ['micro', 'macro']:
+                        self.assertLess(abs(res[av] - expected[av]), 1e-12)
+                self.assertEqual(engine.compute(val, averages=('macro',)),
+                                 {'macro': res['macro']})
+        self.assertRaise(lambda: engine.compute(val[:10]), ValueError)
+
+        exp = rnd.rand(n) > 0.5
+        val = rnd.rand(n).astype(numpy.float32)
+        res = RocAucEngine(exp).compute(val, averages=('micro',))
+        self.assertLess(abs(res['micro'] - roc_auc_score(exp, val)), 1e-12)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -65,6 +65,25 @@ class TestMetricsCustom(ExtTestCase):
                        io.StringIO(st2.getvalue()))
         self.assertEqual(r, 0)
 
+    def test_l1_reg_max_keys(self):
+        exp = {"a": 50, "b": 200, "c": 100, "d": 10}
+        val = {"c": 90, "a": 50, "b": 170, "e": 3}
+        self.assertRaise(lambda: l1_reg_max(exp, val), ValueError)
+        # missing key d counts 1
+        r = l1_reg_max(exp, val, exc=False)
+        self.assertAlmostEqual(r, (0 + 10. / 180 + 10. / 180 + 1) / 4)
+        r = l1_reg_max(exp, val, exc=False, nomax=True)
+        self.assertAlmostEqual(r, (0 + 10. / 180 + 1) / 3)
+        self.assertTrue(numpy.isnan(l1_reg_max({"a": "r"}, {"a": 5})))
+        self.assertEqual(l1_reg_max({"a": 200}, {"a": 5}, nomax=True), 0.)
+
+        st1 = io.StringIO("a;50\nb;200\nc;100\nd;10\n")
+        st2 = io.StringIO("c;90\na;50\nb;170\ne;3\n")
+        self.assertAlmostEqual(l1_reg_max(st1, st2, exc=False), (20. / 180 + 1) / 4)
+        st1 = io.StringIO("a;50\na;200\n")
+        st2 = io.StringIO("a;50\nb;170\n")
+        self.assertRaise(lambda: l1_reg_max(st1, st2), KeyError)
+
     def test_classification_jaccard(self):
         exp = ["4", "5", "6,7", [6, 7], (6, 7), {6, 7}]
         val = ["4", ["5"], "6,7", [6, 7], (6, 7), {6, 7}]
@@ -99,6 +118,46 @@ class TestMetricsCustom(ExtTestCase):
                                 io.StringIO(st2.getvalue()))
         self.assertEqual(r, 0.75)
 
+    def test_classification_jaccard_missing(self):
+        exp = {"a": "1,2", "b": "3", "c": [4, 5], "d": 7}
+        val = {"d": "7", "b": "3,4", "a": "2,1,1", "e": "1"}
+        self.assertRaise(lambda: multi_label_jaccard(exp, val), ValueError)
+        r = multi_label_jaccard(exp, val, exc=False)
+        self.assertEqual(r, (1 + 0.5 + 0 + 1) / 4)
+
+        st1 = io.StringIO("a;1,2\nb;3\nc;4,5\nd;7\n")
+        st2 = io.StringIO("d;7\nb;3,4\na;2,1,1\ne;1\n")
+        self.assertEqual(multi_label_jaccard(st1, st2, exc=False), r)
+        st1 = io.StringIO("a;1,2\na;3\n")
+        st2 = io.StringIO("a;1,2\nb;3\n")
+        self.assertRaise(lambda: multi_label_jaccard(st1, st2), KeyError)
+
+    def test_classification_jaccard_random(self):
+        rnd = numpy.random.RandomState(0)
+
+        def naive(exp, val):
+            r = 0.
+            for k, e in exp.items():
+                if k in val:
+                    es = set(e.split(','))
+                    vs = set(val[k].split(','))
+                    r += len(es & vs) / len(es | vs)
+            return r / len(exp)
+
+        labels = ["l%d" % i for i in range(30)]
+        exp = {i: ",".join(rnd.choice(labels, rnd.randint(1, 5))) for i in range(2000)}
+        val = {i: ",".join(rnd.choice(labels, rnd.randint(1, 5))) for i in rnd.permutation(2000)[:1900]}
+        expected = naive(exp, val)
+        self.assertAlmostEqual(multi_label_jaccard(exp, val, exc=False), expected)
+        st1 = io.StringIO()
+        st2 = io.StringIO()
+        pandas.DataFrame(list(exp.items())).to_csv(st1, index=False, header=None, sep=';')
+        pandas.DataFrame(list(val.items())).to_csv(st2, index=False, header=None, sep=';')
+        r = multi_label_jaccard(io.StringIO(st1.getvalue()), io.StringIO(st2.getvalue()), exc=False)
+        self.assertAlmostEqual(r, expected)
+        keys = list(exp)
+        self.assertAlmostEqual(multi_label_jaccard([exp[k] for k in keys], [exp[k] for k in keys]), 1.)
+
 
 if __name__ == "__main__":
     unittest.main()
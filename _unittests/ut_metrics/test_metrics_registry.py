@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=1s)
+"""
+import unittest
+from unittest import mock
+import numpy
+from pyquickhelper.pycode import ExtTestCase
+from lightmlboard.competition import Competition
+from lightmlboard.metrics import (
+    MetricInfo, register_metric, get_metric, greater_is_better,
+    evaluate_metrics, evaluate_metrics_batch, mse, l1_reg_max)
+from lightmlboard.metrics import registry
+from lightmlboard.metrics.regression import mse_batch
+from lightmlboard.metrics.regression_custom import l1_reg_max_batch
+
+
+def _max_error(exp, val):
+    return float(numpy.abs(numpy.asarray(exp) - numpy.asarray(val)).max())
+
+
+class TestMetricsRegistry(ExtTestCase):
+
+    def test_get_metric(self):
+        info = get_metric('mse')
+        self.assertIs(get_metric(info), info)
+        self.assertFalse(info.greater_is_better)
+        self.assertTrue(info.supports_batch)
+        self.assertTrue(info.supports_streaming)
+        info = get_metric('roc_auc_score_micro')
+        self.assertTrue(info.float32)
+        self.assertEqual(info.shared, ('auc', 'micro'))
+        info = get_metric('log_loss')
+        self.assertFalse(info.greater_is_better)
+        self.assertTrue(info.one_hot)
+        self.assertFalse(info.supports_streaming)
+        self.assertIs(get_metric('log_loss'), info)
+        self.assertRaise(lambda: get_metric('unknown_metric'), ValueError)
+        self.assertRaise(lambda: Competition(0, link="", name="", description="",
+                                             metric="unknown_metric", expected_values=[0, 1]),
+                         ValueError)
+        self.assertFalse(greater_is_better('l1_reg_max'))
+        self.assertFalse(greater_is_better('unknown_error'))
+        self.assertTrue(greater_is_better('unknown_score'))
+
+    def test_register(self):
+        info = register_metric('test_max_abs_error', _max_error, one_hot=False)
+        self.assertFalse(info.greater_is_better)
+        self.assertRaise(lambda: register_metric('test_max_abs_error', _max_error), ValueError)
+        self.assertRaise(lambda: register_metric('test_nofct'), ValueError)
+        compet = Competition(0, link="", name="", description="",
+                             metric="test_max_abs_error,l1_reg_max,mse",
+                             expected_values=[10, 200, 30])
+        res = compet.evaluate([11, 180, 20])
+        self.assertEqual(res['test_max_abs_error'], 20.)
+        self.assertEqual(res['l1_reg_max'], l1_reg_max(numpy.array([10., 200, 30]),
+                                                       numpy.array([11., 180, 20])))
+        self.assertEqual(res['mse'], mse([10, 200, 30], [11, 180, 20]))
+
+    def test_entry_point(self):
+        class FakeEntryPoint:
+            name = 'test_entry_point_metric'
+
+            def load(self):
+                return MetricInfo('test_entry_point_metric', _max_error, one_hot=False)
+
+        with mock.patch.object(registry, '_entry_points',
+                               {FakeEntryPoint.name: FakeEntryPoint()}):
+            info = get_metric('test_entry_point_metric')
+        self.assertEqual(info.fct, _max_error)
+        self.assertIs(get_metric('test_entry_point_metric'), info)
+        self.assertIsInstance(registry._load_entry_points(), dict)
+
+    def test_float32(self):
+        rnd = numpy.random.RandomState(0)
+        exp = (rnd.rand(100) > 0.5).astype(numpy.int64)
+        val = rnd.rand(100).astype(numpy.float32)
+        calls = []
+
+        def check(exp, val):
+            calls.append(val.dtype)
+            return 0.
+
+        register_metric(MetricInfo('test_dtype64', check, float32=False))
+        register_metric(MetricInfo('test_dtype32', check, float32=True))
+        res = evaluate_metrics(['roc_auc_score_micro', 'test_dtype64', 'test_dtype32'], exp, val)
+        self.assertEqual(calls, [numpy.float64, numpy.float32])
+        self.assertEqual(list(res), ['roc_auc_score_micro', 'test_dtype64', 'test_dtype32'])
+
+    def test_batch(self):
+        rnd = numpy.random.RandomState(0)
+        exp = rnd.rand(50) * 200
+        vals = [exp + rnd.randn(50) * 10 for i in range(4)]
+        self.assertEqualArray(mse_batch(exp, numpy.stack(vals)),
+                              numpy.array([mse(exp, v) for v in vals]), decimal=10)
+        self.assertEqualArray(l1_reg_max_batch(exp, numpy.stack(vals), nomax=True),
+                              numpy.array([l1_reg_max(exp, v, nomax=True) for v in vals]),
+                              decimal=10)
+        self.assertRaise(lambda: mse_batch(exp, numpy.stack(vals)[:, :10]), ValueError)
+
+        labels = (exp > 100).astype(numpy.int64)
+        res = evaluate_metrics_batch(['mse', 'roc_auc_score_micro', 'l1_reg_max'],
+                                     labels, [v / 200 for v in vals])
+        self.assertEqual(list(res), ['mse', 'roc_auc_score_micro', 'l1_reg_max'])
+        for i, v in enumerate(vals):
+            one = evaluate_metrics(['mse', 'roc_auc_score_micro', 'l1_reg_max'], labels, v / 200)
+            for k in one:
+                self.assertAlmostEqual(res[k][i], one[k], places=10)
+
+        compet = Competition(0, link="", name="", description="", metric="mse",
+                             expected_values=labels)
+        res = compet.evaluate_batch([v / 200 for v in vals])
+        self.assertEqual(len(res['mse']), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
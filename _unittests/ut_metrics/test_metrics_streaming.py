@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=2s)
+"""
+import io
+import unittest
+import numpy
+import pandas
+from pyquickhelper.pycode import ExtTestCase
+from lightmlboard.metrics import (
+    mse, l1_reg_max, multi_label_jaccard, roc_auc_score_micro, roc_auc_score_macro,
+    streaming_metric, streaming_scores, iter_csv_chunks)
+from lightmlboard.metrics.streaming import StreamingRocAuc
+
+
+def _chunks(exp, val, size):
+    for i in range(0, exp.shape[0], size):
+        yield exp[i:i + size], val[i:i + size]
+
+
+class TestMetricsStreaming(ExtTestCase):
+
+    def test_regression(self):
+        rnd = numpy.random.RandomState(0)
+        exp = rnd.rand(10000, 3) * 200
+        val = exp + rnd.randn(10000, 3) * 10
+        res = streaming_scores(['mse'], _chunks(exp, val, 999))
+        self.assertAlmostEqual(res['mse'], mse(exp, val), delta=1e-9 * mse(exp, val))
+        res = streaming_scores(['l1_reg_max'], _chunks(exp[:, 0], val[:, 0], 999),
+                               l1_reg_max=dict(nomax=True))
+        self.assertAlmostEqual(res['l1_reg_max'], l1_reg_max(exp[:, 0], val[:, 0], nomax=True),
+                               delta=1e-12)
+        m1 = streaming_metric('mse').update(exp[:5000], val[:5000])
+        m2 = streaming_metric('mse').update(exp[5000:], val[5000:])
+        self.assertAlmostEqual(m1.merge(m2).result(), mse(exp, val), delta=1e-9)
+        self.assertRaise(lambda: m1.update(exp, val[:, :2]), ValueError)
+        self.assertRaise(lambda: m1.merge(streaming_metric('l1_reg_max')), TypeError)
+        self.assertRaise(lambda: streaming_metric('unknown'), ValueError)
+
+    def test_jaccard(self):
+        exp = ["a,b", "b", "c,d,e", "a", "f"] * 7
+        val = ["a", "b,c", "c,d", "g", "f"] * 7
+        res = streaming_scores(['multi_label_jaccard'], _chunks(
+            numpy.array(exp, dtype=object), numpy.array(val, dtype=object), 4))
+        self.assertAlmostEqual(res['multi_label_jaccard'], multi_label_jaccard(exp, val),
+                               delta=1e-12)
+        sets = numpy.empty(2, dtype=object)
+        sets[:] = [{"a", "b"}, {"c"}]
+        self.assertEqual(streaming_metric('multi_label_jaccard').update(
+            sets, numpy.array(["a", "c"], dtype=object)).result(), 0.75)
+        self.assertRaise(lambda: streaming_metric('multi_label_jaccard').result(),
+                         ZeroDivisionError)
+
+    def test_auc(self):
+        rnd = numpy.random.RandomState(0)
+        exp = rnd.randint(0, 2, (20000, 4))
+        val = numpy.clip(exp * 0.3 + rnd.rand(20000, 4) * 0.7, 0, 1)
+        for met, fct in [('roc_auc_score_micro', roc_auc_score_micro),
+                         ('roc_auc_score_macro', roc_auc_score_macro)]:
+            acc = streaming_metric(met)
+            for e, v in _chunks(exp, val, 3000):
+                acc.update(e, v)
+            exact = fct(exp, val)
+            self.assertLess(abs(acc.result() - exact), acc.error_bound() + 1e-12)
+            self.assertLess(acc.error_bound(), 1e-3)
+
+        # binary, scores rounded so that every bin has ties
+        y = exp[:, 0]
+        s = numpy.round(val[:, 0], 2)
+        acc = StreamingRocAuc(bins=100)
+        for e, v in _chunks(y, s, 777):
+            acc.update(e, v)
+        self.assertLess(abs(acc.result() - roc_auc_score_micro(y, s)), acc.error_bound() + 1e-12)
+
+        # labels and one score per class
+        labels = rnd.randint(0, 3, 3000)
+        scores = rnd.rand(3000, 3)
+        scores[numpy.arange(3000), labels] += 0.5
+        acc = StreamingRocAuc(average='macro', high=1.5)
+        for e, v in _chunks(labels, scores, 1000):
+            acc.update(e, v)
+        exact = roc_auc_score_macro(labels, scores)
+        self.assertLess(abs(acc.result() - exact), acc.error_bound() + 1e-12)
+
+        acc = StreamingRocAuc().update(numpy.array([1, 1]), numpy.array([0.2, 0.4]))
+        self.assertRaise(acc.result, ValueError)
+        self.assertRaise(lambda: StreamingRocAuc(average='weighted'), ValueError)
+        self.assertRaise(lambda: acc.merge(StreamingRocAuc(bins=10)), ValueError)
+
+    def test_csv_chunks(self):
+        exp = pandas.DataFrame(dict(k=range(100), v=numpy.arange(100) * 2.))
+        val = pandas.DataFrame(dict(k=range(100), v=numpy.arange(100) * 2. + 1))
+        se, sv = io.StringIO(), io.StringIO()
+        exp.to_csv(se, index=False, header=False, sep=";")
+        val.to_csv(sv, index=False, header=False, sep=";")
+        res = streaming_scores(['l1_reg_max'], iter_csv_chunks(
+            io.StringIO(se.getvalue()), io.StringIO(sv.getvalue()),
+            chunksize=7, header=None, sep=";"))
+        self.assertAlmostEqual(res['l1_reg_max'], 0.9 / 180, delta=1e-12)
+        sv = io.StringIO()
+        val[:50].to_csv(sv, index=False)
+        self.assertRaise(lambda: list(iter_csv_chunks(
+            io.StringIO(se.getvalue()), sv, chunksize=7)), ValueError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+@brief      test log(time=5s)
+"""
+import os
+import subprocess
+import sys
+import unittest
+from pyquickhelper.pycode import ExtTestCase
+
+
+class TestImportTime(ExtTestCase):
+
+    def _run(self, code):
+        src = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+        env = os.environ.copy()
+        env["PYTHONPATH"] = os.pathsep.join([src, env.get("PYTHONPATH", "")])
+        out = subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return out.stdout.decode('utf-8').strip().split("\n")
+
+    def test_import_lightmlboard(self):
+        code = "\n".join([
+            "import sys, time",
+            "begin = time.perf_counter()",
+            "import lightmlboard",
+            "print(time.perf_counter() - begin)",
+            "print(','.join(m for m in ['tornado', 'pandas', 'numpy', 'sklearn']",
+            "               if m in sys.modules))",
+            "from lightmlboard import LightMLBoard",
+            "print(LightMLBoard.__name__)",
+        ])
+        duration, modules, name = self._run(code)
+        self.assertEqual(modules, "")
+        self.assertEqual(name, "LightMLBoard")
+        self.assertLess(float(duration), 0.2)
+        self.assertRaise(lambda: getattr(__import__('lightmlboard'), 'Unknown'), AttributeError)
+
+    def test_sklearn_on_first_use(self):
+        code = "\n".join([
+            "import sys",
+            "from lightmlboard.dbmanager import DatabaseCompetition",
+            "from lightmlboard.competition import Competition",
+            "cp = Competition(0, '', '', '', 'roc_auc_score_micro,l1_reg_max',",
+            "                 expected_values=[0, 1, 1])",
+            "cp.evaluate([0.1, 0.6, 0.8])",
+            "print('sklearn' in sys.modules)",
+            "cp = Competition(0, '', '', '', 'log_loss', expected_values=[0, 1, 1])",
+            "print('sklearn' in sys.modules)",
+        ])
+        self.assertEqual(self._run(code), ["False", "True"])
+
+
+if __name__ == "__main__":
+    unittest.main()
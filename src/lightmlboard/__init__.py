@@ -3,8 +3,10 @@
 @file
 @brief Module *lightmlboard*.
 Custom Machine Learning Leaderbord for a competition.
+The submodules are imported when they are first used,
+``import lightmlboard`` does not import :epkg:`tornado`,
+:epkg:`pandas` or :epkg:`scikit-learn`.
 """
-from .appml import LightMLBoard
 
 __version__ = "0.2.104"
 __author__ = "Xavier Dupré"
@@ -28,6 +30,17 @@ __blog__ = """
 """
 
 
+def __getattr__(name):
+    """
+    Imports @see cl LightMLBoard the first time it is requested.
+    """
+    if name == "LightMLBoard":
+        from .appml import LightMLBoard
+        globals()[name] = LightMLBoard
+        return LightMLBoard
+    raise AttributeError("module '{0}' has no attribute '{1}'".format(__name__, name))
+
+
 def check(log=False):
     """
     Checks the library is working.
@@ -3,16 +3,26 @@
 @brief Defines a Tornado application.
 Tutorial `chat <https://github.com/tornadoweb/tornado/tree/stable/demos/chat>`_.
 """
+import asyncio
 import logging
 import os
 import pprint
+import signal
+import sys
+import time
 from tornado.web import Application
 from tornado.web import StaticFileHandler
 from tornado.log import enable_pretty_logging
-from .handlersml import MainHandler, LoginHandler, LogoutHandler, UploadData, SubmitForm, CompetitionHandler
+from .handlersml import MainHandler, LoginHandler, LogoutHandler, UploadData, SubmitForm, CompetitionHandler, StatusHandler
+from .handlersml import ApiCompetitionsHandler, ApiLeaderboardHandler, ApiSubmissionsHandler, LiveHandler
 from .default_options import LightMLBoardDefaultOptions
 from .options_helpers import read_options, read_users
 from .dbmanager import DatabaseCompetition
+from .evaluation import EvaluationQueue
+from .dbasync import AsyncDatabaseCompetition
+from .cache import PageCache
+from .live import LiveBroadcaster
+from .prefork import PreforkSupervisor
 
 
 class LightMLBoard(Application):
@@ -30,11 +40,48 @@ class LightMLBoard(Application):
             settings['login_url'] = "/login"
         if "xsrf_cookies" not in settings:
             settings["xsrf_cookies"] = True
+        if "compress_response" not in settings:
+            settings["compress_response"] = True
 
         Application.__init__(self, handlers=handlers, default_host=default_host,
                              transforms=transforms, **settings)
         app_log = logging.getLogger("tornado.application")
         app_log.info('[LightMLBoard] Settings: {0}'.format(settings))
+        self.active_requests = 0
+        self.evaluation_queue = None
+        self.live = None
+
+    async def shutdown(self, server, timeout=30.):
+        """
+        Stops the server gracefully: no new connection is accepted,
+        the live streams are closed, the requests in progress
+        and the running evaluations complete within *timeout* seconds,
+        the jobs not started stay pending, then the
+        :epkg:`tornado:IOLoop` stops.
+
+        @param      server      :epkg:`tornado:HTTPServer`
+        @param      timeout     maximum waiting time in seconds
+        """
+        app_log = logging.getLogger("tornado.application")
+        app_log.info('[LightMLBoard] shutdown, {0} request(s) in progress'.format(
+            self.active_requests))
+        server.stop()
+        if self.live is not None:
+            self.live.close()
+        queue = self.evaluation_queue
+        if queue is not None:
+            queue.close()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and (
+                self.active_requests > 0 or (queue is not None and queue.running > 0)):
+            await asyncio.sleep(0.05)
+        await server.close_all_connections()
+        if queue is not None:
+            queue.shutdown(wait=False)
+            queue._adb.shutdown(wait=True)  # pylint: disable=W0212
+            queue._adb.db.close()  # pylint: disable=W0212
+        from tornado.ioloop import IOLoop  # pylint: disable=C0415
+        IOLoop.current().stop()
 
     @staticmethod
     def update_options(config_options):
@@ -46,6 +93,7 @@ class LightMLBoard(Application):
         debug = False
         cookie_secret = None
         enablelog = False
+        executor = {}
         for opts in [LightMLBoardDefaultOptions.__dict__,
                      config_options]:
             for k, v in opts.items():
@@ -60,20 +108,26 @@ class LightMLBoard(Application):
                         enablelog = v
                     elif k == "allowed_users":
                         context[k] = v
+                    elif k in ("executor_workers", "executor_queue",
+                               "evaluation_workers", "evaluation_processes",
+                               "page_cache_bytes", "upload_max_bytes"):
+                        executor[k] = v
                     else:
                         context["tmpl_" + k] = v
         app_options = dict(lang=lang, debug=debug, enablelog=enablelog,
-                           cookie_secret=cookie_secret)
+                           cookie_secret=cookie_secret, **executor)
         return context, app_options
 
     @staticmethod
-    def make_app(config=None, logged=None, dbfile=":memory:"):
+    def make_app(config=None, logged=None, dbfile=":memory:", shared=False):
         """
         Creates a *LightMLBoard* application.
 
         @param      config      configuration file
         @param      logged      to log one user
         @param      dbfile      file for the db file
+        @param      shared      the database is shared with other processes,
+                                see @see cl DatabaseCompetition
         @return                 @see cl LightMLBoard
         """
         this = os.path.dirname(__file__)
@@ -93,9 +147,22 @@ class LightMLBoard(Application):
 
         # db manager
         if config is not None:
-            dbman = DatabaseCompetition(dbfile)
+            dbman = DatabaseCompetition(dbfile, pool=dbfile != ":memory:", shared=shared)
+            dbman.connect()
             dbman.init_from_options(context)
-            context['dbman'] = dbman
+            context['dbman'] = AsyncDatabaseCompetition(
+                dbman, max_workers=local_context['executor_workers'],
+                queue_depth=local_context['executor_queue'])
+            context['evalqueue'] = EvaluationQueue(
+                context['dbman'], max_workers=local_context['evaluation_workers'],
+                processes=local_context['evaluation_processes'])
+            context['pagecache'] = PageCache(local_context['page_cache_bytes'])
+            context['live'] = LiveBroadcaster()
+            dbman.add_listener(context['live'].publish)
+            if shared:
+                context['live'].watch(dbman.get_version)
+
+        context['uploadmax'] = local_context['upload_max_bytes']
 
         # We remove the users.
         del context['allowed_users']
@@ -120,22 +187,98 @@ class LightMLBoard(Application):
             (r'/submit', SubmitForm, context),
             (r'/upload', UploadData, context),
             (r'/competition', CompetitionHandler, context),
+            (r'/status', StatusHandler, context),
+            (r'/api/competitions', ApiCompetitionsHandler, context),
+            (r'/api/leaderboard', ApiLeaderboardHandler, context),
+            (r'/api/submissions', ApiSubmissionsHandler, context),
+            (r'/live', LiveHandler, context),
         ]
 
         args = dict(lang=local_context["lang"], debug=local_context['debug'])
         if 'cookie_secret' in local_context:
             args['cookie_secret'] = local_context['cookie_secret']
-        return LightMLBoard(pages, **args)
+        app = LightMLBoard(pages, **args)
+        app.evaluation_queue = context.get('evalqueue', None)
+        app.live = context.get('live', None)
+        return app
 
     @staticmethod
-    def start_app(port=8897, **kwargs):
+    def _release_jobs(config, dbfile, worker=None):
         """
-        Starts the application.
+        Initializes the database shared by several processes
+        (see @see me start_app) and releases the jobs left running
+        by the processes which stopped.
 
-        @param      port        port to listen
-        @param      kwargs      @see me make_app
+        @param      config      configuration file
+        @param      dbfile      database file
+        @param      worker      process id, None for all of them
+        @return                 number of released jobs
         """
-        import tornado.ioloop  # pylint: disable=C0415
-        app = LightMLBoard.make_app(**kwargs)
-        app.listen(port)
-        tornado.ioloop.IOLoop.current().start()
+        dbman = DatabaseCompetition(dbfile, pool=True)
+        dbman.connect()
+        try:
+            if worker is None:
+                context = LightMLBoard.update_options(read_options(config))[0]
+                dbman.init_from_options(context)
+            return dbman.release_jobs(worker)
+        finally:
+            dbman.close()
+
+    @staticmethod
+    def start_app(port=8897, processes=1, shutdown_timeout=30., **kwargs):
+        """
+        Starts the application. Signal *SIGTERM* stops the server
+        once the requests in progress are completed (see @see me shutdown).
+        With several processes, every process accepts the connections
+        received on the same port (see @see cl PreforkSupervisor)
+        and opens its own connections to the database, which must be a file.
+        Signal *SIGHUP* sent to the main process restarts
+        the processes one after another.
+
+        @param      port                port to listen
+        @param      processes           number of processes, 0 for the number of CPUs
+        @param      shutdown_timeout    maximum time in seconds given to the requests
+                                        in progress when the server stops
+        @param      kwargs              @see me make_app
+        """
+        from tornado.httpserver import HTTPServer  # pylint: disable=C0415
+        from tornado.ioloop import IOLoop  # pylint: disable=C0415
+        from tornado.netutil import bind_sockets  # pylint: disable=C0415
+        if processes == 1:
+            app = LightMLBoard.make_app(**kwargs)
+            server = HTTPServer(app)
+            server.listen(port)
+        else:
+            config = kwargs.get('config', None)
+            dbfile = kwargs.get('dbfile', ":memory:")
+            if config is None or dbfile == ":memory:":
+                raise ValueError("Several processes require a configuration "
+                                 "and a database file (dbfile).")
+            sockets = bind_sockets(port)
+            # The database is initialized once, before any process starts.
+            LightMLBoard._release_jobs(config, dbfile)
+            supervisor = PreforkSupervisor(
+                processes, timeout=shutdown_timeout + 5,
+                on_exit=lambda pid: LightMLBoard._release_jobs(config, dbfile, pid))
+            if supervisor.start() is None:
+                # main process, every process stopped
+                for sock in sockets:
+                    sock.close()
+                return
+            app = LightMLBoard.make_app(shared=True, **kwargs)
+            server = HTTPServer(app)
+            server.add_sockets(sockets)
+
+        loop = IOLoop.current()
+        try:
+            loop.asyncio_loop.add_signal_handler(
+                signal.SIGTERM, lambda: loop.spawn_callback(app.shutdown, server, shutdown_timeout))
+        except NotImplementedError:
+            # Windows
+            pass
+        if app.evaluation_queue is not None:
+            # other processes may be evaluating jobs
+            loop.spawn_callback(app.evaluation_queue.recover, processes == 1)
+        loop.start()
+        if processes != 1:
+            sys.exit(0)
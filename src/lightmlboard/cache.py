@@ -0,0 +1,202 @@
+"""
+@file
+@brief In-process cache for the expected values of competitions.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def fingerprint(values):
+    """
+    Returns a fingerprint of the expected values
+    as they are stored in the database.
+
+    @param      values      text or bytes
+    @return                 hexadecimal string
+    """
+    if isinstance(values, str):
+        values = values.encode('utf-8')
+    elif isinstance(values, memoryview):
+        values = values.tobytes()
+    return hashlib.sha1(values).hexdigest()
+
+
+class GroundTruthCache:
+    """
+    Keeps the parsed expected values of competitions as
+    :epkg:`numpy` arrays. An entry is keyed by ``(cpt_id, fingerprint)``
+    so that a competition whose expected values change in the database
+    gets a new entry, the previous one is dropped.
+    The least recently used entries are evicted first when
+    the arrays take more than *max_bytes*.
+    """
+
+    def __init__(self, max_bytes=2 ** 28):
+        """
+        @param      max_bytes       memory cap (sum of ``nbytes``)
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        "Returns the number of cached arrays."
+        return len(self._data)
+
+    @property
+    def nbytes(self):
+        "Returns the memory taken by the cached arrays."
+        return self._nbytes
+
+    def stats(self):
+        """
+        Returns the counters as a dictionary.
+        """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses,
+                        evictions=self.evictions, size=len(self._data),
+                        nbytes=self._nbytes, max_bytes=self.max_bytes)
+
+    def get(self, cpt_id, fprint, loader=None):
+        """
+        Returns the cached array for a competition.
+
+        @param      cpt_id      competition id
+        @param      fprint      fingerprint of the stored values, see @see fn fingerprint
+        @param      loader      function with no argument returning the array,
+                                called on a miss
+        @return                 array or None if not found and *loader* is None
+        """
+        key = (cpt_id, fprint)
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+        if loader is None:
+            return None
+        value = loader()
+        self.put(cpt_id, fprint, value)
+        return value
+
+    def put(self, cpt_id, fprint, value):
+        """
+        Stores an array, drops any other entry for the same
+        competition and evicts the least recently used entries
+        if the memory cap is exceeded. An array bigger than
+        the cap is not stored.
+
+        @param      cpt_id      competition id
+        @param      fprint      fingerprint of the stored values
+        @param      value       array
+        """
+        size = value.nbytes
+        with self._lock:
+            self._invalidate(cpt_id, keep=fprint)
+            if size > self.max_bytes:
+                return
+            key = (cpt_id, fprint)
+            if key in self._data:
+                self._nbytes -= self._data[key].nbytes
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._nbytes += size
+            while self._nbytes > self.max_bytes and len(self._data) > 1:
+                _, old = self._data.popitem(last=False)
+                self._nbytes -= old.nbytes
+                self.evictions += 1
+
+    def invalidate(self, cpt_id=None):
+        """
+        Removes the entries of a competition or every entry
+        if *cpt_id* is None.
+        """
+        with self._lock:
+            if cpt_id is None:
+                self._data.clear()
+                self._nbytes = 0
+            else:
+                self._invalidate(cpt_id)
+
+    def _invalidate(self, cpt_id, keep=None):
+        for key in [k for k in self._data if k[0] == cpt_id and k[1] != keep]:
+            self._nbytes -= self._data.pop(key).nbytes
+
+
+class PageCache:
+    """
+    Keeps the pages rendered for a competition.
+    An entry is keyed by ``(cpt_id, version, user, query)``, the version
+    changes with every submission (see @see me get_version), storing
+    a page drops the pages rendered for a previous version of the
+    same competition. The least recently used pages are evicted first
+    when they take more than *max_bytes*.
+    """
+
+    def __init__(self, max_bytes=2 ** 24):
+        """
+        @param      max_bytes       memory cap (sum of the page sizes)
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        "Returns the number of cached pages."
+        return len(self._data)
+
+    def stats(self):
+        """
+        Returns the counters as a dictionary.
+        """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses,
+                        evictions=self.evictions, size=len(self._data),
+                        nbytes=self._nbytes, max_bytes=self.max_bytes)
+
+    def get(self, key):
+        """
+        Returns a cached page.
+
+        @param      key     ``(cpt_id, version, user, query)``
+        @return             bytes or None
+        """
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+        return None
+
+    def put(self, key, page):
+        """
+        Stores a page.
+
+        @param      key     ``(cpt_id, version, user, query)``
+        @param      page    bytes
+        """
+        with self._lock:
+            for old in [k for k in self._data if k[0] == key[0] and k[1] != key[1]]:
+                self._nbytes -= len(self._data.pop(old))
+            if len(page) > self.max_bytes:
+                return
+            if key in self._data:
+                self._nbytes -= len(self._data[key])
+            self._data[key] = page
+            self._data.move_to_end(key)
+            self._nbytes += len(page)
+            while self._nbytes > self.max_bytes and len(self._data) > 1:
+                _, old = self._data.popitem(last=False)
+                self._nbytes -= len(old)
+                self.evictions += 1
@@ -6,7 +6,10 @@
 from io import StringIO
 import numpy
 import pandas
-from .metrics import mse, sklearn_metric, roc_auc_score_macro, roc_auc_score_micro
+from .cache import fingerprint
+from .storage import array_to_blob, blob_to_array, can_store_binary, is_blob
+from .parsers import PredictionSchema, parse_predictions
+from .metrics import evaluate_metric, evaluate_metrics, evaluate_metrics_batch, get_metric
 
 
 class Competition:
@@ -14,7 +17,8 @@ class Competition:
     Defines a competition.
     """
 
-    def __init__(self, cpt_id, link, name, description, metric, datafile=None, expected_values=None):
+    def __init__(self, cpt_id, link, name, description, metric, datafile=None,
+                 expected_values=None, schema=None):
         """
         @param      cpt_id              competition id
         @param      link                link to the page, something like ``/competition``
@@ -22,7 +26,12 @@ class Competition:
         @param      metric              metric or list of metrics, list of metrics to compute
         @param      description         description
         @param      datafile            data file
-        @param      expected_values     expected values for each metric
+        @param      expected_values     expected values for each metric,
+                                        filename, CSV text, bytes produced by
+                                        @see fn array_to_blob, list, array or dataframe
+        @param      schema              expected format of the submissions,
+                                        @see cl PredictionSchema, dictionary,
+                                        JSON string or None
         """
         self.link = link
         self.name = name
@@ -32,16 +41,29 @@ class Competition:
         if not isinstance(metric, list):
             metric = [metric]
         self.metrics = metric
+        self._metric_infos = [get_metric(m) for m in metric]
         self.datafile = datafile
         self.description = description
         self.expected_values = self._load_values(expected_values)
+        self.schema = PredictionSchema.load(schema)
+        self.parse_info = None
+        self._reshape_cache = {}
 
     def _load_values(self, values):
         """
         Converts values into a list of list of values,
         one per metrics.
         """
-        if isinstance(values, str):
+        if is_blob(values):
+            arr, columns = blob_to_array(values)
+            if len(arr.shape) == 1:
+                arr = arr.reshape((-1, 1))
+            res = pandas.DataFrame(arr, copy=False)
+            if columns is not None:
+                res.columns = columns
+            else:
+                res.columns = ["exp%d" % i for i in range(res.shape[1])]
+        elif isinstance(values, str):
             if '\n' in values:
                 st = StringIO(values)
                 res = pandas.read_csv(st)
@@ -61,23 +83,59 @@ class Competition:
             res.columns = ["exp%d" % i for i in range(res.shape[1])]
         elif isinstance(values, pandas.DataFrame):
             res = values
+        elif isinstance(values, numpy.ndarray):
+            if len(values.shape) == 1:
+                values = values.reshape((-1, 1))
+            res = pandas.DataFrame(values, copy=False)
+            res.columns = ["exp%d" % i for i in range(res.shape[1])]
         else:
             raise TypeError(
                 "Unexpected type for expected_values: {0}".format(type(values)))
         return res
 
+    def _load_predictions(self, values):
+        """
+        Converts the values of a submission into a dataframe.
+        A :epkg:`CSV` content (bytes or text) is parsed
+        by @see fn parse_predictions with the schema of the competition,
+        the parsing information is stored in attribute *parse_info*.
+        Other types are handled by @see me _load_values.
+        """
+        if ((isinstance(values, (bytes, bytearray, memoryview)) and not is_blob(values)) or
+                (isinstance(values, str) and '\n' in values)):
+            res, self.parse_info = parse_predictions(values, self.schema)
+            return res
+        self.parse_info = None
+        return self._load_values(values)
+
     def evaluate(self, values):
         """
         Evaluates received values.
 
         @param      values      list of values
         @return                 dictionary {metric: res}
+
+        The values are parsed once for all metrics,
+        see @see fn evaluate_metrics. The metrics were resolved
+        when the competition was created (see @see fn get_metric).
+        The indicator matrix built from the expected values
+        is kept for the next evaluations.
         """
-        res = {}
-        values = self._load_values(values)
-        for met in self.metrics:
-            res[met] = self.evaluate_metric(met, self.expected_values, values)
-        return res
+        values = self._load_predictions(values)
+        return evaluate_metrics(self._metric_infos, self.expected_values, values,
+                                cache=self._reshape_cache)
+
+    def evaluate_batch(self, list_values):
+        """
+        Evaluates several submissions,
+        see @see fn evaluate_metrics_batch.
+
+        @param      list_values     list of values
+        @return                     dictionary ``{metric: list of results}``
+        """
+        list_values = [self._load_predictions(values) for values in list_values]
+        return evaluate_metrics_batch(self._metric_infos, self.expected_values, list_values,
+                                      cache=self._reshape_cache)
 
     def evaluate_metric(self, met, exp, val):
         """
@@ -88,14 +146,9 @@ class Competition:
         @param      val     values
         @return             result
         """
-        if met == "mse":
-            return mse(exp, val)
-        elif met == "roc_auc_score_micro":
-            return roc_auc_score_micro(exp, val)
-        elif met == "roc_auc_score_macro":
-            return roc_auc_score_macro(exp, val)
-        else:
-            return sklearn_metric(met, exp, val)
+        if exp is self.expected_values:
+            return evaluate_metric(met, exp, val, cache=self._reshape_cache)
+        return evaluate_metric(met, exp, val)
 
     @property
     def metric(self):
@@ -104,29 +157,61 @@ class Competition:
         """
         return ",".join(self.metrics)
 
-    def to_dict(self):
+    def _dump_values(self, storage='csv', compression=None):
+        """
+        Serializes the expected values.
+
+        @param      storage         ``'csv'`` (text), ``'binary'``
+                                    (see @see fn array_to_blob) or ``'auto'``
+                                    (binary if every column is numerical)
+        @param      compression     compression for the binary storage
+        @return                     str or bytes
+        """
+        if storage == 'auto':
+            storage = 'binary' if can_store_binary(
+                self.expected_values) else 'csv'
+        if storage == 'binary':
+            return array_to_blob(self.expected_values, compression=compression)
+        if storage == 'csv':
+            s = StringIO()
+            self.expected_values.to_csv(s, index=False)
+            return s.getvalue()
+        raise ValueError("Unknown storage '{0}'.".format(storage))
+
+    def to_dict(self, storage='csv', compression=None):
         """
         Convert a competition into a dictionary.
+
+        @param      storage         storage for the expected values,
+                                    ``'csv'``, ``'binary'`` or ``'auto'``
+        @param      compression     compression for the binary storage,
+                                    None, ``'zlib'`` or ``'lzma'``
         """
-        s = StringIO()
-        self.expected_values.to_csv(s, index=False)
-        val = s.getvalue()
+        val = self._dump_values(storage=storage, compression=compression)
         return dict(cpt_id=self.cpt_id, link=self.link, name=self.name,
                     description=self.description, expected_values=val,
-                    metric=",".join(self.metrics), datafile=self.datafile)
+                    metric=",".join(self.metrics), datafile=self.datafile,
+                    schema=None if self.schema is None else self.schema.to_dict())
 
     @staticmethod
-    def to_records(list_cpt):
+    def to_records(list_cpt, storage='csv', compression=None):
         """
         Converts a list of competitions into a list of dictionaries.
+
+        @param      list_cpt        list of competitions
+        @param      storage         storage for the expected values,
+                                    ``'csv'``, ``'binary'`` or ``'auto'``
+        @param      compression     compression for the binary storage,
+                                    None, ``'zlib'`` or ``'lzma'``
         """
         res = []
         for cpt in list_cpt:
+            val = cpt._dump_values(storage=storage, compression=compression)  # pylint: disable=W0212
+            fprint = fingerprint(val)
+            schema = None if cpt.schema is None else cpt.schema.to_json()
             for met in cpt.metrics:
-                s = StringIO()
-                cpt.expected_values.to_csv(s, index=False)
-                val = s.getvalue()
                 d = dict(link=cpt.link, cpt_name=cpt.name, metric=met,
-                         description=cpt.description, expected_values=val)
+                         description=cpt.description, expected_values=val,
+                         expected_fingerprint=fprint, schema=schema)
                 res.append(d)
         return res
@@ -0,0 +1,150 @@
+"""
+@file
+@brief Runs the queries of @see cl DatabaseCompetition
+outside the :epkg:`tornado` IOLoop.
+"""
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from tornado.ioloop import IOLoop
+
+
+class QueueFullError(Exception):
+    """
+    Raised by @see cl AsyncDatabaseCompetition when too many
+    calls are waiting for a thread.
+    """
+    pass
+
+
+class AsyncDatabaseCompetition:
+    """
+    Asynchronous facade over @see cl DatabaseCompetition.
+    Every method runs the corresponding one in a bounded
+    :epkg:`ThreadPoolExecutor` through ``IOLoop.run_in_executor``
+    so that a slow query or a slow metric does not freeze
+    the other requests. The database should be created with
+    ``pool=True`` so that threads read concurrently.
+    A database in memory holds a single connection,
+    it is used by a single thread.
+    """
+
+    def __init__(self, db, max_workers=4, queue_depth=64):
+        """
+        @param      db              @see cl DatabaseCompetition
+        @param      max_workers     number of threads
+        @param      queue_depth     maximum number of pending calls,
+                                    @see cl QueueFullError is raised beyond
+        """
+        if db._is_memory():  # pylint: disable=W0212
+            max_workers = 1
+        self._db = db
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="lightmlboard")
+
+    @property
+    def db(self):
+        "Returns the wrapped database."
+        return self._db
+
+    @property
+    def pending(self):
+        "Returns the number of pending calls."
+        return self._pending
+
+    async def run(self, fct, *args, bounded=True, **kwargs):
+        """
+        Runs a function in the executor.
+        It must be called from the IOLoop thread.
+
+        @param      fct         function
+        @param      args        positional arguments
+        @param      bounded     raises @see cl QueueFullError if too many
+                                calls are pending, background tasks
+                                which must not fail use False
+        @param      kwargs      named arguments
+        @return                 result of the function
+        """
+        if bounded and self._pending >= self.queue_depth:
+            raise QueueFullError("Too many pending calls ({0}).".format(self._pending))
+        self._pending += 1
+        try:
+            return await IOLoop.current().run_in_executor(
+                self._executor, functools.partial(fct, *args, **kwargs))
+        finally:
+            self._pending -= 1
+
+    async def get_competitions(self, columns=None):
+        """
+        See @see me get_competitions, returns a list.
+        """
+        return await self.run(lambda: list(self._db.get_competitions(columns)))
+
+    async def get_competition(self, cpt_id):
+        """
+        See @see me get_competition.
+        """
+        return await self.run(self._db.get_competition, cpt_id)
+
+    async def get_results(self, cpt_id, **kwargs):
+        """
+        See @see me get_results.
+        """
+        return await self.run(self._db.get_results, cpt_id, **kwargs)
+
+    async def get_leaderboard(self, cpt_id, metric, **kwargs):
+        """
+        See @see me get_leaderboard.
+        """
+        return await self.run(self._db.get_leaderboard, cpt_id, metric, **kwargs)
+
+    async def get_leaderboard_rows(self, cpt_id, metric, **kwargs):
+        """
+        See @see me get_leaderboard_rows.
+        """
+        return await self.run(self._db.get_leaderboard_rows, cpt_id, metric, **kwargs)
+
+    async def get_player_submissions(self, player_id, **kwargs):
+        """
+        See @see me get_player_submissions.
+        """
+        return await self.run(self._db.get_player_submissions, player_id, **kwargs)
+
+    async def submit(self, cpt_id, player_id, data, **kwargs):
+        """
+        See @see me submit, the metrics are computed in a thread.
+        """
+        return await self.run(self._db.submit, cpt_id, player_id, data, **kwargs)
+
+    def get_version(self, cpt_id):
+        """
+        See @see me get_version, the versions are kept in memory,
+        the function does not use the threads.
+        """
+        return self._db.get_version(cpt_id)
+
+    async def get_player_id_from_login(self, login):
+        """
+        See @see me get_player_id_from_login.
+        """
+        return await self.run(self._db.get_player_id_from_login, login)
+
+    async def get_prediction_schema(self, cpt_id):
+        """
+        See @see me get_prediction_schema.
+        """
+        return await self.run(self._db.get_prediction_schema, cpt_id)
+
+    async def get_job(self, job_id):
+        """
+        See @see me get_job.
+        """
+        return await self.run(self._db.get_job, job_id)
+
+    def shutdown(self, wait=True):
+        """
+        Stops the threads.
+        """
+        self._executor.shutdown(wait=wait)
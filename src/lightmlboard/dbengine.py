@@ -2,10 +2,18 @@
 @file
 @brief Manages a sqlite3 database.
 """
+import base64
+import csv
+import json
 import sqlite3
 import datetime
 import decimal
+import re
+import threading
+import weakref
+from contextlib import contextmanager
 import numpy
+import pandas
 
 
 class DBException(Exception):
@@ -15,19 +23,59 @@ class DBException(Exception):
     pass
 
 
+class _ReaderHolder:
+    """
+    Holds the reader connection of a thread in a
+    :epkg:`threading:local`, the connection is closed when
+    the thread ends and this object is garbage collected.
+    """
+    __slots__ = ('connection', 'generation', '__weakref__')
+
+    def __init__(self, connection, generation):
+        self.connection = connection
+        self.generation = generation
+
+
 class Database:
     """
     Common functions about sqlite3.
+
+    By default, the class holds a single connection.
+    With ``pool=True``, the database must be a file, it is switched
+    to `WAL <https://www.sqlite.org/wal.html>`_ mode, every thread
+    reading the database gets its own connection and a single
+    connection protected by a lock is used to write,
+    see @see me transaction. Readers do not block the writer
+    and the writer does not block readers.
     """
 
     _field_option = ["PRIMARYKEY", "AUTOINCREMENT", "AUTOFILL"]
+    _cached_statements = 256
+    _default_pragmas = dict(journal_mode="WAL", synchronous="NORMAL",
+                            mmap_size=2 ** 28, cache_size=-65536)
 
-    def __init__(self, dbfile):
+    def __init__(self, dbfile, pool=False, pragmas=None):
         """
         @param      dbfile      filename or ``:memory:``
+        @param      pool        one connection per thread to read,
+                                one connection to write
+        @param      pragmas     pragmas applied to every connection in pool mode,
+                                they update the default ones
+                                (*journal_mode*, *synchronous*, *mmap_size*, *cache_size*)
         """
         self._sql_file = dbfile
         self._connection = None
+        self._pool = pool
+        if pool and self._is_memory():
+            raise ValueError("A database in memory cannot be used with pool=True.")
+        self._pragmas = Database._default_pragmas.copy()
+        if pragmas:
+            self._pragmas.update(pragmas)
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._readers_lock = threading.Lock()
+        self._readers = []
+        self._generation = 0
 
     def get_file(self):
         """
@@ -52,14 +100,103 @@ class Database:
     def connect(self):
         """
         Opens a connection to the database.
+        In pool mode, the function does nothing if the database
+        is already connected.
         """
         if self._is_memory():
             if self._connection is None:
-                self._connection = sqlite3.connect(self._sql_file)
+                # The connection is never closed and can be used
+                # by another thread, statements are serialized by the lock.
+                self._connection = self._new_connection(check_same_thread=False)
+        elif self._pool:
+            with self._lock:
+                if self._connection is None:
+                    self._connection = self._new_connection(
+                        writer=True, check_same_thread=False)
         elif self._connection is not None:
             raise Exception("A previous connection was not closed.")
         else:
-            self._connection = sqlite3.connect(self._sql_file)
+            self._connection = self._new_connection()
+
+    def _new_connection(self, writer=False, check_same_thread=True):
+        """
+        Creates a new connection. :epkg:`sqlite3` keeps
+        a cache of prepared statements per connection
+        keyed by the SQL text, queries with placeholders
+        are only prepared once.
+        """
+        con = sqlite3.connect(self._sql_file,
+                              cached_statements=self._cached_statements,
+                              check_same_thread=check_same_thread)
+        if self._pool:
+            for k, v in self._pragmas.items():
+                if k == 'journal_mode' and not writer:
+                    continue
+                con.execute("PRAGMA {0}={1}".format(k, v))
+            if not writer:
+                con.execute("PRAGMA query_only=ON")
+        return con
+
+    def _reader(self):
+        """
+        Returns the connection used to read in the current thread.
+        In pool mode, the writer connection is returned if the current
+        thread is inside a transaction to see its own changes.
+        """
+        self._check_connection()
+        if not self._pool or getattr(self._local, 'depth', 0) > 0:
+            return self._connection
+        holder = getattr(self._local, 'holder', None)
+        if holder is None or holder.generation != self._generation:
+            # The connection is only used by this thread but
+            # it may be closed by another one in method close
+            # or by the garbage collector when the thread ends.
+            con = self._new_connection(check_same_thread=False)
+            with self._readers_lock:
+                self._readers.append(con)
+            holder = _ReaderHolder(con, self._generation)
+            weakref.finalize(holder, Database._release_reader,
+                             self._readers_lock, self._readers, con)
+            self._local.holder = holder
+        return holder.connection
+
+    @staticmethod
+    def _release_reader(lock, readers, con):
+        """
+        Closes a reader connection whose thread has ended.
+        """
+        with lock:
+            if con in readers:
+                readers.remove(con)
+                con.close()
+
+    def _reader_count(self):
+        """
+        Returns the number of opened reader connections (pool mode).
+        """
+        with self._readers_lock:
+            return len(self._readers)
+
+    _write_keywords = re.compile(
+        "\\b(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\\b", re.IGNORECASE)
+
+    @staticmethod
+    def _is_read_request(request):
+        """
+        Tells if a request only reads the database:
+        *SELECT*, *EXPLAIN*, a *PRAGMA* which does not set a value
+        or a common table expression (*WITH*) not followed by
+        any modification.
+        """
+        request = request.lstrip()
+        start = request[:7].upper()
+        if start.startswith("SELECT") or start.startswith("EXPLAIN"):
+            return True
+        if start.startswith("PRAGMA"):
+            return "=" not in request
+        if start.startswith("WITH"):
+            return Database._write_keywords.search(request) is None
+        return False
 
     def close(self):
         """
@@ -70,6 +207,14 @@ class Database:
             # We should not close, otherwise, we lose the data.
             # self._connection = None
             pass
+        elif self._pool:
+            with self._lock, self._readers_lock:
+                for con in self._readers:
+                    con.close()
+                self._readers.clear()
+                self._generation += 1
+                self._connection.close()
+                self._connection = None
         else:
             self._connection.close()
             self._connection = None
@@ -79,26 +224,276 @@ class Database:
         Call this function after any insert request.
         """
         self._check_connection()
-        self._connection.commit()
+        with self._lock:
+            self._connection.commit()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager which holds the writer lock,
+        commits when leaving or rolls back if an exception is raised.
+        Transactions can be nested, only the outer one commits.
+
+        ::
+
+            with db.transaction():
+                db.execute("INSERT ...")
+        """
+        self._check_connection()
+        with self._lock:
+            depth = getattr(self._local, 'depth', 0)
+            self._local.depth = depth + 1
+            if depth == 0:
+                self._local.on_commit = []
+            try:
+                yield self
+            except BaseException:
+                if depth == 0:
+                    self._connection.rollback()
+                    self._local.on_commit = []
+                raise
+            else:
+                if depth == 0:
+                    self._connection.commit()
+                    callbacks = self._local.on_commit
+                    self._local.on_commit = []
+                    for fct in callbacks:
+                        fct()
+            finally:
+                self._local.depth = depth
+
+    def on_commit(self, fct):
+        """
+        Calls *fct* once the current transaction is committed,
+        immediately if there is no transaction. The function is not
+        called if the transaction is rolled back.
 
-    def execute(self, request):
+        @param      fct     function with no argument
+        """
+        if getattr(self._local, 'depth', 0) == 0:
+            fct()
+        else:
+            self._local.on_commit.append(fct)
+
+    def execute(self, request, params=None):
         """
         Open a cursor with a query and return it to the user.
+        In pool mode, a query which only reads is executed with the
+        connection of the current thread. Any other query runs on the
+        shared writer connection, the lock is only held for the statement,
+        modifications must be done inside @see me transaction so that
+        another thread does not commit or roll them back.
 
         @param      request         SQL request
+        @param      params          parameters for the placeholders (``?``)
         @return                     cursor
         """
         # classic ways
         self._check_connection()
-        cur = self._connection.cursor()
+        if self._pool and Database._is_read_request(request):
+            return self._execute(self._reader(), request, params)
+        with self._lock:
+            return self._execute(self._connection, request, params)
+
+    def _execute(self, con, request, params):
+        cur = con.cursor()
         try:
-            cur.execute(request)
+            if params is None:
+                cur.execute(request)
+            else:
+                cur.execute(request, params)
         except Exception as e:
             raise DBException(
                 "Unable to execute a SQL request (1) (file '%s')" %
                 self.get_file(), e, request) from e
         return cur
 
+    def executemany(self, request, seq_params):
+        """
+        Executes the same query for every set of parameters.
+
+        @param      request         SQL request with placeholders (``?``)
+        @param      seq_params      sequence of parameters
+        @return                     cursor
+        """
+        self._check_connection()
+        with self._lock:
+            cur = self._connection.cursor()
+            try:
+                cur.executemany(request, seq_params)
+            except Exception as e:
+                raise DBException(
+                    "Unable to execute a SQL request (2) (file '%s')" %
+                    self.get_file(), e, request) from e
+            return cur
+
+    def insert_rows(self, table, rows, columns=None):
+        """
+        Inserts rows into a table with a single prepared statement.
+        It does not commit.
+
+        @param      table       table name
+        @param      rows        list of dictionaries or list of tuples
+        @param      columns     column names, mandatory if *rows* are tuples,
+                                deduced from the first row otherwise
+        @return                 number of inserted rows
+        """
+        if not isinstance(rows, list):
+            rows = list(rows)
+        if len(rows) == 0:
+            return 0
+        if columns is None:
+            if not isinstance(rows[0], dict):
+                raise ValueError("columns must be specified if rows are not dictionaries.")
+            columns = list(rows[0])
+        if isinstance(rows[0], dict):
+            rows = [tuple(row[c] for c in columns) for row in rows]
+        sql = "INSERT INTO {0} ({1}) VALUES ({2})".format(
+            table, ", ".join(columns), ", ".join("?" for c in columns))
+        self.executemany(sql, rows)
+        return len(rows)
+
+    def insert_dataframe(self, table, df):
+        """
+        Inserts the rows of a dataframe with @see me insert_rows,
+        :epkg:`numpy` scalars are converted into python types.
+        Unlike :epkg:`pandas:DataFrame:to_sql`, it does not commit
+        and can be part of a transaction.
+
+        @param      table       table name
+        @param      df          :epkg:`pandas:DataFrame`
+        @return                 number of inserted rows
+        """
+        rows = [tuple(v.item() if isinstance(v, numpy.generic) else v for v in row)
+                for row in df.itertuples(index=False, name=None)]
+        return self.insert_rows(table, rows, columns=[str(c) for c in df.columns])
+
+    def iter_rows(self, table, columns=None, where=None, params=None, batch_size=10000):
+        """
+        Iterates on the rows of a table by batches,
+        only one batch is held in memory.
+
+        @param      table           table name
+        @param      columns         columns to return, None for all
+        @param      where           condition (SQL) with placeholders (``?``)
+        @param      params          parameters for the condition
+        @param      batch_size      number of rows in a batch
+        @return                     iterator on lists of tuples
+
+        ::
+
+            for rows in db.iter_rows("submissions", columns=["sub_id", "metric_value"],
+                                     where="cpt_id == ?", params=(0,)):
+                ...
+        """
+        if table not in self.get_table_list():
+            raise DBException("Unable to find table '{0}'.".format(table))
+        names = self.get_column_names(table)
+        if columns is None:
+            columns = names
+        for c in columns:
+            if c not in names:
+                raise DBException("Unable to find column '{0}' in table '{1}'.".format(c, table))
+        sql = "SELECT {0} FROM {1}".format(", ".join(columns), table)
+        if where:
+            sql += " WHERE " + where
+        cur = self.execute(sql, params)
+        try:
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if len(rows) == 0:
+                    break
+                yield rows
+        finally:
+            cur.close()
+
+    def iter_df(self, table, columns=None, where=None, params=None, batch_size=10000):
+        """
+        Same as @see me iter_rows but yields dataframes.
+        """
+        if columns is None:
+            columns = self.get_column_names(table)
+        for rows in self.iter_rows(table, columns=columns, where=where,
+                                   params=params, batch_size=batch_size):
+            yield pandas.DataFrame(rows, columns=columns)
+
+    @staticmethod
+    def _export_value(value, converter=None):
+        """
+        Converts a value before exporting it, bytes are encoded
+        in :epkg:`base64`.
+        """
+        if converter is not None:
+            value = converter(value)
+        if isinstance(value, (bytes, memoryview)):
+            return base64.b64encode(value).decode('ascii')
+        return value
+
+    def _export_rows(self, table, columns, where, params, batch_size, converters):
+        if columns is None:
+            columns = self.get_column_names(table)
+        conv = [(converters or {}).get(c, None) for c in columns]
+        for rows in self.iter_rows(table, columns=columns, where=where,
+                                   params=params, batch_size=batch_size):
+            yield columns, [[Database._export_value(v, f) for v, f in zip(row, conv)]
+                            for row in rows]
+
+    def export_csv(self, filename, table, columns=None, where=None, params=None,
+                   batch_size=10000, converters=None):
+        """
+        Exports a table into a CSV file, batch by batch,
+        the memory does not depend on the table size.
+
+        @param      filename        filename or stream
+        @param      table           table name
+        @param      columns         columns to export, None for all
+        @param      where           condition (SQL) with placeholders (``?``)
+        @param      params          parameters for the condition
+        @param      batch_size      number of rows in a batch
+        @param      converters      dictionary ``{column: function}`` applied
+                                    to the values before writing them
+        @return                     number of exported rows
+        """
+        if isinstance(filename, str):
+            with open(filename, "w", encoding="utf-8", newline="") as f:
+                return self.export_csv(f, table, columns=columns, where=where, params=params,
+                                       batch_size=batch_size, converters=converters)
+        writer = csv.writer(filename)
+        nb = 0
+        header = False
+        for cols, rows in self._export_rows(table, columns, where, params,
+                                            batch_size, converters):
+            if not header:
+                writer.writerow(cols)
+                header = True
+            writer.writerows(rows)
+            nb += len(rows)
+        if not header:
+            writer.writerow(columns or self.get_column_names(table))
+        return nb
+
+    def export_jsonl(self, filename, table, columns=None, where=None, params=None,
+                     batch_size=10000, converters=None):
+        """
+        Exports a table into a :epkg:`JSON lines` file,
+        one JSON object per row, batch by batch.
+        Parameters are the same as @see me export_csv.
+
+        @return                     number of exported rows
+        """
+        if isinstance(filename, str):
+            with open(filename, "w", encoding="utf-8") as f:
+                return self.export_jsonl(f, table, columns=columns, where=where, params=params,
+                                         batch_size=batch_size, converters=converters)
+        nb = 0
+        for cols, rows in self._export_rows(table, columns, where, params,
+                                            batch_size, converters):
+            for row in rows:
+                filename.write(json.dumps(dict(zip(cols, row)), ensure_ascii=False))
+                filename.write("\n")
+            nb += len(rows)
+        return nb
+
     def get_table_list(self):
         """
         Returns the list of tables.
@@ -110,12 +505,21 @@ class Database:
                         FROM (SELECT * FROM sqlite_master UNION ALL SELECT * FROM sqlite_temp_master) AS temptbl
                         WHERE type in('table','temp') AND name != 'sqlite_sequence' ORDER BY name;"""
 
-        select = self._connection.execute(request)
+        select = self._reader().execute(request)
         res = []
         for el in select:
             res.append(el[0])
         return res
 
+    def get_column_names(self, table):
+        """
+        Returns the column names of a table.
+
+        @param      table       table name
+        @return                 list of names
+        """
+        return [row[1] for row in self.execute("PRAGMA table_info({0})".format(table))]
+
     def create_table(self, table, columns, temporary=False):
         """
         Creates a table.
@@ -165,6 +569,8 @@ class Database:
                 col.append(val[0] + " INTEGER")
             elif v is numpy.float64:
                 col.append(val[0] + " FLOAT")
+            elif v is bytes:
+                col.append(val[0] + " BLOB")
             elif v is decimal.Decimal:
                 col.append(val[0] + " Decimal")
             elif v is datetime.datetime:
@@ -196,5 +602,5 @@ class Database:
         @param      table       table name
         @return                 boolean
         """
-        res = list(self.execute("SELECT * FROM {0} LIMIT 1".format(table)))
+        res = list(self.execute("SELECT 1 FROM {0} LIMIT 1".format(table)))
         return len(res) > 0
@@ -0,0 +1,144 @@
+"""
+@file
+@brief Jobs evaluated in the background, part of @see cl DatabaseCompetition.
+"""
+import datetime
+import json
+import os
+from uuid import uuid4
+
+
+class JobQueueMixin:
+    """
+    Stores the submissions in table *jobs* until they are evaluated
+    by @see cl EvaluationQueue. The class is one of the bases
+    of @see cl DatabaseCompetition.
+    """
+
+    def add_job(self, cpt_id, player_id, data, date=None, key=None):
+        """
+        Stores a submission in table *jobs* to be evaluated later,
+        see @see cl EvaluationQueue.
+
+        @param      cpt_id          competition id
+        @param      player_id       player who did the submission
+        @param      data            data of the submission (bytes, str or
+                                    a file object opened in binary mode)
+        @param      date            date of the submission, now if None
+        @param      key             key of the data if already computed,
+                                    see @see me store_payload
+        @return                     job id
+        """
+        if not isinstance(data, (bytes, str)) and not hasattr(data, 'read'):
+            raise TypeError("data must be bytes, str or a file not {0}".format(type(data)))
+        if cpt_id not in set(self.get_cpt_id()):
+            raise ValueError("Unable to find cpt_id={0} in\n{1}".format(
+                cpt_id, self.get_cpt_id()))
+        self._get_team_id(player_id)
+        if date is None:
+            date = datetime.datetime.now()
+        job_id = str(uuid4())
+        with self.transaction():
+            key = self.store_payload(data, key=key)
+            self.insert_rows("jobs", [(job_id, cpt_id, player_id, key, 'pending',
+                                       str(date), None, None, None, None, None, None)],
+                             columns=[c[0] for c in self._col_jobs()])
+        return job_id
+
+    def get_job(self, job_id):
+        """
+        Returns the status of a job as a dictionary,
+        None if the job does not exist. Key *scores* is a dictionary
+        ``{metric: value}`` once the job is done, key *info* holds
+        the parsing information (see @see fn parse_predictions).
+
+        @param      job_id      job id returned by @see me add_job
+        @return                 dictionary
+        """
+        cols = [c[0] for c in self._col_jobs() if c[0] != 'data']
+        res = list(self.execute("SELECT {0} FROM jobs WHERE job_id=?".format(
+            ", ".join(cols)), (job_id,)))
+        if len(res) == 0:
+            return None
+        job = dict(zip(cols, res[0]))
+        for k in ['scores', 'info']:
+            job[k] = None if job[k] is None else json.loads(job[k])
+        return job
+
+    def get_pending_jobs(self):
+        """
+        Returns the jobs waiting to be evaluated, oldest first,
+        see @see me release_jobs for the ones interrupted while running.
+        """
+        return [r[0] for r in self.execute(
+            "SELECT job_id FROM jobs WHERE status == 'pending' ORDER BY created")]
+
+    def release_jobs(self, worker=None):
+        """
+        Marks the jobs left running by a process which stopped
+        as pending again so that they are evaluated again.
+
+        @param      worker      process id, None for all processes
+                                (no process must be evaluating a job)
+        @return                 number of released jobs
+        """
+        sql = "UPDATE jobs SET status='pending', worker=NULL WHERE status == 'running'"
+        with self.transaction():
+            if worker is None:
+                cur = self.execute(sql)
+            else:
+                cur = self.execute(sql + " AND worker == ?", (worker,))
+            return cur.rowcount
+
+    def start_job(self, job_id):
+        """
+        Marks a job as running and returns what is needed to evaluate it.
+        The job is claimed by the current process (column *worker*),
+        several processes sharing the database cannot evaluate
+        the same job.
+
+        @param      job_id      job id
+        @return                 ``(tasks, data)``, see @see me get_evaluation_tasks,
+                                *data* is bytes, None if the job is not pending
+        """
+        res = list(self.execute("SELECT cpt_id, data FROM jobs WHERE job_id=?", (job_id,)))
+        if len(res) == 0:
+            raise KeyError("Unable to find job '{0}'.".format(job_id))
+        cpt_id, key = res[0]
+        with self.transaction():
+            cur = self.execute(
+                "UPDATE jobs SET status='running', started=?, worker=? "
+                "WHERE job_id=? AND status == 'pending'",
+                (str(datetime.datetime.now()), os.getpid(), job_id))
+            if cur.rowcount == 0:
+                return None
+        return self.get_evaluation_tasks(cpt_id), self.get_payload(key, raw=True)
+
+    def finish_job(self, job_id, scores=None, error=None, info=None):
+        """
+        Records the scores of a job, see @see me record_submission,
+        or the error which happened, in a single transaction.
+
+        @param      job_id      job id
+        @param      scores      dictionary ``{metric: value}``
+        @param      error       error message, the job failed if not None
+        @param      info        parsing information returned by
+                                @see me evaluate_submission
+        """
+        res = list(self.execute(
+            "SELECT cpt_id, player_id, data, created FROM jobs WHERE job_id=?", (job_id,)))
+        if len(res) == 0:
+            raise KeyError("Unable to find job '{0}'.".format(job_id))
+        cpt_id, player_id, key, created = res[0]
+        now = str(datetime.datetime.now())
+        with self.transaction():
+            if error is None:
+                self.record_submission(cpt_id, player_id, self.get_payload(key, raw=True),
+                                       scores, date=created)
+                self.execute("UPDATE jobs SET status='done', finished=?, scores=?, info=? "
+                             "WHERE job_id=?",
+                             (now, json.dumps(scores), None if info is None else json.dumps(info),
+                              job_id))
+            else:
+                self.execute("UPDATE jobs SET status='failed', finished=?, error=? WHERE job_id=?",
+                             (now, str(error), job_id))
@@ -0,0 +1,233 @@
+"""
+@file
+@brief Leaderboards, versions of the competitions and listeners,
+part of @see cl DatabaseCompetition.
+"""
+import logging
+import numpy
+import pandas
+from .metrics import greater_is_better
+
+
+class LeaderboardMixin:
+    """
+    Maintains the best submission of every player and every team
+    (tables *leaderboard* and *leaderboard_teams*), the version
+    of every competition (table *versions*) and calls the listeners
+    when a submission is recorded. The class is one of the bases
+    of @see cl DatabaseCompetition which initializes attributes
+    *_versions*, *_listeners* and *_shared*.
+    """
+
+    def add_listener(self, fct):
+        """
+        Registers a function called every time a submission is recorded
+        (see @see me record_submission), once the transaction is committed.
+        It receives the competition id, its new version (see @see me get_version)
+        and the list of changes returned by @see me _score_deltas.
+        The function is called from the thread which recorded
+        the submission, it must not block.
+
+        @param      fct     function ``fct(cpt_id, version, deltas)``
+        """
+        self._listeners.append(fct)
+
+    def remove_listener(self, fct):
+        """
+        Removes a function registered by @see me add_listener.
+        """
+        self._listeners.remove(fct)
+
+    def _notify(self, cpt_id, version, deltas):
+        for fct in list(self._listeners):
+            try:
+                fct(cpt_id, version, deltas)
+            except Exception:  # pylint: disable=W0703
+                logging.getLogger("lightmlboard").exception(
+                    "[DatabaseCompetition] listener %r failed", fct)
+
+    def _score_deltas(self, sub):
+        """
+        Returns the changes of the leaderboard after new submissions,
+        one dictionary per metric with keys *player_id*, *player*
+        (player name), *metric*, *score*, *best* (best score of the player),
+        *rank* (rank of the best score) and *improved* (the submission
+        is the new best score of the player). It must be called inside
+        the transaction which updated the leaderboard.
+
+        @param      sub         submissions, tuples following @see me _col_submissions
+        @return                 list of dictionaries
+        """
+        deltas = []
+        for sub_id, cpt_id, player_id, _, _, met, value in sub:
+            if value is None or numpy.isnan(value):
+                continue
+            best = list(self.execute(
+                """SELECT A.metric_value, A.sub_id, B.player_name FROM leaderboard AS A
+                   INNER JOIN players AS B ON A.player_id == B.player_id
+                   WHERE A.cpt_id == ? AND A.metric == ? AND A.player_id == ?""",
+                (cpt_id, met, player_id)))
+            if len(best) == 0:
+                continue
+            best_value, best_sub, name = best[0]
+            better = list(self.execute(
+                "SELECT COUNT(*) FROM leaderboard WHERE cpt_id == ? AND metric == ? "
+                "AND metric_value {0} ?".format(">" if greater_is_better(met) else "<"),
+                (cpt_id, met, best_value)))[0][0]
+            deltas.append(dict(player_id=player_id, player=name, metric=met, score=float(value),
+                               best=best_value, rank=better + 1, improved=best_sub == sub_id))
+        return deltas
+
+    def get_version(self, cpt_id):
+        """
+        Returns the version of a competition, it changes every time
+        a submission is recorded (see @see me record_submission).
+        The versions are kept in memory, the function does not
+        query the database and can be called from any thread.
+        If the database is shared with other processes, ``PRAGMA data_version``
+        tells if another connection committed something, the versions
+        are only read again in that case.
+
+        @param      cpt_id      competition id
+        @return                 integer
+        """
+        if self._shared and getattr(self._local, 'depth', 0) == 0:
+            self._refresh_versions()
+        return self._versions.get(cpt_id, 0)
+
+    def _refresh_versions(self):
+        """
+        Reads the versions again if the database was modified
+        since the last call in the current thread.
+        """
+        data_version = self._reader().execute("PRAGMA data_version").fetchone()[0]
+        if getattr(self._local, 'data_version', None) == data_version:
+            return
+        self._local.data_version = data_version
+        versions = self._versions
+        for cpt_id, version in self.execute("SELECT cpt_id, version FROM versions"):
+            # versions only increase, an older snapshot must not
+            # replace a version updated by a commit in this process
+            if version > versions.get(cpt_id, 0):
+                versions[cpt_id] = version
+
+    def _bump_version(self, cpt_id):
+        """
+        Increments the version of a competition. It must be called
+        inside a transaction, the version kept in memory changes
+        once the transaction is committed so that a page rendered
+        for the new version cannot show the data before the commit.
+        Returns the new version.
+        """
+        self.execute("INSERT INTO versions (cpt_id, version) VALUES (?, 1) "
+                     "ON CONFLICT (cpt_id) DO UPDATE SET version=version + 1", (cpt_id,))
+        version = list(self.execute(
+            "SELECT version FROM versions WHERE cpt_id=?", (cpt_id,)))[0][0]
+
+        def update():
+            # another process may have committed a newer version
+            if version > self._versions.get(cpt_id, 0):
+                self._versions[cpt_id] = version
+
+        self.on_commit(update)
+        return version
+
+    _sql_upsert_leaderboard = """
+        INSERT INTO {0} (cpt_id, metric, player_id, team_id, sub_id, metric_value, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (cpt_id, metric, {1}) DO UPDATE SET
+            player_id=excluded.player_id, team_id=excluded.team_id,
+            sub_id=excluded.sub_id, metric_value=excluded.metric_value,
+            date=excluded.date
+        WHERE excluded.metric_value {2} {0}.metric_value"""
+
+    def _update_leaderboard(self, sub, team_id):
+        """
+        Updates the best scores per player and per team
+        with new submissions. It must be called inside a transaction.
+
+        @param      sub         submissions, tuples following @see me _col_submissions
+        @param      team_id     team of the player
+        """
+        for sub_id, cpt_id, player_id, date, _, met, value in sub:
+            if value is None or numpy.isnan(value):
+                continue
+            op = ">" if greater_is_better(met) else "<"
+            row = (cpt_id, met, player_id, team_id, sub_id, value, date)
+            self.execute(LeaderboardMixin._sql_upsert_leaderboard.format(
+                "leaderboard", "player_id", op), row)
+            self.execute(LeaderboardMixin._sql_upsert_leaderboard.format(
+                "leaderboard_teams", "team_id", op), row)
+
+    def rebuild_leaderboard(self, cpt_id=None):
+        """
+        Recomputes the tables *leaderboard* and *leaderboard_teams*
+        from table *submissions*.
+
+        @param      cpt_id      competition id, None for all
+        """
+        cond = "" if cpt_id is None else " WHERE cpt_id=?"
+        params = None if cpt_id is None else (cpt_id,)
+        with self.transaction():
+            pairs = list(self.execute(
+                "SELECT DISTINCT cpt_id, metric FROM submissions" + cond, params))
+            for table, key in [("leaderboard", "A.player_id"), ("leaderboard_teams", "B.team_id")]:
+                self.execute("DELETE FROM {0}{1}".format(table, cond), params)
+                for cid, met in pairs:
+                    order = "DESC" if greater_is_better(met) else "ASC"
+                    sql = """
+                        INSERT INTO {0} (cpt_id, metric, player_id, team_id, sub_id, metric_value, date)
+                        SELECT cpt_id, metric, player_id, team_id, sub_id, metric_value, date
+                        FROM (SELECT A.cpt_id, A.metric, A.player_id, B.team_id, A.sub_id,
+                                     A.metric_value, A.date,
+                                     ROW_NUMBER() OVER (PARTITION BY {1}
+                                        ORDER BY A.metric_value {2}, A.date, A.sub_id) AS rn
+                              FROM submissions AS A
+                              INNER JOIN players AS B ON A.player_id == B.player_id
+                              WHERE A.cpt_id == ? AND A.metric == ?
+                                    AND A.metric_value IS NOT NULL)
+                        WHERE rn == 1""".format(table, key, order)
+                    self.execute(sql, (cid, met))
+
+    def get_leaderboard(self, cpt_id, metric, top=10, teams=False):
+        """
+        Returns the best submission of every player or team
+        for a competition and a metric, best first.
+        It reads table *leaderboard* maintained by @see me submit.
+
+        @param      cpt_id      competition id
+        @param      metric      metric
+        @param      top         number of rows to return
+        @param      teams       one row per team instead of one per player
+        @return                 data frame
+        """
+        columns, rows = self.get_leaderboard_rows(cpt_id, metric, top=top, teams=teams)
+        return pandas.DataFrame(rows, columns=columns)
+
+    #: columns returned by @see me get_leaderboard_rows
+    leaderboard_columns = ['rank', 'player_name', 'team_name', 'metric_value', 'date',
+                           'player_id', 'team_id', 'sub_id']
+
+    def get_leaderboard_rows(self, cpt_id, metric, top=10, teams=False):
+        """
+        Same as @see me get_leaderboard but returns the rows
+        as they come from the cursor, without :epkg:`pandas`.
+
+        @param      cpt_id      competition id
+        @param      metric      metric
+        @param      top         number of rows to return
+        @param      teams       one row per team instead of one per player
+        @return                 column names, list of tuples
+        """
+        order = "DESC" if greater_is_better(metric) else "ASC"
+        table = "leaderboard_teams" if teams else "leaderboard"
+        sql = """SELECT B.player_name, C.team_name, A.metric_value, A.date,
+                        A.player_id, A.team_id, A.sub_id
+                 FROM (SELECT * FROM {0} WHERE cpt_id == ? AND metric == ?
+                       ORDER BY metric_value {1} LIMIT ?) AS A
+                 INNER JOIN players AS B ON A.player_id == B.player_id
+                 INNER JOIN teams AS C ON A.team_id == C.team_id
+                 ORDER BY A.metric_value {1}""".format(table, order)
+        rows = [(i,) + row for i, row in enumerate(
+            self.execute(sql, (cpt_id, metric, top)), start=1)]
+        return list(LeaderboardMixin.leaderboard_columns), rows
@@ -3,15 +3,24 @@
 @brief Manages a sqlite3 database to store the results.
 """
 import datetime
+import threading
+from collections import OrderedDict
 from uuid import uuid4
 import numpy
 import pandas
 from .dbengine import Database
+from .cache import GroundTruthCache, fingerprint
+from .storage import can_store_binary, payload_key, compress_payload, decompress_payload
+from .storage import compress_stream, stream_key
+from .parsers import PredictionSchema
 from .options_helpers import read_options, read_users
 from .competition import Competition
+from .dbjobs import JobQueueMixin
+from .dbleaderboard import LeaderboardMixin
+from .dbresults import ResultsMixin
 
 
-class DatabaseCompetition(Database):
+class DatabaseCompetition(LeaderboardMixin, JobQueueMixin, ResultsMixin, Database):
     """
     Holds the data used for competitions. Tables:
 
@@ -23,6 +32,7 @@ class DatabaseCompetition(Database):
     * datafile
     * description
     * expected_values
+    * schema (:epkg:`JSON`, see @see cl PredictionSchema)
 
     Teams
 
@@ -45,37 +55,219 @@ class DatabaseCompetition(Database):
     * date
     * filename
     * metric_value
+
+    Jobs (submissions waiting to be evaluated)
+
+    * job_id
+    * cpt_id
+    * player_id
+    * data (key in table *payloads*)
+    * status (pending, running, done, failed)
+    * created, started, finished
+    * error
+    * scores (:epkg:`JSON`)
+    * info (:epkg:`JSON`, parsing time, see @see fn parse_predictions)
+
+    Versions (incremented by every submission, see @see me get_version)
+
+    * cpt_id
+    * version
+
+    Schema_version
+
+    * version
+    * name
+    * date
+
+    The schema is upgraded when the class is instantiated,
+    see @see me _migrate. The methods handling the leaderboards,
+    the jobs and the results are implemented by @see cl LeaderboardMixin,
+    @see cl JobQueueMixin and @see cl ResultsMixin.
     """
 
-    def __init__(self, dbfile):
+    def __init__(self, dbfile, cache_bytes=2 ** 28, pool=False, pragmas=None, shared=False):
         """
-        @param      dbfile      filename or ``:memory:``
+        @param      dbfile          filename or ``:memory:``
+        @param      cache_bytes     memory cap for the cache holding
+                                    the parsed expected values,
+                                    see @see cl GroundTruthCache
+        @param      pool            one connection per thread to read,
+                                    see @see cl Database
+        @param      pragmas         pragmas for the pool mode
+        @param      shared          the database is modified by other processes,
+                                    it implies *pool*, see @see me get_version
         """
-        Database.__init__(self, dbfile)
+        if shared and dbfile == ":memory:":
+            raise ValueError("A database in memory cannot be shared between processes.")
+        Database.__init__(self, dbfile, pool=pool or shared, pragmas=pragmas)
+        self._shared = shared
+        self._gt_cache = GroundTruthCache(cache_bytes)
+        self._versions = {}
+        self._listeners = []
         self._init()
 
     def _init(self):
         """
-        Creates the tables if not present.
+        Creates the tables if not present and upgrades
+        the schema, see @see me _migrate.
         """
         self.connect()
         tables = self.get_table_list()
         adds = dict(competitions=DatabaseCompetition._col_competitions,
                     teams=DatabaseCompetition._col_teams,
                     players=DatabaseCompetition._col_players,
-                    submissions=DatabaseCompetition._col_submissions)
-        for k, v in adds.items():
-            if k not in tables:
-                self.create_table(k, v())
-        self.commit()
+                    submissions=DatabaseCompetition._col_submissions,
+                    leaderboard=DatabaseCompetition._col_leaderboard,
+                    leaderboard_teams=DatabaseCompetition._col_leaderboard_teams,
+                    payloads=DatabaseCompetition._col_payloads,
+                    jobs=DatabaseCompetition._col_jobs,
+                    versions=DatabaseCompetition._col_versions,
+                    schema_version=DatabaseCompetition._col_schema_version)
+        with self.transaction():
+            for k, v in adds.items():
+                if k not in tables:
+                    self.create_table(k, v())
+            self._migrate()
+        self._versions = dict(self.execute("SELECT cpt_id, version FROM versions"))
         self.close()
 
-    def init_from_options(self, filename):
+    #: list of migrations ``(version, name, method)``,
+    #: a migration must be idempotent as it is also applied
+    #: on a database just created
+    _migrations = [
+        (1, "expected_fingerprint", "_migration_expected_fingerprint"),
+        (2, "indexes", "_migration_indexes"),
+        (3, "leaderboard", "_migration_leaderboard"),
+        (4, "payloads", "_migration_payloads"),
+        (5, "keyset index", "_migration_keyset_index"),
+        (6, "jobs", "_migration_jobs"),
+        (7, "prediction schema", "_migration_prediction_schema"),
+        (8, "versions", "_migration_versions"),
+        (9, "job workers", "_migration_job_workers"),
+    ]
+
+    def get_schema_version(self):
+        """
+        Returns the version of the schema, the last applied migration.
+        """
+        res = list(self.execute("SELECT MAX(version) FROM schema_version"))
+        return res[0][0] or 0
+
+    def _migrate(self):
+        """
+        Applies the migrations not yet applied
+        to the database and records them in table *schema_version*.
+        It must be called inside a transaction.
+        """
+        version = self.get_schema_version()
+        for num, name, meth in DatabaseCompetition._migrations:
+            if num <= version:
+                continue
+            getattr(self, meth)()
+            self.execute("INSERT INTO schema_version (version, name, date) VALUES (?, ?, ?)",
+                         (num, name, str(datetime.datetime.now())))
+
+    def _migration_expected_fingerprint(self):
+        """
+        Adds column *expected_fingerprint* to a database
+        created by a previous version.
+        """
+        if 'expected_fingerprint' not in self.get_column_names('competitions'):
+            self.execute(
+                "ALTER TABLE competitions ADD COLUMN expected_fingerprint TEXT")
+
+    def _migration_indexes(self):
+        """
+        Creates the indexes used by @see me submit and @see me get_results.
+        """
+        for name, table, cols in DatabaseCompetition._indexes:
+            self.execute("CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})".format(
+                name, table, ", ".join(cols)))
+
+    def _migration_leaderboard(self):
+        """
+        Creates the unique indexes of the leaderboard tables
+        and fills them from the submissions.
+        """
+        for table, key in [("leaderboard", "player_id"), ("leaderboard_teams", "team_id")]:
+            self.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_{0}_key ON {0} "
+                         "(cpt_id, metric, {1})".format(table, key))
+            self.execute("CREATE INDEX IF NOT EXISTS idx_{0}_score ON {0} "
+                         "(cpt_id, metric, metric_value)".format(table))
+        self.rebuild_leaderboard()
+
+    def _migration_payloads(self):
+        """
+        Moves the submitted data into table *payloads*,
+        see @see me store_payload.
+        """
+        self.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_payloads ON payloads (hash)")
+        rows = list(self.execute(
+            "SELECT DISTINCT data FROM submissions WHERE data IS NOT NULL AND data != ''"))
+        for (data,) in rows:
+            key = self.store_payload(data)
+            self.execute("UPDATE submissions SET data=? WHERE data=?", (key, data))
+
+    def _migration_keyset_index(self):
+        """
+        Adds *sub_id* to index *idx_submissions_cpt* so that
+        @see me get_results walks through pages without sorting.
+        """
+        self.execute("DROP INDEX IF EXISTS idx_submissions_cpt")
+        name, table, cols = DatabaseCompetition._indexes[0]
+        self.execute("CREATE INDEX {0} ON {1} ({2})".format(name, table, ", ".join(cols)))
+
+    def _migration_jobs(self):
+        """
+        Creates the indexes of table *jobs*, see @see me add_job.
+        """
+        self.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs ON jobs (job_id)")
+        self.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created)")
+
+    def _migration_prediction_schema(self):
+        """
+        Adds column *schema* to table *competitions*
+        (see @see cl PredictionSchema) and column *info*
+        to table *jobs* (see @see fn parse_predictions).
+        """
+        if 'schema' not in self.get_column_names('competitions'):
+            self.execute("ALTER TABLE competitions ADD COLUMN schema TEXT")
+        if 'info' not in self.get_column_names('jobs'):
+            self.execute("ALTER TABLE jobs ADD COLUMN info TEXT")
+
+    def _migration_versions(self):
+        """
+        Creates the unique index of table *versions*,
+        see @see me get_version.
+        """
+        self.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_versions ON versions (cpt_id)")
+
+    def _migration_job_workers(self):
+        """
+        Adds column *worker* to table *jobs*, the process
+        evaluating a job, see @see me start_job.
+        """
+        if 'worker' not in self.get_column_names('jobs'):
+            self.execute("ALTER TABLE jobs ADD COLUMN worker INTEGER")
+
+    _indexes = [
+        ("idx_submissions_cpt", "submissions", ["cpt_id", "metric", "metric_value", "sub_id"]),
+        ("idx_submissions_player", "submissions", ["player_id", "cpt_id", "date"]),
+        ("idx_players", "players", ["player_id"]),
+        ("idx_teams", "teams", ["team_id"]),
+        ("idx_competitions", "competitions", ["cpt_id"]),
+    ]
+
+    def init_from_options(self, filename, storage='auto', compression=None):
         """
         Initializes the database. It skips a table if
         it exists.
 
         @param      filename        filename
+        @param      storage         storage for the expected values,
+                                    ``'csv'``, ``'binary'`` or ``'auto'``,
+                                    see @see me to_records
+        @param      compression     compression for the binary storage
         """
         opt = read_options(filename)
         if opt is None:
@@ -85,60 +277,84 @@ class DatabaseCompetition(Database):
         competitions = [(d if isinstance(d, Competition)
                          else Competition(**d)) for d in opt[key]]
 
-        if not self.has_rows("teams"):
-            teams = map(lambda x: x[1]['team'], users.items())
-            tdf = pandas.DataFrame({"team_name": list(teams)})
-            tdf.reset_index(drop=False, inplace=True)
-            tdf.columns = ["team_id", "team_name"]
-            tdf.to_sql("teams", self.Connection,
-                       if_exists="append", index=False)
-
-        if not self.has_rows("players"):
-            players = list(map(lambda x: x[1], users.items()))
-            pdf = pandas.DataFrame(players)
-            pdf.reset_index(drop=False, inplace=True)
-            tdf = self.to_df("teams")
-            pdf["player_name"] = pdf["name"]
-            pdf["player_id"] = pdf["index"]
-            pdf = pdf.merge(tdf, left_on="team", right_on="team_name")
-            pdf = pdf.drop(["name", "team_name", "index", "team"], axis=1)
-            pdf.to_sql("players", self.Connection,
-                       if_exists="append", index=False)
-
-        if not self.has_rows("competitions"):
-            pdf = pandas.DataFrame(Competition.to_records(competitions))
-            if "cpt_id" in pdf.columns:
-                pdf.reset_index(drop=True, inplace=True)
-            else:
+        with self.transaction():
+            if not self.has_rows("teams"):
+                teams = map(lambda x: x[1]['team'], users.items())
+                tdf = pandas.DataFrame({"team_name": list(teams)})
+                tdf.reset_index(drop=False, inplace=True)
+                tdf.columns = ["team_id", "team_name"]
+                self.insert_dataframe("teams", tdf)
+
+            if not self.has_rows("players"):
+                players = list(map(lambda x: x[1], users.items()))
+                pdf = pandas.DataFrame(players)
                 pdf.reset_index(drop=False, inplace=True)
-                # tdf = self.to_df("competitions")
-                pdf["cpt_id"] = pdf["index"]
-                pdf = pdf.drop("index", axis=1)
-            pdf.to_sql("competitions", self.Connection,
-                       if_exists="append", index=False)
-
-        if not self.has_rows("submissions"):
-            pdf = DatabaseCompetition._dummy_submissions()
-            pdf.reset_index(drop=True, inplace=True)
-            pdf.to_sql("submissions", self.Connection,
-                       if_exists="append", index=False)
+                tdf = self.to_df("teams")
+                pdf["player_name"] = pdf["name"]
+                pdf["player_id"] = pdf["index"]
+                pdf = pdf.merge(tdf, left_on="team", right_on="team_name")
+                pdf = pdf.drop(["name", "team_name", "index", "team"], axis=1)
+                self.insert_dataframe("players", pdf)
+
+            if not self.has_rows("competitions"):
+                pdf = pandas.DataFrame(Competition.to_records(
+                    competitions, storage=storage, compression=compression))
+                if "cpt_id" in pdf.columns:
+                    pdf.reset_index(drop=True, inplace=True)
+                else:
+                    pdf.reset_index(drop=False, inplace=True)
+                    # tdf = self.to_df("competitions")
+                    pdf["cpt_id"] = pdf["index"]
+                    pdf = pdf.drop("index", axis=1)
+                self.insert_dataframe("competitions", pdf)
+
+            if not self.has_rows("submissions"):
+                pdf = DatabaseCompetition._dummy_submissions()
+                pdf.reset_index(drop=True, inplace=True)
+                self.insert_dataframe("submissions", pdf)
 
-        df = self.to_df("players")
-        logins = set(df['login'])
-        if None in logins:
-            raise ValueError("One login is wrong: {0}".format(logins))
+            df = self.to_df("players")
+            logins = set(df['login'])
+            if None in logins:
+                raise ValueError("One login is wrong: {0}".format(logins))
 
-    def get_competitions(self):
+    def get_competitions(self, columns=None):
         """
         Returns the list of competitions as list of ``(cpt_id, cpt_name)``.
-        """
-        return self.execute("SELECT cpt_id, cpt_name FROM competitions")
 
-    def to_df(self, table):
+        @param      columns     columns to return instead of *cpt_id*, *cpt_name*
+        @return                 cursor
+        """
+        if columns is None:
+            columns = ['cpt_id', 'cpt_name']
+        allowed = set(c[0] for c in DatabaseCompetition._col_competitions())
+        for c in columns:
+            if c not in allowed:
+                raise ValueError("Unexpected column '{0}'.".format(c))
+        return self.execute("SELECT {0} FROM competitions ORDER BY cpt_id".format(
+            ", ".join(columns)))
+
+    def to_df(self, table, chunksize=None, columns=None, where=None, params=None):
         """
         Returns the content of a table as a dataframe.
+
+        @param      table       table name
+        @param      chunksize   if not None, returns an iterator on dataframes
+                                of *chunksize* rows, see @see me iter_df
+        @param      columns     columns to return, None for all
+        @param      where       condition (SQL) with placeholders (``?``)
+        @param      params      parameters for the condition
+        @return                 dataframe or iterator
         """
-        return pandas.read_sql("SELECT * FROM {0}".format(table), self.Connection)
+        if chunksize is not None:
+            return self.iter_df(table, columns=columns, where=where,
+                                params=params, batch_size=chunksize)
+        if columns is None and where is None:
+            return pandas.read_sql("SELECT * FROM {0}".format(table), self._reader())
+        dfs = list(self.iter_df(table, columns=columns, where=where, params=params))
+        if len(dfs) == 0:
+            return pandas.DataFrame(columns=columns or self.get_column_names(table))
+        return pandas.concat(dfs, ignore_index=True)
 
     @property
     def Connection(self):
@@ -151,7 +367,36 @@ class DatabaseCompetition(Database):
     @staticmethod
     def _col_competitions():
         return [('cpt_id', int), ('link', str), ('cpt_name', str), ('description', str),
-                ('metric', str), ('datafile', str), ('expected_values', str)]
+                ('metric', str), ('datafile', str), ('expected_values', bytes),
+                ('expected_fingerprint', str), ('schema', str)]
+
+    @staticmethod
+    def _col_schema_version():
+        return [('version', int), ('name', str), ('date', str)]
+
+    @staticmethod
+    def _col_leaderboard():
+        return [('cpt_id', int), ('metric', str), ('player_id', int), ('team_id', int),
+                ('sub_id', str), ('metric_value', float), ('date', str)]
+
+    @staticmethod
+    def _col_leaderboard_teams():
+        return [('cpt_id', int), ('metric', str), ('team_id', int), ('player_id', int),
+                ('sub_id', str), ('metric_value', float), ('date', str)]
+
+    @staticmethod
+    def _col_payloads():
+        return [('hash', str), ('size', int), ('compression', str), ('data', bytes)]
+
+    @staticmethod
+    def _col_jobs():
+        return [('job_id', str), ('cpt_id', int), ('player_id', int), ('data', str),
+                ('status', str), ('created', str), ('started', str), ('finished', str),
+                ('error', str), ('scores', str), ('info', str), ('worker', int)]
+
+    @staticmethod
+    def _col_versions():
+        return [('cpt_id', int), ('version', int)]
 
     @staticmethod
     def _col_teams():
@@ -169,7 +414,7 @@ class DatabaseCompetition(Database):
 
     @staticmethod
     def _dummy_submissions():
-        return pandas.DataFrame([dict(sub_id=str(uuid4()), cpt_id=-1, player_id=-1, date=datetime.datetime.now(),
+        return pandas.DataFrame([dict(sub_id=str(uuid4()), cpt_id=-1, player_id=-1, date=str(datetime.datetime.now()),
                                       data='', metric='rse', metric_value=numpy.nan)])
 
     def get_cpt_id(self):
@@ -184,46 +429,262 @@ class DatabaseCompetition(Database):
         """
         return list(_[0] for _ in self.execute("SELECT player_id FROM players"))
 
-    def submit(self, cpt_id, player_id, data, date=datetime.datetime.now()):
+    def submit(self, cpt_id, player_id, data, date=None):
         """
         Adds a submission to the database.
 
         @param      cpt_id          competition id
         @param      player_id       player who did the submission
         @param      data            data of the submission
+        @param      date            date of the submission, now if None
+        @return                     scores, dictionary ``{metric: value}``
 
         The function computes the metric associated to the submission.
+        It calls @see me get_evaluation_tasks, @see me evaluate_submission
+        and @see me record_submission, the second one can run in another process.
         """
         if not isinstance(data, str):
             raise TypeError("data must be str not {0}".format(type(data)))
-        cp = list(self.execute(
-            "SELECT cpt_id, metric, expected_values FROM competitions WHERE cpt_id={0}".format(cpt_id)))
-        if len(cp) == 0:
-            raise ValueError("Unable to find cpt_id={0} in\n{1}".format(
-                cpt_id, self.get_cpt_id()))
+        tasks = self.get_evaluation_tasks(cpt_id)
+        self._get_team_id(player_id)
+        scores = DatabaseCompetition.evaluate_submission(tasks, data)
+        self.record_submission(cpt_id, player_id, data, scores, date=date)
+        return scores
+
+    def _get_team_id(self, player_id):
+        """
+        Returns the team of a player, raises an exception if
+        the player does not exist.
+        """
         pid = list(self.execute(
-            "SELECT player_id FROM players WHERE player_id={0}".format(player_id)))
+            "SELECT player_id, team_id FROM players WHERE player_id=?", (player_id,)))
         if len(pid) == 0:
             raise ValueError("Unable to find player_id={0} in\n{1}".format(
                 player_id, self.get_player_id()))
-        metrics = [_[1:] for _ in cp]
+        return pid[0][1]
 
-        sub = []
-        for met, exp in metrics:
-            cp = Competition(cpt_id=0, link='', name='', description='',
-                             metric=met, expected_values=exp)
+    def get_player_id_from_login(self, login):
+        """
+        Returns the player id of a login, None if not found.
+        """
+        res = list(self.execute("SELECT player_id FROM players WHERE login=?", (login,)))
+        return res[0][0] if res else None
+
+    def get_prediction_schema(self, cpt_id):
+        """
+        Returns the schema of the submissions of a competition.
+
+        @param      cpt_id      competition id
+        @return                 @see cl PredictionSchema or None
+        """
+        res = list(self.execute("SELECT schema FROM competitions WHERE cpt_id=?", (cpt_id,)))
+        if len(res) == 0:
+            raise ValueError("Unable to find cpt_id={0} in\n{1}".format(
+                cpt_id, self.get_cpt_id()))
+        return PredictionSchema.load(res[0][0])
+
+    def get_evaluation_tasks(self, cpt_id):
+        """
+        Returns what is needed to evaluate a submission
+        for a competition, the expected values come from the cache.
+        The metrics sharing the same expected values are grouped
+        so that they are evaluated together.
+
+        @param      cpt_id      competition id
+        @return                 list of ``(list of metrics, expected values as an array,
+                                fingerprint, schema as a JSON string)``
+        """
+        cp = list(self.execute(
+            "SELECT rowid, metric, expected_fingerprint, schema FROM competitions WHERE cpt_id=?",
+            (cpt_id,)))
+        if len(cp) == 0:
+            raise ValueError("Unable to find cpt_id={0} in\n{1}".format(
+                cpt_id, self.get_cpt_id()))
+        groups = {}
+        for rowid, met, fprint, schema in cp:
+            key = (fprint if fprint is not None else rowid, schema)
+            if key not in groups:
+                groups[key] = ([], self._get_expected(cpt_id, rowid, fprint), fprint, schema)
+            groups[key][0].append(met)
+        return list(groups.values())
+
+    @staticmethod
+    def evaluate_submission(tasks, data, return_info=False):
+        """
+        Computes the scores of a submission. The function does not
+        access the database and can be run in another process.
+        The submission is parsed once with the schema of the competition
+        (see @see fn parse_predictions), every group of metrics
+        is evaluated in one pass, see @see me evaluate.
+        Every process keeps the last competitions it evaluated
+        with what they precompute from the expected values.
+
+        @param      tasks           returned by @see me get_evaluation_tasks
+        @param      data            submission (bytes or str)
+        @param      return_info     returns the parsing information as well
+        @return                     dictionary ``{metric: value}``,
+                                    ``(scores, info)`` if *return_info* is True
+        """
+        scores = {}
+        info = None
+        for mets, exp, fprint, schema in tasks:
+            cp = _get_evaluation_competition(mets, exp, fprint, schema)
+            data = cp._load_predictions(data)  # pylint: disable=W0212
+            if info is None:
+                info = cp.parse_info
             dres = cp.evaluate(data)
-            res = dres[met]
-            if not isinstance(res, float):
-                res = float(res)
-            rec = dict(sub_id=str(uuid4()), cpt_id=cpt_id, player_id=player_id,
-                       data=data, metric=met, metric_value=res)
-            sub.append(rec)
-
-        df = pandas.DataFrame(sub)
-        df.to_sql("submissions", self._connection,
-                  if_exists="append", index=False)
-        self.commit()
+            scores.update({k: float(v) for k, v in dres.items()})
+        if return_info:
+            return scores, info
+        return scores
+
+    def record_submission(self, cpt_id, player_id, data, scores, date=None):
+        """
+        Stores the scores of a submission and updates the leaderboard
+        in a single transaction.
+
+        @param      cpt_id          competition id
+        @param      player_id       player who did the submission
+        @param      data            data of the submission
+        @param      scores          dictionary ``{metric: value}``
+        @param      date            date of the submission, now if None
+        @return                     list of submission ids
+        """
+        if date is None:
+            date = datetime.datetime.now()
+        with self.transaction():
+            team_id = self._get_team_id(player_id)
+            key = self.store_payload(data)
+            sub = [(str(uuid4()), cpt_id, player_id, str(date), key, met, res)
+                   for met, res in scores.items()]
+            self.insert_rows("submissions", sub,
+                             columns=[c[0] for c in self._col_submissions()])
+            self._update_leaderboard(sub, team_id)
+            version = self._bump_version(cpt_id)
+            if self._listeners:
+                deltas = self._score_deltas(sub)
+                self.on_commit(lambda: self._notify(cpt_id, version, deltas))
+        return [s[0] for s in sub]
+
+    payload_compression = 'zlib'
+
+    def store_payload(self, data, key=None):
+        """
+        Stores the data of a submission in table *payloads*
+        compressed and keyed by its :epkg:`SHA-256`.
+        The data is stored only once, table *submissions*
+        only holds the key.
+
+        @param      data        str, bytes or a file object opened in binary mode,
+                                a file is compressed chunk by chunk
+                                (see @see fn compress_stream)
+        @param      key         key of the data if the caller already computed it
+                                (see @see fn payload_key)
+        @return                 key
+        """
+        stream = hasattr(data, 'read')
+        if key is None:
+            key = stream_key(data) if stream else payload_key(data)
+        with self.transaction():
+            exists = list(self.execute("SELECT 1 FROM payloads WHERE hash=?", (key,)))
+            if len(exists) == 0:
+                comp = self.payload_compression
+                if stream:
+                    blob, size = compress_stream(data, comp)
+                else:
+                    raw = data.encode('utf-8') if isinstance(data, str) else bytes(data)
+                    blob, size = compress_payload(raw, comp), len(raw)
+                self.execute("INSERT INTO payloads (hash, size, compression, data) VALUES (?, ?, ?, ?)",
+                             (key, size, comp, blob))
+        return key
+
+    def get_payload(self, key, raw=False):
+        """
+        Returns the data stored by @see me store_payload.
+
+        @param      key     key returned by @see me store_payload
+        @param      raw     returns bytes and does not decode them
+        @return             str or bytes
+        """
+        res = list(self.execute("SELECT compression, data FROM payloads WHERE hash=?", (key,)))
+        if len(res) == 0:
+            raise KeyError("Unable to find payload '{0}'.".format(key))
+        comp, blob = res[0]
+        data = decompress_payload(blob, comp)
+        return data if raw else data.decode('utf-8')
+
+    def _get_expected(self, cpt_id, rowid, fprint):
+        """
+        Returns the expected values of a competition as an array.
+        The cache is looked up with the fingerprint stored in the
+        table, the values are only read and parsed if they are
+        not in the cache. The fingerprint is computed and stored
+        if it is missing.
+
+        @param      cpt_id      competition id
+        @param      rowid       row in table *competitions*
+        @param      fprint      stored fingerprint or None
+        @return                 array
+        """
+        if fprint is not None:
+            value = self._gt_cache.get(cpt_id, fprint)
+            if value is not None:
+                return value
+        exp = list(self.execute(
+            "SELECT expected_values FROM competitions WHERE rowid=?", (rowid,)))[0][0]
+        if fprint is None:
+            fprint = fingerprint(exp)
+            with self.transaction():
+                self.execute("UPDATE competitions SET expected_fingerprint=? WHERE rowid=?",
+                             (fprint, rowid))
+        cp = Competition(cpt_id=cpt_id, link='', name='', description='',
+                         metric=[], expected_values=exp)
+        value = cp.expected_values.values
+        self._gt_cache.put(cpt_id, fprint, value)
+        return value
+
+    def invalidate_cache(self, cpt_id=None):
+        """
+        Removes the parsed expected values of a competition
+        from the cache, every competition if *cpt_id* is None.
+        """
+        self._gt_cache.invalidate(cpt_id)
+
+    def cache_stats(self):
+        """
+        Returns the counters of the cache holding the
+        parsed expected values (hits, misses, evictions, memory).
+        """
+        return self._gt_cache.stats()
+
+    def convert_expected_values(self, storage='binary', compression=None):
+        """
+        Converts the expected values stored in table *competitions*,
+        it can be used to migrate a database storing them as text
+        to the binary format. Non numerical values stay as text.
+
+        @param      storage         ``'csv'``, ``'binary'`` or ``'auto'``
+        @param      compression     compression for the binary storage
+        @return                     number of converted rows
+        """
+        nb = 0
+        with self.transaction():
+            rows = list(self.execute(
+                "SELECT rowid, cpt_id, expected_values FROM competitions"))
+            for rowid, cpt_id, exp in rows:
+                cp = Competition(cpt_id=cpt_id, link='', name='', description='',
+                                 metric=[], expected_values=exp)
+                if storage == 'binary' and not can_store_binary(cp.expected_values):
+                    continue
+                new_exp = cp._dump_values(  # pylint: disable=W0212
+                    storage=storage, compression=compression)
+                if new_exp == exp:
+                    continue
+                self.execute("UPDATE competitions SET expected_values=?, expected_fingerprint=? "
+                             "WHERE rowid=?", (new_exp, fingerprint(new_exp), rowid))
+                nb += 1
+        self.invalidate_cache()
+        return nb
 
     def get_competition(self, cpt_id):
         """
@@ -233,7 +694,8 @@ class DatabaseCompetition(Database):
         @return             @see cl Competition
         """
         res = list(self.execute(
-            "SELECT * FROM competitions WHERE cpt_id=={0}".format(cpt_id)))
+            "SELECT cpt_id, link, cpt_name, description, metric, datafile, expected_values, "
+            "schema FROM competitions WHERE cpt_id==?", (cpt_id,)))
         if len(res) == 0:
             raise KeyError("No competition for cpt_id=={0}".format(cpt_id))
         if len(res) != 1:
@@ -242,17 +704,34 @@ class DatabaseCompetition(Database):
         args = list(res[0])
         return Competition(*args)
 
-    def get_results(self, cpt_id):
-        """
-        Retrieves the results of a competition.
 
-        @param      cpt_id  competition id
-        @return             a data frame
-        """
-        res = pandas.read_sql("""SELECT A.*, B.player_name AS player_name, C.team_name
-                                 FROM submissions AS A
-                                 INNER JOIN players AS B ON A.player_id == B.player_id
-                                 INNER JOIN teams AS C ON B.team_id == C.team_id
-                                 WHERE cpt_id == {0}
-                                 """.format(cpt_id), self.Connection)
-        return res
+
+_evaluation_cache = OrderedDict()
+_evaluation_lock = threading.Lock()
+#: number of competitions kept by @see fn _get_evaluation_competition
+evaluation_cache_size = 8
+
+
+def _get_evaluation_competition(metrics, expected, fprint, schema=None):
+    """
+    Returns a @see cl Competition to evaluate submissions.
+    It is kept in memory if *fprint* is not None so that
+    the next evaluation reuses what it stored
+    (the indicator matrix for example).
+    """
+    if fprint is None:
+        return Competition(cpt_id=0, link='', name='', description='',
+                           metric=list(metrics), expected_values=expected,
+                           schema=schema)
+    key = (fprint, tuple(metrics), schema)
+    with _evaluation_lock:
+        if key in _evaluation_cache:
+            _evaluation_cache.move_to_end(key)
+            return _evaluation_cache[key]
+    cp = Competition(cpt_id=0, link='', name='', description='',
+                     metric=list(metrics), expected_values=expected, schema=schema)
+    with _evaluation_lock:
+        _evaluation_cache[key] = cp
+        while len(_evaluation_cache) > evaluation_cache_size:
+            _evaluation_cache.popitem(last=False)
+    return cp
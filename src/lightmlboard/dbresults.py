@@ -0,0 +1,175 @@
+"""
+@file
+@brief Paginated results of a competition and submissions of a player,
+part of @see cl DatabaseCompetition.
+"""
+import pandas
+from .metrics import greater_is_better
+
+
+class ResultsMixin:
+    """
+    Retrieves the submissions of a competition or a player.
+    The class is one of the bases of @see cl DatabaseCompetition.
+    """
+
+    #: columns returned by @see me get_player_submissions
+    player_submissions_columns = ['sub_id', 'cpt_id', 'date', 'metric', 'metric_value']
+
+    def get_player_submissions(self, player_id, cpt_id=None, limit=100):
+        """
+        Returns the last submissions of a player, most recent first.
+
+        @param      player_id   player id
+        @param      cpt_id      restricts the submissions to one competition
+        @param      limit       maximum number of rows
+        @return                 column names, list of tuples
+        """
+        conds = ["player_id == ?"]
+        params = [player_id]
+        if cpt_id is not None:
+            conds.append("cpt_id == ?")
+            params.append(cpt_id)
+        params.append(limit)
+        sql = """SELECT {0} FROM submissions WHERE {1}
+                 ORDER BY date DESC, sub_id LIMIT ?""".format(
+            ", ".join(ResultsMixin.player_submissions_columns), " AND ".join(conds))
+        return (list(ResultsMixin.player_submissions_columns),
+                list(self.execute(sql, tuple(params))))
+
+    def get_results(self, cpt_id, metric=None, limit=None, after=None, columns=None):
+        """
+        Retrieves the results of a competition.
+
+        @param      cpt_id      competition id
+        @param      metric      restricts the results to one metric
+        @param      limit       number of rows of a page, None for all rows
+        @param      after       cursor ``(metric_value, sub_id)``, returned by
+                                the previous page (@see cl ResultsPage)
+        @param      columns     columns to return (see ``ResultsPage.allowed_columns``),
+                                None for all but *data*
+        @return                 a data frame if *limit*, *after* and *columns* are None,
+                                a @see cl ResultsPage otherwise
+
+        The pages are sorted by score, best first if *metric* is specified
+        (see @see fn greater_is_better), by decreasing score otherwise,
+        then by *sub_id*. The next page starts after the cursor of the
+        previous one (keyset pagination) so the cost of a page does not
+        depend on its position.
+        """
+        if limit is None and after is None and columns is None:
+            if metric is None:
+                return pandas.read_sql(ResultsMixin._sql_results,
+                                       self._reader(), params=(cpt_id,))
+            return pandas.read_sql(ResultsMixin._sql_results + " AND A.metric == ?",
+                                   self._reader(), params=(cpt_id, metric))
+
+        if columns is None:
+            columns = [c for c in ResultsPage.allowed_columns if c != 'data']
+        for c in columns:
+            if c not in ResultsPage.allowed_columns:
+                raise ValueError("Unexpected column '{0}', allowed: {1}".format(
+                    c, list(ResultsPage.allowed_columns)))
+        desc = metric is None or greater_is_better(metric)
+        order = "DESC" if desc else "ASC"
+        conds = ["A.cpt_id == ?", "A.metric_value IS NOT NULL"]
+        params = [cpt_id]
+        if metric is not None:
+            conds.append("A.metric == ?")
+            params.append(metric)
+        if after is not None:
+            conds.append("(A.metric_value, A.sub_id) {0} (?, ?)".format("<" if desc else ">"))
+            params.extend(after)
+        sql = """SELECT {0}, A.metric_value, A.sub_id
+                 FROM submissions AS A
+                 INNER JOIN players AS B ON A.player_id == B.player_id
+                 INNER JOIN teams AS C ON B.team_id == C.team_id
+                 WHERE {1}
+                 ORDER BY A.metric_value {2}, A.sub_id {2}
+                 LIMIT ?""".format(
+            ", ".join(ResultsPage.allowed_columns[c] for c in columns),
+            " AND ".join(conds), order)
+        # one more row tells if there is a next page
+        params.append(-1 if limit is None else limit + 1)
+        rows = list(self.execute(sql, tuple(params)))
+        cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            cursor = rows[-1][-2:]
+        return ResultsPage(columns, [row[:-2] for row in rows], cursor)
+
+    _sql_results = """SELECT A.*, B.player_name AS player_name, C.team_name
+                      FROM submissions AS A
+                      INNER JOIN players AS B ON A.player_id == B.player_id
+                      INNER JOIN teams AS C ON B.team_id == C.team_id
+                      WHERE cpt_id == ?"""
+
+
+class ResultsPage:
+    """
+    One page of results returned by @see me get_results.
+    """
+
+    #: columns which can be requested and their SQL expression
+    allowed_columns = dict(sub_id="A.sub_id", cpt_id="A.cpt_id", player_id="A.player_id",
+                           date="A.date", data="A.data", metric="A.metric",
+                           metric_value="A.metric_value", player_name="B.player_name",
+                           team_name="C.team_name")
+
+    __slots__ = ('columns', 'rows', 'next_cursor')
+
+    def __init__(self, columns, rows, next_cursor):
+        """
+        @param      columns         column names
+        @param      rows            list of tuples
+        @param      next_cursor     cursor to give to @see me get_results
+                                    to get the next page, None if it is the last one
+        """
+        self.columns = columns
+        self.rows = rows
+        self.next_cursor = next_cursor
+
+    def __len__(self):
+        "Returns the number of rows."
+        return len(self.rows)
+
+    def __iter__(self):
+        "Iterates on rows."
+        return iter(self.rows)
+
+    def to_df(self):
+        """
+        Converts the page into a dataframe.
+        """
+        return pandas.DataFrame(self.rows, columns=self.columns)
+
+    def to_html(self, **kwargs):
+        """
+        Renders the page as a HTML table.
+        """
+        return self.to_df().to_html(**kwargs)
+
+    @property
+    def next_token(self):
+        """
+        Returns the cursor of the next page as a string
+        which can be used in an url, None if there is no next page.
+        """
+        if self.next_cursor is None:
+            return None
+        return ResultsPage.encode_cursor(self.next_cursor)
+
+    @staticmethod
+    def encode_cursor(cursor):
+        """
+        Converts a cursor into a string, see @see me decode_cursor.
+        """
+        return "{0!r}:{1}".format(float(cursor[0]), cursor[1])
+
+    @staticmethod
+    def decode_cursor(token):
+        """
+        Converts a string produced by @see me encode_cursor into a cursor.
+        """
+        value, sub_id = token.split(":", 1)
+        return float(value), sub_id
@@ -39,6 +39,18 @@ class LightMLBoardDefaultOptions:
 
     allowed_users = None
 
+    executor_workers = 4
+
+    executor_queue = 64
+
+    evaluation_workers = 2
+
+    evaluation_processes = True
+
+    page_cache_bytes = 2 ** 24
+
+    upload_max_bytes = 2 ** 27
+
     competitions = [Competition(
         cpt_id=0,
         name="Prédiction de la présence d'additifs",
@@ -0,0 +1,153 @@
+"""
+@file
+@brief Evaluates the submissions in the background.
+"""
+import functools
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from tornado.ioloop import IOLoop
+from tornado.locks import Semaphore
+from .dbmanager import DatabaseCompetition
+
+
+class EvaluationQueue:
+    """
+    Evaluates the submissions stored in table *jobs*
+    (see @see me add_job). The metrics are computed with
+    @see me evaluate_submission in a :epkg:`ProcessPoolExecutor`
+    so that the scoring does not hold the GIL of the web process.
+    The database is accessed through @see cl AsyncDatabaseCompetition.
+
+    ::
+
+        queue = EvaluationQueue(adb, max_workers=4)
+        job_id = await queue.enqueue(cpt_id, player_id, data)
+        queue.schedule(job_id)
+        ...
+        status = await queue.status(job_id)
+    """
+
+    def __init__(self, adb, max_workers=2, processes=True):
+        """
+        @param      adb             @see cl AsyncDatabaseCompetition
+        @param      max_workers     number of jobs evaluated at the same time
+        @param      processes       use processes or threads to compute the metrics
+        """
+        self._adb = adb
+        self.max_workers = max_workers
+        self.processes = processes
+        if processes:
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                thread_name_prefix="lightmlboard_eval")
+        self._running = Semaphore(max_workers)
+        self.running = 0
+        self.closed = False
+
+    async def enqueue(self, cpt_id, player_id, data, key=None):
+        """
+        Stores a submission in table *jobs*.
+
+        @param      cpt_id          competition id
+        @param      player_id       player id
+        @param      data            submission (bytes, str or a file object)
+        @param      key             key of the submission if already computed,
+                                    see @see me store_payload
+        @return                     job id
+        """
+        return await self._adb.run(self._adb.db.add_job, cpt_id, player_id, data, key=key)
+
+    def schedule(self, job_id):
+        """
+        Evaluates a job in the background, see @see me run.
+        It must be called from the IOLoop thread.
+        """
+        IOLoop.current().spawn_callback(self.run, job_id)
+
+    async def run(self, job_id):
+        """
+        Evaluates a job and records its scores or its error.
+
+        @param      job_id      job id
+        @return                 scores or None if the evaluation failed
+                                or if the job was already claimed
+                                (see @see me start_job)
+        """
+        async with self._running:
+            if self.closed:
+                # the job stays pending, it is evaluated
+                # after the server restarts, see @see me recover
+                return None
+            self.running += 1
+            try:
+                return await self._evaluate(job_id)
+            except Exception as e:  # pylint: disable=W0703
+                # the job must not stay running, nothing would release it
+                # while this process lives
+                await self._fail(job_id, e)
+                return None
+            finally:
+                self.running -= 1
+
+    async def _evaluate(self, job_id):
+        db = self._adb.db
+        claimed = await self._adb.run(db.start_job, job_id, bounded=False)
+        if claimed is None:
+            return None
+        tasks, data = claimed
+        scores, info = await IOLoop.current().run_in_executor(
+            self._executor, functools.partial(
+                DatabaseCompetition.evaluate_submission, tasks, data, return_info=True))
+        await self._adb.run(db.finish_job, job_id, scores=scores, info=info, bounded=False)
+        return scores
+
+    async def _fail(self, job_id, exc):
+        """
+        Marks a job as failed, the error is logged if it cannot be recorded.
+        """
+        try:
+            await self._adb.run(self._adb.db.finish_job, job_id,
+                                error="{0}: {1}".format(type(exc).__name__, exc),
+                                bounded=False)
+        except Exception as e:  # pylint: disable=W0703
+            logging.getLogger("lightmlboard").exception(
+                "[EvaluationQueue] unable to record the failure of job '{0}' ({1}): {2}".format(
+                    job_id, exc, e))
+
+    async def status(self, job_id):
+        """
+        Returns the status of a job, see @see me get_job.
+        """
+        return await self._adb.get_job(job_id)
+
+    async def recover(self, release=True):
+        """
+        Schedules the jobs left pending or running when
+        the server stopped.
+
+        @param      release     jobs left running are evaluated again
+                                (see @see me release_jobs), it must be False
+                                if other processes may be evaluating jobs
+        @return                 list of scheduled jobs
+        """
+        if release:
+            await self._adb.run(self._adb.db.release_jobs, bounded=False)
+        jobs = await self._adb.run(self._adb.db.get_pending_jobs, bounded=False)
+        for job_id in jobs:
+            self.schedule(job_id)
+        return jobs
+
+    def close(self):
+        """
+        Stops claiming new jobs, the running evaluations
+        complete (see attribute *running*).
+        """
+        self.closed = True
+
+    def shutdown(self, wait=True):
+        """
+        Stops the workers.
+        """
+        self.closed = True
+        self._executor.shutdown(wait=wait)
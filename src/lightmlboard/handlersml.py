@@ -2,10 +2,21 @@
 @file
 @brief Defines handlers for a Tornado application.
 """
+import hashlib
+import json
 import logging
 import pprint
+import sys
+import tempfile
+from urllib.parse import urlencode
+from tornado.concurrent import Future
+from tornado.iostream import StreamClosedError
 from tornado.web import RequestHandler
 import tornado.web
+from .dbasync import QueueFullError
+from .dbresults import ResultsPage
+from .live import format_event
+from .multipart import MultipartStreamParser, parse_boundary
 
 
 class _BaseRequestHandler(RequestHandler):
@@ -25,8 +36,68 @@ class _BaseRequestHandler(RequestHandler):
         if 'dbman' in kwargs:
             self._db = kwargs['dbman']
             del kwargs['dbman']
+        if 'evalqueue' in kwargs:
+            self._queue = kwargs['evalqueue']
+            del kwargs['evalqueue']
+        self._pages = kwargs.pop('pagecache', None)
+        self._upload_max_bytes = kwargs.pop('uploadmax', None)
+        self._live = kwargs.pop('live', None)
         RequestHandler.__init__(self, application, request, **kwargs)
         self._app_log = logging.getLogger("tornado.application")
+        # requests in progress, see @see me shutdown
+        self._counted = hasattr(application, 'active_requests')
+        if self._counted:
+            application.active_requests += 1
+
+    def _release_request(self):
+        if self._counted:
+            self._counted = False
+            self.application.active_requests -= 1
+
+    def on_finish(self):
+        self._release_request()
+
+    def on_connection_close(self):
+        # a streamed request is not finished if the client disconnects
+        self._release_request()
+        RequestHandler.on_connection_close(self)
+
+    def get_int_argument(self, name, default=None, minimum=None, maximum=None):
+        """
+        Returns an integer argument, the server answers 400
+        if it is not an integer or if it is below *minimum*.
+
+        @param      name        argument name
+        @param      default     default value, the argument is required if None
+        @param      minimum     minimum value if not None
+        @param      maximum     the value is capped to this maximum if not None
+        @return                 integer
+        """
+        val = self.get_argument(name) if default is None else self.get_argument(name, None)
+        if val is None:
+            return default
+        try:
+            val = int(val)
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, "{0} must be an integer.".format(name)) from e
+        if minimum is not None and val < minimum:
+            raise tornado.web.HTTPError(400, "{0} must be >= {1}.".format(name, minimum))
+        return val if maximum is None else min(val, maximum)
+
+    async def query_db(self, name, *args, **kwargs):
+        """
+        Calls a method of @see cl AsyncDatabaseCompetition,
+        the server answers 503 if too many queries are pending.
+
+        @param      name        method name
+        @param      args        positional arguments
+        @param      kwargs      named arguments
+        @return                 result
+        """
+        try:
+            return await getattr(self._db, name)(*args, **kwargs)
+        except QueueFullError as e:
+            raise tornado.web.HTTPError(503, str(e)) from e
 
     def info(self, message):
         """
@@ -48,6 +119,15 @@ class _BaseRequestHandler(RequestHandler):
         self.info('user={0}'.format(res))
         return res
 
+    def get_current_login(self):
+        """
+        Returns the login of the current user, None if not logged.
+        """
+        user = self.get_current_user()
+        if not user:
+            return None
+        return user['user'].strip('"')
+
 
 class _TemplateHandler(_BaseRequestHandler):
     """
@@ -236,20 +316,43 @@ class SubmitForm(_TemplateHandler):
             self, application, "submit.{0}.html".format(
                 kwargs.get('lang', 'fr')),
             request, **kwargs)
+
+    @tornado.web.authenticated
+    async def get(self):
+        """
+        Returns the form.
+        """
         val = self.get_argument('cpt_value', None)
         if val is None:
             raise ValueError(
                 "cpt_value is not defined in the list of arguments.")
         self._tmpl_context['cpt_value'] = val
-        self._tmpl_context['cptidname'] = self._db.get_competitions()
+        self._tmpl_context['cptidname'] = await self.query_db('get_competitions')
+        return self.render(self._tmpl_name, **self._tmpl_context)
 
 
+@tornado.web.stream_request_body
 class UploadData(_TemplateHandler):
     """
     Upload data.
     Handlers for the form to upload dataset.
+    The body is parsed while it is received
+    (see @see cl MultipartStreamParser), the file is written
+    into a temporary file and hashed on the fly, it is never
+    entirely in memory. The size announced by header *Content-Length*
+    is checked before the body is received, the size of the file
+    is checked while it is received. The limit is option *upload_max_bytes*
+    or the limit of the competition if it is lower
+    (see @see cl PredictionSchema).
     """
 
+    #: size allowed for the other fields and the multipart headers
+    form_overhead = 2 ** 16
+    #: maximum size of a field which is not a file
+    max_field_size = 2 ** 12
+    #: size above which the temporary file is written on disk
+    spool_size = 2 ** 20
+
     def __init__(self, application, request, **kwargs):
         """
         Constructor.
@@ -259,16 +362,211 @@ class UploadData(_TemplateHandler):
                 kwargs.get('lang', 'fr')),
             request, **kwargs)
         self._tmpl_context['waitgif'] = "/static/giphy.gif"
+        self._tmpl_context['job'] = None
+        self._parser = None
+        self._max_bytes = self._upload_max_bytes
+        self._part = None
+        self._field = None
+        self._spool = None
+        self._hash = None
+        self._file_size = 0
+
+    async def _competition_limit(self, value):
+        """
+        Returns the maximum size of a submission for a competition.
+        """
+        try:
+            cpt_id = int(value)
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e)) from e
+        try:
+            schema = await self.query_db('get_prediction_schema', cpt_id)
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e)) from e
+        limits = [self._upload_max_bytes, None if schema is None else schema.max_bytes]
+        limits = [m for m in limits if m is not None]
+        return min(limits) if limits else None
+
+    def _check_size(self):
+        if self._max_bytes is not None and self._file_size > self._max_bytes:
+            raise tornado.web.HTTPError(
+                413, "The submission exceeds {0} bytes.".format(self._max_bytes))
 
-    @tornado.gen.coroutine
-    def post(self):
-        "post"
-        fileinfo = self.request.files['filearg'][0]
-        self.info("fileinfo={0}".format(fileinfo))
-        fname = fileinfo['filename']
-        self.info("filename='{0}'".format(fname))
-        content = fileinfo['body']
-        self.info("downloaded size={0}".format(len(content)))
+    @tornado.web.authenticated
+    async def prepare(self):
+        """
+        Checks the size of the body before receiving it,
+        the competition can be specified in the url
+        to use its limit at this stage.
+        """
+        if self.request.method != 'POST':
+            return
+        cpt = self.get_query_argument('competition', None)
+        if cpt is not None:
+            self._max_bytes = await self._competition_limit(cpt)
+        if self._max_bytes is not None:
+            max_body = self._max_bytes + self.form_overhead
+            length = self.request.headers.get('Content-Length', None)
+            if length is not None and (not length.isdigit() or int(length) > max_body):
+                raise tornado.web.HTTPError(
+                    413, "The body exceeds {0} bytes.".format(max_body))
+            self.request.connection.set_max_body_size(max_body)
+        try:
+            self._parser = MultipartStreamParser(
+                parse_boundary(self.request.headers.get('Content-Type', None)))
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e)) from e
+
+    def check_xsrf_cookie(self):
+        """
+        :epkg:`tornado` checks the token before the body is received,
+        the check is delayed until field ``_xsrf`` is received
+        unless the token is in the url or in a header.
+        """
+        if (self._parser is None and self.get_query_argument('_xsrf', None) is None and
+                not self.request.headers.get("X-Xsrftoken") and
+                not self.request.headers.get("X-Csrftoken")):
+            return
+        _TemplateHandler.check_xsrf_cookie(self)
+
+    async def data_received(self, chunk):
+        """
+        Parses a chunk of the body.
+        """
+        if self._finished:
+            # an error was already sent, the connection is closed
+            # after the response
+            return
+        try:
+            try:
+                events = self._parser.feed(chunk)
+            except ValueError as e:
+                raise tornado.web.HTTPError(400, str(e)) from e
+            for event in events:
+                await self._on_event(event)
+        except tornado.web.HTTPError as e:
+            self._close_spool()
+            self.log_exception(*sys.exc_info())
+            self.send_error(e.status_code, exc_info=sys.exc_info())
+
+    async def _on_event(self, event):
+        """
+        Processes an event returned by @see me feed.
+        """
+        if event[0] == 'begin':
+            name, filename = event[1:3]
+            if filename is None:
+                self._part = name
+                self._field = bytearray()
+            elif name != 'filearg' or self._spool is not None:
+                raise tornado.web.HTTPError(400, "Unexpected file '{0}'.".format(name))
+            else:
+                self.info("filename='{0}'".format(filename))
+                self._part = None
+                self._spool = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+                self._hash = hashlib.sha256()
+        elif event[0] == 'data':
+            if self._part is None:
+                self._file_size += len(event[1])
+                self._check_size()
+                self._hash.update(event[1])
+                self._spool.write(event[1])
+            else:
+                self._field += event[1]
+                if len(self._field) > self.max_field_size:
+                    raise tornado.web.HTTPError(
+                        400, "Field '{0}' is too long.".format(self._part))
+        elif self._part is not None:
+            name, value = self._part, bytes(self._field)
+            self._part = self._field = None
+            self.request.body_arguments.setdefault(name, []).append(value)
+            self.request.arguments.setdefault(name, []).append(value)
+            if name == '_xsrf' and self.application.settings.get("xsrf_cookies"):
+                self.check_xsrf_cookie()
+            elif name == 'competition':
+                self._max_bytes = await self._competition_limit(
+                    self.decode_argument(value, name))
+                self._check_size()
+
+    def _close_spool(self):
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    def on_finish(self):
+        self._close_spool()
+        _TemplateHandler.on_finish(self)
+
+    def on_connection_close(self):
+        self._close_spool()
+        _TemplateHandler.on_connection_close(self)
+
+    @tornado.web.authenticated
+    async def post(self):
+        """
+        Stores the submission as a job evaluated in the background
+        by @see cl EvaluationQueue, the page polls ``/status``.
+        The bytes are stored as they were received, they are decoded
+        and parsed by @see fn parse_predictions.
+        """
+        try:
+            self._parser.close()
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e)) from e
+        if self.application.settings.get("xsrf_cookies"):
+            self.check_xsrf_cookie()
+        if self._spool is None:
+            raise tornado.web.HTTPError(400, "No file was uploaded.")
+        self.info("downloaded size={0}".format(self._file_size))
+        try:
+            cpt_id = int(self.get_argument('competition'))
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e)) from e
+        player_id = await self.query_db('get_player_id_from_login', self.get_current_login())
+        if player_id is None:
+            raise tornado.web.HTTPError(403, "Unknown player.")
+        self._spool.seek(0)
+        try:
+            job_id = await self._queue.enqueue(cpt_id, player_id, self._spool,
+                                               key=self._hash.hexdigest())
+        except QueueFullError as e:
+            raise tornado.web.HTTPError(503, str(e)) from e
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e)) from e
+        finally:
+            self._close_spool()
+        self._queue.schedule(job_id)
+        self.info("job='{0}'".format(job_id))
+        self._tmpl_context['job'] = job_id
+        return self.render(self._tmpl_name, **self._tmpl_context)
+
+
+class StatusHandler(_BaseRequestHandler):
+    """
+    Returns the status of a job created by @see cl UploadData
+    as :epkg:`JSON`.
+    """
+
+    def __init__(self, application, request, **kwargs):
+        """
+        Constructor.
+        """
+        kwargs = {k: v for k, v in kwargs.items() if not k.startswith("tmpl_")}
+        _BaseRequestHandler.__init__(self, application, request, **kwargs)
+
+    @tornado.web.authenticated
+    async def get(self):
+        """
+        Returns the job status.
+        """
+        job_id = self.get_argument('job')
+        job = await self.query_db('get_job', job_id)
+        player_id = await self.query_db('get_player_id_from_login', self.get_current_login())
+        if job is None or job['player_id'] != player_id:
+            raise tornado.web.HTTPError(404, "Unknown job '{0}'.".format(job_id))
+        self.set_header("Cache-Control", "no-store")
+        self.write({k: job[k] for k in ['job_id', 'cpt_id', 'status', 'created',
+                                        'finished', 'error', 'scores', 'info']})
 
 
 class CompetitionHandler(_TemplateHandler):
@@ -284,9 +582,249 @@ class CompetitionHandler(_TemplateHandler):
             self, application, "challenge.{0}.html".format(
                 kwargs.get('lang', 'fr')),
             request, **kwargs)
+
+    #: arguments the page depends on
+    _page_arguments = ('top', 'metric', 'after', 'limit')
+
+    @tornado.web.authenticated
+    async def get(self):
+        """
+        Returns the page of a competition.
+        The page carries an *ETag* computed from the version of the
+        competition (see @see me get_version), the user and the arguments.
+        A request with a matching ``If-None-Match`` receives a 304
+        without querying the database. Otherwise the page is looked up
+        in @see cl PageCache and only rendered if it is not there.
+        """
         val = self.get_argument('cpt_id', None)
         if val is None:
             raise ValueError(
                 "cpt_id is not defined in the list of arguments.")
-        self._tmpl_context['cpt'] = self._db.get_competition(val)
-        self._tmpl_context['results'] = self._db.get_results(val)
+        try:
+            cpt_id = int(val)
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e)) from e
+        query = tuple((k, self.get_argument(k)) for k in self._page_arguments
+                      if self.get_argument(k, None) is not None)
+        key = (cpt_id, self._db.get_version(cpt_id), self.get_current_login(), query)
+        self.set_header("Etag", '"{0}"'.format(
+            hashlib.sha1(repr(key).encode('utf-8')).hexdigest()))
+        self.set_header("Cache-Control", "private, no-cache")
+        self.set_header("Vary", "Cookie")
+        if self.check_etag_header():
+            self.set_status(304)
+            return None
+        page = None if self._pages is None else self._pages.get(key)
+        if page is None:
+            page = await self._render_competition(cpt_id)
+            if self._pages is not None:
+                self._pages.put(key, page)
+        return self.finish(page)
+
+    async def _render_competition(self, val):
+        """
+        Queries the database and renders the page of a competition.
+        """
+        top = self.get_int_argument('top', 20, minimum=1, maximum=1000)
+        cpt = await self.query_db('get_competition', val)
+        self._tmpl_context['cpt'] = cpt
+        self._tmpl_context['leaderboards'] = [
+            (met, await self.query_db('get_leaderboard', val, met, top=top))
+            for met in cpt.metrics]
+
+        # history of submissions, one page at a time
+        metric = self.get_argument('metric', cpt.metrics[0])
+        after = self.get_argument('after', None)
+        if after is not None:
+            try:
+                after = ResultsPage.decode_cursor(after)
+            except ValueError as e:
+                raise tornado.web.HTTPError(400, "Invalid cursor '{0}'.".format(after)) from e
+        limit = self.get_int_argument('limit', 50, minimum=1, maximum=500)
+        page = await self.query_db(
+            'get_results', val, metric=metric, limit=limit, after=after,
+            columns=['date', 'player_name', 'team_name', 'metric', 'metric_value'])
+        self._tmpl_context['page'] = page
+        self._tmpl_context['next_page'] = None if page.next_token is None else (
+            "/competition?" + urlencode(dict(cpt_id=val, metric=metric, limit=limit,
+                                             after=page.next_token)))
+        return self.render_string(self._tmpl_name, **self._tmpl_context)
+
+
+class _ApiHandler(_BaseRequestHandler):
+    """
+    Base class for the handlers returning :epkg:`JSON`.
+    The content is serialized from the rows returned by the database
+    without any :epkg:`pandas` dataframe, the application compresses
+    the response if the client accepts it (setting *compress_response*).
+    """
+
+    def __init__(self, application, request, **kwargs):
+        """
+        Constructor.
+        """
+        kwargs = {k: v for k, v in kwargs.items() if not k.startswith("tmpl_")}
+        _BaseRequestHandler.__init__(self, application, request, **kwargs)
+
+    def write_json(self, obj):
+        """
+        Writes a compact :epkg:`JSON` and finishes the request.
+        """
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        return self.finish(json.dumps(obj, separators=(',', ':')))
+
+
+class ApiCompetitionsHandler(_ApiHandler):
+    """
+    Returns the list of competitions.
+    """
+
+    @tornado.web.authenticated
+    async def get(self):
+        """
+        Returns ``{"columns": [...], "rows": [[...], ...]}``,
+        one row per competition, column *metrics* is a list.
+        """
+        rows = await self.query_db(
+            'get_competitions', ['cpt_id', 'cpt_name', 'link', 'description', 'metric'])
+        return self.write_json(dict(
+            columns=['cpt_id', 'cpt_name', 'link', 'description', 'metrics'],
+            rows=[row[:-1] + (row[-1].split(','),) for row in rows]))
+
+
+class ApiLeaderboardHandler(_ApiHandler):
+    """
+    Returns the leaderboard of a competition for one metric,
+    arguments *cpt_id*, *metric*, *top* (default 10, at most 1000)
+    and *teams* (0 or 1).
+    """
+
+    @tornado.web.authenticated
+    async def get(self):
+        """
+        Returns ``{"cpt_id": ..., "metric": ..., "columns": [...], "rows": [[...], ...]}``,
+        see @see me get_leaderboard_rows.
+        """
+        cpt_id = self.get_int_argument('cpt_id')
+        metric = self.get_argument('metric')
+        top = self.get_int_argument('top', 10, minimum=1, maximum=1000)
+        teams = self.get_int_argument('teams', 0) != 0
+        columns, rows = await self.query_db('get_leaderboard_rows', cpt_id, metric,
+                                            top=top, teams=teams)
+        return self.write_json(dict(cpt_id=cpt_id, metric=metric, columns=columns, rows=rows))
+
+
+class ApiSubmissionsHandler(_ApiHandler):
+    """
+    Returns the last submissions of a player, arguments *player*
+    (a login, the current user by default), *cpt_id* (optional)
+    and *limit* (default 100, at most 1000).
+    """
+
+    @tornado.web.authenticated
+    async def get(self):
+        """
+        Returns ``{"player": ..., "columns": [...], "rows": [[...], ...]}``,
+        see @see me get_player_submissions.
+        """
+        login = self.get_argument('player', None) or self.get_current_login()
+        cpt_id = self.get_argument('cpt_id', None)
+        if cpt_id is not None:
+            cpt_id = self.get_int_argument('cpt_id')
+        limit = self.get_int_argument('limit', 100, minimum=1, maximum=1000)
+        player_id = await self.query_db('get_player_id_from_login', login)
+        if player_id is None:
+            raise tornado.web.HTTPError(404, "Unknown player '{0}'.".format(login))
+        columns, rows = await self.query_db('get_player_submissions', player_id,
+                                            cpt_id=cpt_id, limit=limit)
+        return self.write_json(dict(player=login, columns=columns, rows=rows))
+
+
+class LiveHandler(_BaseRequestHandler):
+    """
+    Streams the changes of the leaderboard of a competition
+    (argument *cpt_id*) with :epkg:`Server-Sent Events`,
+    see @see cl LiveBroadcaster. Every event *score* holds
+    ``{"cpt_id": ..., "version": ..., "deltas": [...]}``
+    (see @see me _score_deltas), its id is the version
+    of the competition. A client reconnecting with header
+    ``Last-Event-ID`` receives event *reload* if it missed
+    some changes.
+    """
+
+    def __init__(self, application, request, **kwargs):
+        """
+        Constructor.
+        """
+        kwargs = {k: v for k, v in kwargs.items() if not k.startswith("tmpl_")}
+        _BaseRequestHandler.__init__(self, application, request, **kwargs)
+        self._done = None
+        self._pending = 0
+
+    @tornado.web.authenticated
+    async def get(self):
+        """
+        Keeps the connection opened until the client leaves.
+        """
+        try:
+            cpt_id = int(self.get_argument('cpt_id'))
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e)) from e
+        if self._live is None:
+            raise tornado.web.HTTPError(404, "No live updates.")
+        cpts = await self.query_db('get_competitions')
+        if cpt_id not in set(c[0] for c in cpts):
+            raise tornado.web.HTTPError(404, "Unknown competition {0}.".format(cpt_id))
+        # every message is flushed immediately, compressing them
+        # would require one compression context per client
+        self._transforms = [t for t in self._transforms
+                            if not isinstance(t, tornado.web.GZipContentEncoding)]
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        self.set_header("X-Accel-Buffering", "no")
+        version = self._db.get_version(cpt_id)
+        self.write(b"retry: 5000\n\n")
+        last = self.request.headers.get("Last-Event-ID", None)
+        if last is not None and last != str(version):
+            self.write(format_event('reload', dict(cpt_id=cpt_id, version=version),
+                                    event_id=version))
+        self._done = Future()
+        self._live.subscribe(cpt_id, self)
+        try:
+            await self.flush()
+            await self._done
+        except StreamClosedError:
+            pass
+        finally:
+            self._live.unsubscribe(cpt_id, self)
+
+    def send(self, message):
+        """
+        Sends a message, the client is disconnected
+        if it does not read them fast enough.
+        """
+        if self._done is None or self._done.done():
+            return
+        if self._pending >= self._live.max_pending:
+            self.info("client too slow, disconnected")
+            self.stop()
+            return
+        self.write(message)
+        self._pending += 1
+        self.flush().add_done_callback(self._on_flush)
+
+    def _on_flush(self, fut):
+        self._pending -= 1
+        if fut.exception() is not None:
+            self.stop()
+
+    def stop(self):
+        """
+        Ends the stream.
+        """
+        if self._done is not None and not self._done.done():
+            self._done.set_result(None)
+
+    def on_connection_close(self):
+        self.stop()
+        _BaseRequestHandler.on_connection_close(self)
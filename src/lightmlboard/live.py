@@ -0,0 +1,175 @@
+"""
+@file
+@brief Pushes the changes of the leaderboards to the connected clients.
+
+Every recorded submission produces one event
+(see @see me add_listener), it is serialized once and
+written to every client following the competition
+(see @see cl LiveHandler), no query is run for a client.
+If several processes share the database, a process only
+sees its own submissions, the others are detected
+with the versions of the competitions (see @see me watch).
+"""
+import json
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+
+def format_event(event, data, event_id=None):
+    """
+    Formats a :epkg:`Server-Sent Events` message.
+
+    @param      event       event name
+    @param      data        data, serialized in :epkg:`JSON`
+    @param      event_id    event id, None for none
+    @return                 bytes
+    """
+    lines = []
+    if event_id is not None:
+        lines.append("id: {0}".format(event_id))
+    lines.append("event: {0}".format(event))
+    lines.append("data: {0}".format(json.dumps(data, separators=(',', ':'))))
+    return ("\n".join(lines) + "\n\n").encode('utf-8')
+
+
+class LiveBroadcaster:
+    """
+    Keeps the clients following a competition and sends them
+    the changes of the leaderboard. A subscriber implements
+    ``send(message)`` and ``stop()``. Method @see me publish
+    has the signature expected by @see me add_listener and
+    can be called from any thread, the other methods must be
+    called from the :epkg:`tornado:IOLoop` thread.
+
+    ::
+
+        live = LiveBroadcaster()
+        db.add_listener(live.publish)
+    """
+
+    def __init__(self, heartbeat=15., max_pending=32):
+        """
+        @param      heartbeat       a comment is sent every *heartbeat* seconds
+                                    so that proxies do not close idle connections,
+                                    0 to disable
+        @param      max_pending     a client is disconnected if more than
+                                    *max_pending* messages are not yet sent
+        """
+        self.heartbeat = heartbeat
+        self.max_pending = max_pending
+        self._subscribers = {}
+        self._loop = None
+        self._ping = None
+        self._get_version = None
+        self._watch_interval = None
+        self._watcher = None
+        self._published = {}
+
+    def watch(self, get_version, interval=1.):
+        """
+        Checks the versions of the followed competitions every
+        *interval* seconds, the subscribers receive event *reload*
+        if a competition changed without any event published by this process
+        (another process recorded a submission).
+
+        @param      get_version     function returning the version of a competition,
+                                    see @see me get_version
+        @param      interval        period in seconds
+        """
+        self._get_version = get_version
+        self._watch_interval = interval
+
+    def subscribe(self, cpt_id, subscriber):
+        """
+        Adds a subscriber to a competition.
+        """
+        if self._loop is None:
+            self._loop = IOLoop.current()
+        self._subscribers.setdefault(cpt_id, set()).add(subscriber)
+        if self._ping is None and self.heartbeat:
+            self._ping = PeriodicCallback(self._send_ping, self.heartbeat * 1000)
+            self._ping.start()
+        if self._get_version is not None:
+            if cpt_id not in self._published:
+                self._published[cpt_id] = self._get_version(cpt_id)
+            if self._watcher is None:
+                self._watcher = PeriodicCallback(self._check_versions,
+                                                 self._watch_interval * 1000)
+                self._watcher.start()
+
+    def unsubscribe(self, cpt_id, subscriber):
+        """
+        Removes a subscriber.
+        """
+        subs = self._subscribers.get(cpt_id, None)
+        if subs is not None:
+            subs.discard(subscriber)
+            if len(subs) == 0:
+                del self._subscribers[cpt_id]
+        if len(self._subscribers) == 0:
+            self._stop_callbacks()
+
+    def _stop_callbacks(self):
+        if self._ping is not None:
+            self._ping.stop()
+            self._ping = None
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def count(self, cpt_id=None):
+        """
+        Returns the number of subscribers of a competition or all of them.
+        """
+        if cpt_id is None:
+            return sum(map(len, self._subscribers.values()))
+        return len(self._subscribers.get(cpt_id, ()))
+
+    def publish(self, cpt_id, version, deltas):
+        """
+        Sends the changes of a competition to its subscribers,
+        the function can be called from any thread.
+
+        @param      cpt_id      competition id
+        @param      version     new version of the competition
+        @param      deltas      changes, see @see me _score_deltas
+        """
+        if self._loop is None:
+            # nobody ever subscribed
+            return
+        if version > self._published.get(cpt_id, 0):
+            self._published[cpt_id] = version
+        self._loop.add_callback(self._publish, cpt_id, version, deltas)
+
+    def _publish(self, cpt_id, version, deltas):
+        subs = self._subscribers.get(cpt_id, None)
+        if not subs:
+            return
+        message = format_event('score', dict(cpt_id=cpt_id, version=version, deltas=deltas),
+                               event_id=version)
+        for sub in list(subs):
+            sub.send(message)
+
+    def _check_versions(self):
+        for cpt_id, subs in list(self._subscribers.items()):
+            version = self._get_version(cpt_id)
+            if version <= self._published.get(cpt_id, 0):
+                continue
+            self._published[cpt_id] = version
+            message = format_event('reload', dict(cpt_id=cpt_id, version=version),
+                                   event_id=version)
+            for sub in list(subs):
+                sub.send(message)
+
+    def _send_ping(self):
+        for subs in list(self._subscribers.values()):
+            for sub in list(subs):
+                sub.send(b": ping\n\n")
+
+    def close(self):
+        """
+        Ends every stream.
+        """
+        for subs in list(self._subscribers.values()):
+            for sub in list(subs):
+                sub.stop()
+        self._stop_callbacks()
@@ -2,29 +2,231 @@
 @file
 @brief Implements metrics.
 """
-import sklearn.metrics as skmetrics
-from .classification import roc_auc_score_micro, roc_auc_score_macro, reshape, multi_label_jaccard
+import numpy
+import pandas
+from scipy import sparse as scipy_sparse
+from .classification import (
+    roc_auc_score_micro, roc_auc_score_macro, roc_auc_scores, reshape, multi_label_jaccard)
 from .regression import mse
 from .regression_custom import l1_reg_max
+from .streaming import streaming_metric, streaming_scores, iter_csv_chunks
+from .registry import (
+    MetricInfo, register_metric, get_metric, greater_is_better_name, _sklearn_fct)
 
 
-def sklearn_metric(met, exp, val):
+def sklearn_metric(met, exp, val, cache=None):
     """
     Looks into metrics available in
     :epkg:`scikit-learn:metrics`.
 
     @param      met     function name
-    @param      exp     expected values
+    @param      exp     expected values, a sparse indicator matrix
+                        is given to the metric as is and converted
+                        into a dense one only if the metric refuses it
     @param      val     values
+    @param      cache   see @see fn reshape
     @return             number
     """
     if isinstance(val, str):
         raise TypeError("val must be a container of floats")
     if isinstance(exp, str):
         raise TypeError("exp must be a container of floats")
+    import sklearn.metrics as skmetrics
     if hasattr(skmetrics, met):
-        f = getattr(skmetrics, met)
-        exp, val = reshape(exp, val)
-        return f(exp, val)
+        exp, val = reshape(exp, val, cache=cache)
+        return _sklearn_fct(getattr(skmetrics, met))(exp, val)
     else:
         raise AttributeError("Unable to find metric '{0}'.".format(met))
+
+
+def greater_is_better(met):
+    """
+    Tells if a greater value of the metric means a better submission,
+    see @see cl MetricInfo. It follows :epkg:`scikit-learn` naming convention
+    for unknown metrics, a metric ending with ``_error``, ``_loss``
+    or ``_deviance`` is better when it is lower.
+
+    @param      met     metric name
+    @return             boolean
+    """
+    try:
+        return get_metric(met).greater_is_better
+    except ValueError:
+        return greater_is_better_name(met)
+
+
+#: a label vector is expanded into a sparse indicator matrix
+#: beyond this number of classes, see @see fn evaluate_metrics
+SPARSE_MIN_CLASSES = 32
+
+#: computations shared by several metrics, see @see cl MetricInfo
+_shared_computations = {
+    'auc': lambda exp, val, params, cache: roc_auc_scores(
+        exp, val, averages=tuple(params), cache=cache),
+}
+
+
+def _raw_values(values):
+    """
+    Converts values into an array for the metrics
+    which do not need the indicator matrix.
+    """
+    if isinstance(values, (pandas.DataFrame, pandas.Series)):
+        values = values.values
+    elif isinstance(values, list):
+        values = numpy.array(values)
+    if isinstance(values, numpy.ndarray) and len(values.shape) == 2 and values.shape[1] == 1:
+        values = values.ravel()
+    return values
+
+
+def _is_keyed(values):
+    """
+    Tells if *values* is a dataframe whose first columns are keys
+    and the last one holds the values.
+    """
+    return isinstance(values, pandas.DataFrame) and values.shape[1] > 1
+
+
+def _raw_pair(exp, val):
+    """
+    Converts expected values and predictions for the metrics
+    which do not need the indicator matrix. If both are dataframes
+    with keys (see @see fn _is_keyed), they become dictionaries
+    ``{key: value}`` aligned by the metric, if only one of them has keys,
+    its last column is kept as the streaming metrics do
+    (see @see fn _chunk_values).
+    """
+    if _is_keyed(exp) and _is_keyed(val):
+        return _keyed_dict(exp), _keyed_dict(val)
+    if _is_keyed(exp):
+        exp = exp.iloc[:, -1]
+    if _is_keyed(val):
+        val = val.iloc[:, -1]
+    return _raw_values(exp), _raw_values(val)
+
+
+def _keyed_dict(values):
+    "Converts a dataframe with keys into a dictionary ``{key: value}``."
+    if values.shape[1] == 2:
+        keys = values.iloc[:, 0]
+    else:
+        keys = zip(*[values.iloc[:, i] for i in range(values.shape[1] - 1)])
+    return dict(zip(keys, values.iloc[:, -1]))
+
+
+def evaluate_metric(met, exp, val, cache=None):
+    """
+    Evaluates one metric.
+
+    @param      met     metric name or @see cl MetricInfo
+    @param      exp     expected values
+    @param      val     values
+    @param      cache   see @see fn reshape
+    @return             number
+    """
+    info = get_metric(met)
+    return evaluate_metrics([info], exp, val, sparse=False, cache=cache)[info.name]
+
+
+def evaluate_metrics(metrics, exp, val, sparse='auto', cache=None):
+    """
+    Evaluates several metrics on the same expected values and predictions.
+    Every metric is resolved by @see fn get_metric, its flags tell
+    what must be done before calling it: the data is reshaped once
+    (see @see fn reshape) if one metric needs the indicator matrix,
+    :epkg:`float32` predictions are converted once if one metric
+    does not accept them, the metrics sharing a computation
+    (the sort of the scores for the area under the ROC curve,
+    see @see fn roc_auc_scores) are computed together.
+
+    @param      metrics     list of metric names or @see cl MetricInfo
+    @param      exp         expected values
+    @param      val         values
+    @param      sparse      a label vector is expanded into a sparse indicator
+                            matrix, ``'auto'`` if there are at least
+                            @see var SPARSE_MIN_CLASSES classes
+    @param      cache       see @see fn reshape
+    @return                 dictionary ``{metric: value}``
+    """
+    infos = [get_metric(m) for m in metrics]
+    data = {}
+    if any(not info.one_hot for info in infos):
+        data[False] = _raw_pair(exp, val)
+    if any(info.one_hot for info in infos):
+        if sparse == 'auto':
+            shape = getattr(val, 'shape', None)
+            sparse = shape is not None and len(shape) == 2 and shape[1] >= SPARSE_MIN_CLASSES
+        data[True] = reshape(exp, val, sparse=sparse, cache=cache)
+
+    def get_data(info):
+        e, v = data[info.one_hot]
+        if (not info.float32 and isinstance(v, numpy.ndarray) and
+                v.dtype == numpy.float32):
+            key = (info.one_hot, 'float64')
+            if key not in data:
+                data[key] = (e, v.astype(numpy.float64))
+            e, v = data[key]
+        return e, v
+
+    shared = {}
+    for info in infos:
+        if info.shared is not None:
+            shared.setdefault(info.shared[0], []).append(info)
+    shared_res = {}
+    for key, group in shared.items():
+        e, v = get_data(group[0])
+        shared_res[key] = _shared_computations[key](
+            e, v, [info.shared[1] for info in group], cache)
+
+    res = {}
+    for info in infos:
+        if info.shared is not None:
+            res[info.name] = shared_res[info.shared[0]][info.shared[1]]
+        else:
+            res[info.name] = info.fct(*get_data(info))
+    return res
+
+
+def evaluate_metrics_batch(metrics, exp, vals, cache=None):
+    """
+    Evaluates several metrics for several predictions
+    of the same expected values. A metric supporting batches
+    (see @see cl MetricInfo) is computed once for all predictions,
+    the other ones are computed for every prediction with
+    @see fn evaluate_metrics.
+
+    @param      metrics     list of metric names or @see cl MetricInfo
+    @param      exp         expected values
+    @param      vals        list of predictions
+    @param      cache       see @see fn reshape, a dictionary is created
+                            if None so that the predictions share it
+    @return                 dictionary ``{metric: list of values}``
+    """
+    if cache is None:
+        cache = {}
+    infos = [get_metric(m) for m in metrics]
+    raw = [_raw_values(v) for v in vals]
+    keyed = _is_keyed(exp) or any(map(_is_keyed, vals))
+    res = {}
+    stack = None
+    others = []
+    for info in infos:
+        if not info.supports_batch or len(vals) == 0 or (keyed and not info.one_hot):
+            # keys are aligned by evaluate_metrics
+            others.append(info)
+            continue
+        if stack is None:
+            stack = numpy.stack(raw)
+        if info.one_hot:
+            e, _ = reshape(exp, raw[0], cache=cache)
+            if scipy_sparse.issparse(e):
+                e = e.toarray()
+        else:
+            e = _raw_values(exp)
+        res[info.name] = [float(r) for r in info.batch(e, stack)]
+    if len(others) > 0:
+        scores = [evaluate_metrics(others, exp, v, cache=cache) for v in vals]
+        for info in others:
+            res[info.name] = [s[info.name] for s in scores]
+    return {info.name: res[info.name] for info in infos}
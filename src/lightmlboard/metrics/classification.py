@@ -1,11 +1,13 @@
 """
 @file
-@brief Metrics about regressions.
+@brief Metrics about classification.
 """
 import io
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 import numpy
 import pandas
-from sklearn.metrics import roc_auc_score
+from scipy import sparse as scipy_sparse
 
 
 def is_vector(a):
@@ -15,9 +17,42 @@ def is_vector(a):
     return len(a.shape) == 1 or a.shape[1] == 1
 
 
-def reshape(exp, val):
+def one_hot(labels, shape, sparse=False):
+    """
+    Builds the indicator matrix of a vector of class indices.
+
+    @param      labels      class index of every row
+    @param      shape       shape of the matrix, ``(len(labels), number of classes)``
+    @param      sparse      returns a :epkg:`scipy:sparse:csr_matrix`
+    @return                 matrix of *uint8*
+    """
+    labels = numpy.asarray(labels).ravel().astype(numpy.int64)
+    if labels.shape[0] != shape[0]:
+        raise ValueError("Dimension mismatch {0} != {1}".format(labels.shape[0], shape[0]))
+    if labels.shape[0] > 0 and (labels.min() < 0 or labels.max() >= shape[1]):
+        raise ValueError("Class indices must be in [0, {0}[.".format(shape[1]))
+    if sparse:
+        return scipy_sparse.csr_matrix(
+            (numpy.ones(shape[0], dtype=numpy.uint8), labels,
+             numpy.arange(shape[0] + 1)), shape=shape)
+    res = numpy.zeros(shape, dtype=numpy.uint8)
+    res[numpy.arange(shape[0]), labels] = 1
+    return res
+
+
+def reshape(exp, val, sparse=False, cache=None):
     """
     Reshape the expected values and predictions.
+    If *exp* holds class indices and *val* one score per class,
+    *exp* is replaced by its indicator matrix (see @see fn one_hot).
+
+    @param      exp         expected values
+    @param      val         predictions
+    @param      sparse      the indicator matrix is sparse
+    @param      cache       dictionary to store the indicator matrix
+                            and reuse it, it must only be used with the
+                            same expected values
+    @return                 exp, val
     """
     if isinstance(val, list):
         val = numpy.array(val)
@@ -29,14 +64,17 @@ def reshape(exp, val):
         exp = exp.values
     if not isinstance(val, numpy.ndarray):
         raise TypeError("val is {0} not an array".format(type(val)))
-    if not isinstance(exp, numpy.ndarray):
+    if not isinstance(exp, numpy.ndarray) and not scipy_sparse.issparse(exp):
         raise TypeError("exp is {0} not an array".format(type(exp)))
     if is_vector(exp) != is_vector(val):
         if not is_vector(val) and is_vector(exp):
-            exp_ = exp
-            exp = numpy.zeros((val.shape))
-            for i, v in enumerate(exp_.ravel()):
-                exp[i, int(v)] = 1
+            key = (val.shape, bool(sparse))
+            if cache is not None and key in cache:
+                exp = cache[key]
+            else:
+                exp = one_hot(exp, val.shape, sparse=sparse)
+                if cache is not None:
+                    cache[key] = exp
         else:
             exp = exp.ravel()
             val = val.ravel()
@@ -54,19 +92,298 @@ def reshape(exp, val):
 def roc_auc_score_micro(exp, val):
     """
     Computes `roc_auc_score <http://scikit-learn.org/stable/modules/generated/sklearn.metrics.roc_auc_score.html>`_
-    with *average='micro'*.
+    with *average='micro'*, see @see fn roc_auc_scores.
     """
-    exp, val = reshape(exp, val)
-    return roc_auc_score(exp, val, average="micro")
+    return roc_auc_scores(exp, val, averages=('micro',))['micro']
 
 
 def roc_auc_score_macro(exp, val):
     """
     Computes `roc_auc_score <http://scikit-learn.org/stable/modules/generated/sklearn.metrics.roc_auc_score.html>`_
-    with *average='macro'*.
+    with *average='macro'*, see @see fn roc_auc_scores.
+    """
+    return roc_auc_scores(exp, val, averages=('macro',))['macro']
+
+
+def _positive_mask(exp):
+    """
+    Converts expected labels into a boolean mask of the positive class,
+    *exp* must be binary (two distinct values, the greater is positive)
+    or a binary indicator matrix, dense or sparse. A sparse matrix
+    becomes a boolean mask, one byte per cell.
+    """
+    if scipy_sparse.issparse(exp):
+        coo = exp.tocoo()
+        if not numpy.all(numpy.isin(coo.data, [0, 1])):
+            raise ValueError("multilabel-indicator expects 0 or 1")
+        mask = numpy.zeros(exp.shape, dtype=numpy.bool_)
+        mask[coo.row, coo.col] = coo.data == 1
+        return mask
+    if exp.dtype == numpy.bool_:
+        return exp
+    labels = numpy.unique(exp)
+    if len(exp.shape) == 2:
+        if not numpy.all(numpy.isin(labels, [0, 1])):
+            raise ValueError("multilabel-indicator expects 0 or 1 not {0}".format(labels))
+        return exp == 1
+    if len(labels) > 2 or (exp.dtype.kind == 'f' and not numpy.all(labels == labels.astype(numpy.int64))):
+        raise ValueError("continuous format is not supported")
+    return exp == labels[-1]
+
+
+def _rank_sum_auc(sorted_val, sorted_pos, npos=None):
+    """
+    Computes the area under the ROC curve with the
+    `Mann-Whitney statistic <https://en.wikipedia.org/wiki/Mann%E2%80%93Whitney_U_test>`_.
+    Tied scores receive the average of their ranks.
+
+    @param      sorted_val      scores sorted in increasing order
+    @param      sorted_pos      positive mask in the same order
+    @param      npos            number of positives if known
+    @return                     AUC, *nan* if only one class is present
+    """
+    n = sorted_val.shape[0]
+    if npos is None:
+        npos = int(numpy.count_nonzero(sorted_pos))
+    nneg = n - npos
+    if npos == 0 or nneg == 0:
+        from sklearn.exceptions import UndefinedMetricWarning
+        warnings.warn("Only one class is present in y_true. ROC AUC score is not "
+                      "defined in that case.", UndefinedMetricWarning)
+        return numpy.nan
+    first = numpy.empty(n, dtype=numpy.bool_)
+    first[0] = True
+    numpy.not_equal(sorted_val[1:], sorted_val[:-1], out=first[1:])
+    starts = numpy.flatnonzero(first)
+    if starts.shape[0] == n:
+        # no tie
+        rank_sum = float(numpy.flatnonzero(sorted_pos).sum()) + npos
+    else:
+        ends = numpy.empty(starts.shape, dtype=numpy.int64)
+        ends[:-1] = starts[1:]
+        ends[-1] = n
+        cum = numpy.cumsum(sorted_pos, dtype=numpy.int64)[ends - 1]
+        cum[1:] -= cum[:-1].copy()
+        rank_sum = float(numpy.dot((starts + ends + 1) * 0.5, cum))
+    return (rank_sum - npos * (npos + 1) * 0.5) / (float(npos) * nneg)
+
+
+class RocAucEngine:
+    """
+    Computes the area under the ROC curve for binary
+    or multi-label problems, with the same results as
+    `roc_auc_score <http://scikit-learn.org/stable/modules/generated/sklearn.metrics.roc_auc_score.html>`_.
+    The expected values are analysed once (positive mask and counts),
+    the engine can then evaluate many submissions. Every AUC is
+    a rank sum (see @see fn _rank_sum_auc) after one sort of the scores,
+    tied scores get the average of their ranks. The scores are not
+    converted, *float32* stays *float32*.
+
+    ::
+
+        engine = RocAucEngine(exp)
+        res = engine.compute(val, averages=('micro', 'macro'))
+    """
+
+    def __init__(self, exp):
+        """
+        @param      exp     expected values, binary vector or indicator
+                            matrix (dense or sparse)
+        """
+        self.positives = _positive_mask(exp)
+        self.shape = self.positives.shape
+        if len(self.shape) == 1:
+            self.npos_columns = numpy.array([numpy.count_nonzero(self.positives)])
+        else:
+            self.npos_columns = numpy.count_nonzero(self.positives, axis=0)
+            self._positives_t = numpy.ascontiguousarray(self.positives.T)
+        self.npos = int(self.npos_columns.sum())
+
+    def compute(self, val, averages=('micro', 'macro'), n_jobs=1):
+        """
+        Computes the requested averages. The micro average sorts
+        all the scores together, the macro average sorts every column
+        once, the columns can be processed by several threads
+        (:epkg:`numpy` releases the GIL while sorting).
+
+        @param      val         scores, same shape as the expected values
+        @param      averages    ``'micro'`` and/or ``'macro'``
+        @param      n_jobs      number of threads to process the columns
+        @return                 dictionary ``{average: value}``
+        """
+        for av in averages:
+            if av not in ('micro', 'macro'):
+                raise ValueError("Unexpected average '{0}'.".format(av))
+        val = numpy.asarray(val)
+        if val.shape != self.shape:
+            raise ValueError("Dimension mismatch {0} != {1}".format(val.shape, self.shape))
+        if val.dtype.kind == 'f' and numpy.isnan(val).any():
+            raise ValueError("Input contains NaN.")
+
+        if len(self.shape) == 1:
+            order = numpy.argsort(val)
+            auc = _rank_sum_auc(val[order], self.positives[order], self.npos)
+            return {av: auc for av in averages}
+
+        res = {}
+        if 'micro' in averages:
+            flat = val.ravel()
+            order = numpy.argsort(flat)
+            res['micro'] = _rank_sum_auc(flat[order], self.positives.ravel()[order], self.npos)
+        if 'macro' in averages:
+            # one contiguous row per column
+            columns = numpy.ascontiguousarray(val.T)
+
+            def column(j):
+                col = columns[j]
+                order = numpy.argsort(col)
+                return _rank_sum_auc(col[order], self._positives_t[j][order],
+                                     self.npos_columns[j])
+
+            ncol = self.shape[1]
+            if n_jobs is not None and n_jobs > 1 and ncol > 1:
+                with ThreadPoolExecutor(max_workers=n_jobs) as exe:
+                    aucs = list(exe.map(column, range(ncol)))
+            else:
+                aucs = [column(j) for j in range(ncol)]
+            res['macro'] = float(numpy.mean(aucs))
+        return res
+
+
+def roc_auc_scores(exp, val, averages=('micro', 'macro'), cache=None, n_jobs=1):
+    """
+    Computes the area under the ROC curve for several averages
+    in a single pass with @see cl RocAucEngine. It returns the same values as
+    `roc_auc_score <http://scikit-learn.org/stable/modules/generated/sklearn.metrics.roc_auc_score.html>`_.
+
+    @param      exp         expected values
+    @param      val         scores
+    @param      averages    ``'micro'`` and/or ``'macro'``
+    @param      cache       see @see fn reshape, the engine is stored
+                            in it as well
+    @param      n_jobs      number of threads to process the columns
+    @return                 dictionary ``{average: value}``
+
+    *exp* may be a sparse indicator matrix.
+    """
+    exp, val = reshape(exp, val, sparse=True, cache=cache)
+    key = ('auc', val.shape)
+    if cache is not None and key in cache:
+        engine = cache[key]
+    else:
+        engine = RocAucEngine(exp)
+        if cache is not None:
+            cache[key] = engine
+    return engine.compute(val, averages=averages, n_jobs=n_jobs)
+
+
+def _to_set(v):
+    "as a set"
+    if isinstance(v, set):
+        return v
+    elif isinstance(v, str):
+        return set(v.split(','))
+    elif isinstance(v, (float, int)):
+        return {str(v)}
+    else:
+        return set(v)
+
+
+def _label_sets(cells):
+    """
+    Converts a sequence of cells into label sets stored
+    as CSR arrays: the number of labels of every row and
+    the labels of all rows one after another.
+    Strings (and a series converted into strings) are split in one call,
+    other cells follow the rules of @see fn multi_label_jaccard.
+
+    @param      cells       list or :epkg:`pandas:Series`
+    @return                 lengths (array), labels (array of objects)
     """
-    exp, val = reshape(exp, val)
-    return roc_auc_score(exp, val, average="macro")
+    if isinstance(cells, pandas.Series):
+        cells = cells.astype(str).tolist()
+    elif not isinstance(cells, list):
+        cells = list(cells)
+    if all(isinstance(c, str) for c in cells):
+        if len(cells) == 0:
+            return numpy.zeros((0,), dtype=numpy.int64), numpy.empty((0,), dtype=object)
+        # a marker between rows gives the number of labels of every row
+        flat = (",\x01,".join(cells) + ",\x01").split(',')
+        tokens = numpy.empty(len(flat), dtype=object)
+        tokens[:] = flat
+        markers = tokens == "\x01"
+        ends = numpy.flatnonzero(markers)
+        lengths = numpy.diff(ends, prepend=-1) - 1
+        return lengths, tokens[~markers]
+    lengths = numpy.empty(len(cells), dtype=numpy.int64)
+    flat = []
+    for i, cell in enumerate(cells):
+        st = _to_set(cell)
+        lengths[i] = len(st)
+        flat.extend(st)
+    labels = numpy.empty(len(flat), dtype=object)
+    labels[:] = flat
+    return lengths, labels
+
+
+def _jaccard_rows(exp_sets, val_sets):
+    """
+    Computes the Jaccard index of every row of two aligned
+    sequences of label sets produced by @see fn _label_sets.
+    Labels are encoded into integers once, every label becomes
+    a key ``row * number of labels + label``, the keys of both sides
+    are sorted together, duplicates are removed and a key present
+    on both sides belongs to the intersection.
+
+    @param      exp_sets    lengths, labels
+    @param      val_sets    lengths, labels
+    @return                 array of scores
+    """
+    len_e, lab_e = exp_sets
+    len_v, lab_v = val_sets
+    n = len_e.shape[0]
+    codes = pandas.factorize(numpy.concatenate([lab_e, lab_v]), use_na_sentinel=False)[0]
+    ncodes = int(codes.max()) + 1 if codes.shape[0] > 0 else 1
+    rows = numpy.arange(n, dtype=numpy.int64)
+    # the last bit tells the side, one sort finds duplicates and intersections
+    keys = numpy.concatenate([
+        (numpy.repeat(rows, len_e) * ncodes + codes[:lab_e.shape[0]]) * 2,
+        (numpy.repeat(rows, len_v) * ncodes + codes[lab_e.shape[0]:]) * 2 + 1])
+    keys.sort()
+    if keys.shape[0] > 0:
+        keep = numpy.empty(keys.shape, dtype=numpy.bool_)
+        keep[0] = True
+        numpy.not_equal(keys[1:], keys[:-1], out=keep[1:])
+        keys = keys[keep]
+    side = keys & 1
+    pairs = keys >> 1
+    row = pairs // ncodes
+    card_e = numpy.bincount(row[side == 0], minlength=n)
+    card_v = numpy.bincount(row[side == 1], minlength=n)
+    inter = numpy.bincount(row[1:][pairs[1:] == pairs[:-1]], minlength=n)
+    union = card_e + card_v - inter
+    if numpy.any(union == 0):
+        raise ZeroDivisionError("Both label sets are empty for row {0}".format(
+            numpy.flatnonzero(union == 0)[0]))
+    return inter / union
+
+
+def _align_keys(exp_keys, val_keys, exc):
+    """
+    Aligns the keys of the expected values and the predictions
+    with a hash join (:epkg:`pandas:Index`).
+
+    @param      exp_keys    keys of the expected values
+    @param      val_keys    keys of the predictions
+    @param      exc         raises an exception if a key is missing
+    @return                 position of every expected key in *val_keys*, -1 if missing
+    """
+    index = exp_keys if isinstance(exp_keys, pandas.Index) else pandas.Index(exp_keys)
+    pos = pandas.Index(val_keys).get_indexer(index)
+    if exc and numpy.any(pos < 0):
+        raise ValueError("Missing key in prediction {0}".format(
+            index[numpy.flatnonzero(pos < 0)[0]]))
+    return pos
 
 
 def multi_label_jaccard(exp, val, exc=True):
@@ -85,62 +402,55 @@ def multi_label_jaccard(exp, val, exc=True):
 
         E = \\frac{1}{n} \\sum_{i=1}^n \\frac{|C_i \\cap P_i|}{|C_i \\cup P_i|}
 
+    Labels are encoded into integers, the label sets are stored
+    as arrays and keys are aligned with a join so that
+    the computation does not loop over the rows in :epkg:`Python`
+    (see @see fn _jaccard_rows). A missing key counts as 0.
     """
-    def to_set(v):
-        "as a set"
-        if isinstance(v, set):
-            return v
-        elif isinstance(v, str):
-            return set(v.split(','))
-        elif isinstance(v, (float, int)):
-            return {str(v)}
-        else:
-            return set(v)
-
     if isinstance(exp, (str, io.StringIO)) and isinstance(val, (str, io.StringIO)):
         # Files or streams.
         d1 = pandas.read_csv(exp, header=None, sep=";")
         d2 = pandas.read_csv(val, header=None, sep=";")
-        dd1 = {}
-        for k, v in d1.itertuples(name=None, index=False):
-            if k in dd1:
-                raise KeyError("Key '{}' present at least twice.".format(k))
-            dd1[k] = v
-        dd2 = {}
-        for k, v in d2.itertuples(name=None, index=False):
-            if k in dd2:
-                raise KeyError("Key '{}' present at least twice.".format(k))
-            dd2[k] = v
-        return multi_label_jaccard(dd1, dd2, exc=exc)
+        for d in [d1, d2]:
+            dup = d[0].duplicated()
+            if dup.any():
+                raise KeyError("Key '{}' present at least twice.".format(
+                    d[0][dup.values].iloc[0]))
+        if exc and d1.shape[0] != d2.shape[0]:
+            number_common = len(set(d1[0]) & set(d2[0]))
+            raise ValueError(
+                "Dimension mismatch {0} != {1} (#common={2})".format(d1.shape[0], d2.shape[0], number_common))
+        pos = _align_keys(pandas.Index(d1[0]), d2[0], exc)
+        found = pos >= 0
+        r = _jaccard_rows(_label_sets(d1[1][found].reset_index(drop=True)),
+                          _label_sets(d2[1].take(pos[found]).reset_index(drop=True)))
+        return r.sum() / d1.shape[0]
     elif isinstance(exp, dict) and isinstance(val, dict):
         if exc and len(exp) != len(val):
             number_common = len(set(exp) & set(val))
             raise ValueError(
                 "Dimension mismatch {0} != {1} (#common={2})".format(len(exp), len(val), number_common))
-        r = 0.0
-        missing = 0
-        for k, e in exp.items():
-            if k in val:
-                v = val[k]
-                es = to_set(e)
-                vs = to_set(v)
-                r += float(len(es & vs)) / len(es.union(vs))
-            else:
-                missing += 1
-                if exc:
-                    raise ValueError("Missing key in prediction {0}".format(k))
-        return r / len(exp)
+        if len(exp) == 0:
+            raise ZeroDivisionError("exp is empty")
+        exp_keys = list(exp)
+        exp_cells = list(exp.values())
+        val_cells = list(val.values())
+        if exp_keys != list(val):
+            # the join is only needed if the keys are not in the same order
+            pos = _align_keys(exp_keys, list(val), exc)
+            found = pos >= 0
+            if not found.all():
+                exp_cells = [e for e, f in zip(exp_cells, found) if f]
+            val_cells = [val_cells[p] for p in pos[found]]
+        r = _jaccard_rows(_label_sets(exp_cells), _label_sets(val_cells))
+        return r.sum() / len(exp)
     elif isinstance(exp, list) and isinstance(val, list):
         if len(exp) != len(val):
             raise ValueError(
                 "Dimension mismatch {0} != {1}. Use product_id and only_exp.".format(len(exp), len(val)))
-
-        r = 0.0
-        for e, v in zip(exp, val):
-            es = to_set(e)
-            vs = to_set(v)
-            r += float(len(es & vs)) / len(es.union(vs))
-        return r / len(exp)
+        if len(exp) == 0:
+            raise ZeroDivisionError("exp is empty")
+        return _jaccard_rows(_label_sets(exp), _label_sets(val)).mean()
     else:
         raise TypeError(
             "Inconsistent types {0} != {1}".format(type(exp), type(val)))
@@ -0,0 +1,205 @@
+"""
+@file
+@brief Registry of the metrics.
+
+Every metric name is resolved once into a @see cl MetricInfo,
+a function and flags telling how it can be computed.
+A name is looked up in the registered metrics,
+then in the entry points of group ``lightmlboard.metrics``,
+then in :epkg:`scikit-learn:metrics`, imported only if needed.
+A third-party package registers a metric with an entry point,
+the object is a @see cl MetricInfo or a function ``f(exp, val)``:
+
+::
+
+    setup(...,
+          entry_points={'lightmlboard.metrics': [
+              'my_metric = mypackage.metrics:my_metric']})
+"""
+import sys
+import threading
+from scipy import sparse as scipy_sparse
+from .classification import roc_auc_score_micro, roc_auc_score_macro, multi_label_jaccard
+from .regression import mse, mse_batch
+from .regression_custom import l1_reg_max, l1_reg_max_batch
+from .streaming import _streaming_metrics
+
+
+#: entry point group used to register third-party metrics
+ENTRY_POINT_GROUP = "lightmlboard.metrics"
+
+
+class MetricInfo:
+    """
+    Describes a metric, the function computing it
+    and what it supports.
+    """
+
+    __slots__ = ('name', 'fct', 'greater_is_better', 'float32', 'one_hot',
+                 'batch', 'streaming', 'shared')
+
+    def __init__(self, name, fct, greater_is_better=None, float32=False, one_hot=True,
+                 batch=None, streaming=None, shared=None):
+        """
+        @param      name                metric name
+        @param      fct                 function ``f(exp, val)``
+        @param      greater_is_better   a greater value means a better submission,
+                                        None follows :epkg:`scikit-learn` naming convention
+                                        (see @see fn greater_is_better_name)
+        @param      float32             the function accepts :epkg:`float32` predictions
+                                        without losing precision, otherwise they are
+                                        converted into :epkg:`float64`
+        @param      one_hot             the function expects the expected values
+                                        as an indicator matrix if the predictions hold
+                                        one score per class (see @see fn reshape),
+                                        otherwise it receives the arrays as they are
+        @param      batch               function ``f(exp, vals)`` computing the metric
+                                        for a stack of predictions, None if not supported
+        @param      streaming           class computing the metric on chunks
+                                        (see @see cl StreamingMetric), None if not supported
+        @param      shared              ``(key, parameter)``, the metrics sharing the same key
+                                        are computed together, ``('auc', average)``
+                                        uses @see fn roc_auc_scores
+        """
+        self.name = name
+        self.fct = fct
+        self.greater_is_better = (greater_is_better_name(name)
+                                  if greater_is_better is None else greater_is_better)
+        self.float32 = float32
+        self.one_hot = one_hot
+        self.batch = batch
+        self.streaming = streaming
+        self.shared = shared
+
+    def __repr__(self):
+        return "MetricInfo({0!r}, {1})".format(
+            self.name, getattr(self.fct, '__name__', self.fct))
+
+    @property
+    def supports_batch(self):
+        "Tells if the metric can be computed for a stack of predictions."
+        return self.batch is not None
+
+    @property
+    def supports_streaming(self):
+        "Tells if the metric can be computed on chunks."
+        return self.streaming is not None
+
+
+def greater_is_better_name(met):
+    """
+    Tells if a greater value means a better submission
+    following :epkg:`scikit-learn` naming convention,
+    a metric ending with ``_error``, ``_loss`` or ``_deviance``
+    is better when it is lower.
+    """
+    return not met.endswith(('_error', '_loss', '_deviance'))
+
+
+def _sklearn_fct(f):
+    """
+    Wraps a function of :epkg:`scikit-learn:metrics`,
+    a sparse indicator matrix is given as is and converted
+    into a dense one only if the function refuses it.
+    """
+    def fct(exp, val):
+        if scipy_sparse.issparse(exp):
+            try:
+                return f(exp, val)
+            except TypeError:
+                exp = exp.toarray()
+        return f(exp, val)
+    fct.__name__ = f.__name__
+    return fct
+
+
+def _jaccard_arrays(exp, val):
+    """
+    Calls @see fn multi_label_jaccard on two aligned arrays
+    or two dictionaries ``{key: labels}``.
+    """
+    if isinstance(exp, dict) and isinstance(val, dict):
+        return multi_label_jaccard(exp, val)
+    return multi_label_jaccard(list(exp), list(val))
+
+
+_registry = {}
+_lock = threading.Lock()
+_entry_points = None
+
+
+def register_metric(info, fct=None, overwrite=False, **kwargs):
+    """
+    Registers a metric.
+
+    @param      info        @see cl MetricInfo or a metric name
+    @param      fct         function if *info* is a name
+    @param      overwrite   replaces a metric already registered
+    @param      kwargs      flags given to @see cl MetricInfo if *info* is a name
+    @return                 @see cl MetricInfo
+    """
+    if not isinstance(info, MetricInfo):
+        if fct is None:
+            raise ValueError("fct must be specified for metric '{0}'.".format(info))
+        info = MetricInfo(info, fct, **kwargs)
+    with _lock:
+        if info.name in _registry and not overwrite:
+            raise ValueError("Metric '{0}' is already registered.".format(info.name))
+        _registry[info.name] = info
+    return info
+
+
+def _load_entry_points():
+    """
+    Returns the entry points of group @see var ENTRY_POINT_GROUP
+    as a dictionary ``{name: entry point}``, they are loaded once.
+    """
+    global _entry_points  # pylint: disable=W0603
+    if _entry_points is None:
+        from importlib.metadata import entry_points
+        if sys.version_info[:2] >= (3, 10):
+            eps = entry_points(group=ENTRY_POINT_GROUP)
+        else:
+            eps = entry_points().get(ENTRY_POINT_GROUP, [])
+        _entry_points = {ep.name: ep for ep in eps}
+    return _entry_points
+
+
+def get_metric(met):
+    """
+    Resolves a metric name, see @see cl MetricInfo.
+
+    @param      met     metric name or @see cl MetricInfo
+    @return             @see cl MetricInfo
+    """
+    if isinstance(met, MetricInfo):
+        return met
+    info = _registry.get(met, None)
+    if info is not None:
+        return info
+    eps = _load_entry_points()
+    if met in eps:
+        obj = eps[met].load()
+        info = obj if isinstance(obj, MetricInfo) else MetricInfo(met, obj)
+    else:
+        import sklearn.metrics as skmetrics
+        if not callable(getattr(skmetrics, met, None)):
+            raise ValueError("Unable to find metric '{0}'.".format(met))
+        info = MetricInfo(met, _sklearn_fct(getattr(skmetrics, met)))
+    with _lock:
+        return _registry.setdefault(met, info)
+
+
+register_metric('mse', _sklearn_fct(mse), greater_is_better=False, batch=mse_batch,
+                streaming=_streaming_metrics['mse'])
+register_metric('l1_reg_max', l1_reg_max, greater_is_better=False, one_hot=False,
+                batch=l1_reg_max_batch, streaming=_streaming_metrics['l1_reg_max'])
+register_metric('multi_label_jaccard', _jaccard_arrays, greater_is_better=True,
+                float32=True, one_hot=False,
+                streaming=_streaming_metrics['multi_label_jaccard'])
+register_metric('roc_auc_score_micro', roc_auc_score_micro, greater_is_better=True,
+                float32=True, shared=('auc', 'micro'),
+                streaming=_streaming_metrics['roc_auc_score_micro'])
+register_metric('roc_auc_score_macro', roc_auc_score_macro, greater_is_better=True,
+                float32=True, shared=('auc', 'macro'),
+                streaming=_streaming_metrics['roc_auc_score_macro'])
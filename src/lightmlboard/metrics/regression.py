@@ -2,11 +2,28 @@
 @file
 @brief Metrics about regressions.
 """
-from sklearn.metrics import mean_squared_error
+import numpy
 
 
 def mse(exp, val):
     """
     Computes `mean_squared_error <http://scikit-learn.org/stable/modules/generated/sklearn.metrics.mean_squared_error.html>`_.
     """
+    from sklearn.metrics import mean_squared_error
     return mean_squared_error(exp, val)
+
+
+def mse_batch(exp, vals):
+    """
+    Computes @see fn mse for a stack of predictions.
+
+    @param      exp     expected values, shape *S*
+    @param      vals    predictions, shape ``(b,) + S``
+    @return             array of *b* scores
+    """
+    exp = numpy.asarray(exp, dtype=numpy.float64)
+    vals = numpy.asarray(vals)
+    if vals.shape[1:] != exp.shape:
+        raise ValueError("Dimension mismatch {0} != {1}".format(vals.shape[1:], exp.shape))
+    diff = (vals - exp).reshape((vals.shape[0], -1))
+    return numpy.einsum('ij,ij->i', diff, diff) / diff.shape[1]
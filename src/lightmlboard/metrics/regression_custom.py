@@ -7,6 +7,72 @@ import numpy
 import pandas
 
 
+def _l1_reg_max_errors(exp, val, max_val, nomax):
+    """
+    Computes the errors of @see fn l1_reg_max for aligned arrays.
+    """
+    mv = numpy.minimum(val, max_val)
+    me = numpy.minimum(exp, max_val)
+    if nomax:
+        keep = me < max_val
+        mv = mv[keep]
+        me = me[keep]
+    return numpy.abs(mv - me) / max_val
+
+
+def _l1_reg_max_keys(exp_keys, exp_values, val_keys, val_values, max_val, nomax, exc):
+    """
+    Computes @see fn l1_reg_max when values are identified by keys.
+    Keys are aligned with a hash join (:epkg:`pandas:Index`)
+    into two arrays given to the vectorized computation.
+    A missing key counts as an error of 1 if *exc* is False.
+    """
+    if exc and len(exp_keys) != len(val_keys):
+        number_common = len(set(exp_keys) & set(val_keys))
+        raise ValueError(
+            "Dimension mismatch {0} != {1} (#common={2})".format(len(exp_keys), len(val_keys), number_common))
+    index = pandas.Index(exp_keys)
+    pos = pandas.Index(val_keys).get_indexer(index)
+    missing = pos < 0
+    nmissing = int(missing.sum())
+    if exc and nmissing > 0:
+        raise ValueError("Missing key in prediction {0}".format(
+            index[numpy.flatnonzero(missing)[0]]))
+    exp_values = numpy.asarray(exp_values)
+    val_values = numpy.asarray(val_values)
+    if exp_values.dtype.kind not in 'biuf' or val_values.dtype.kind not in 'biuf':
+        # non numerical values
+        return numpy.nan
+    errors = _l1_reg_max_errors(exp_values[~missing], val_values[pos[~missing]],
+                                max_val, nomax)
+    nb = errors.shape[0] + nmissing
+    return (errors.sum() + nmissing) / nb if nb > 0 else 0.0
+
+
+def l1_reg_max_batch(exp, vals, max_val=180, nomax=False):
+    """
+    Computes @see fn l1_reg_max for a stack of predictions
+    aligned with the expected values.
+
+    @param      exp         expected values, shape ``(n,)``
+    @param      vals        predictions, shape ``(b, n)``
+    @param      max_val     see @see fn l1_reg_max
+    @param      nomax       see @see fn l1_reg_max
+    @return                 array of *b* scores
+    """
+    exp = numpy.asarray(exp).ravel()
+    vals = numpy.asarray(vals)
+    if len(vals.shape) != 2 or vals.shape[1] != exp.shape[0]:
+        raise ValueError("Dimension mismatch {0} != (b, {1})".format(vals.shape, exp.shape[0]))
+    me = numpy.minimum(exp, max_val)
+    errors = numpy.abs(numpy.minimum(vals, max_val) - me) / max_val
+    if nomax:
+        errors = errors[:, me < max_val]
+    if errors.shape[1] == 0:
+        return numpy.zeros((vals.shape[0],))
+    return errors.mean(axis=1)
+
+
 def l1_reg_max(exp, val, max_val=180, nomax=False, exc=True):
     """
     Implements a :epkg:`L1` scoring function which does not consider
@@ -30,65 +96,30 @@ def l1_reg_max(exp, val, max_val=180, nomax=False, exc=True):
     The computation is faster if :epkg:`numpy:array` are used
     (for *exp* and *val*). *exp and *val* can be filenames or streams.
     In that case, the function expects to find two columns: id, value
-    in both files or streams.
+    in both files or streams. Files and dictionaries are aligned on their
+    keys with a join and follow the same vectorized path as arrays.
     """
     if isinstance(exp, numpy.ndarray) and isinstance(val, numpy.ndarray):
         if len(exp) != len(val):
             raise ValueError(
                 "Dimension mismatch {0} != {1}".format(len(exp), len(val)))
-        an = numpy.zeros((len(exp),))
-        an[:] = max_val
-        mv = numpy.minimum(an, val)  # pylint: disable=E1111
-        me = numpy.minimum(an, exp)  # pylint: disable=E1111
-        if nomax:
-            mv = mv[me < max_val]  # pylint: disable=W0143,E1136
-            me = me[me < max_val]  # pylint: disable=W0143,E1136
-        df = numpy.abs(mv - me) / max_val
+        df = _l1_reg_max_errors(exp, val, max_val, nomax)
         return df.mean()
     elif isinstance(exp, dict) and isinstance(val, dict):
-        if exc and len(exp) != len(val):
-            number_common = len(set(exp) & set(val))
-            raise ValueError(
-                "Dimension mismatch {0} != {1} (#common={2})".format(len(exp), len(val), number_common))
-        r = 0.0
-        nb = 0
-        for k, e in exp.items():
-            if k in val:
-                v = val[k]
-                try:
-                    mv = min(v, max_val)
-                except TypeError:
-                    return numpy.nan
-                try:
-                    ev = min(e, max_val)
-                except TypeError:
-                    return numpy.nan
-                if nomax and ev >= max_val:
-                    continue
-                d = abs(mv - ev)
-                r += 1. * d / max_val
-                nb += 1
-            elif exc:
-                raise ValueError("Missing key in prediction {0}".format(k))
-            else:
-                r += 1.
-                nb += 1
-        return r / nb if nb > 0 else 0.0
+        return _l1_reg_max_keys(list(exp.keys()), list(exp.values()),
+                                list(val.keys()), list(val.values()),
+                                max_val=max_val, nomax=nomax, exc=exc)
     elif isinstance(exp, (str, io.StringIO)) and isinstance(val, (str, io.StringIO)):
         # We expect filenames.
         d1 = pandas.read_csv(exp, header=None, sep=";")
         d2 = pandas.read_csv(val, header=None, sep=";")
-        dd1 = {}
-        for k, v in d1.itertuples(name=None, index=False):
-            if k in dd1:
-                raise KeyError("Key '{}' present at least twice.".format(k))
-            dd1[k] = v
-        dd2 = {}
-        for k, v in d2.itertuples(name=None, index=False):
-            if k in dd2:
-                raise KeyError("Key '{}' present at least twice.".format(k))
-            dd2[k] = v
-        return l1_reg_max(dd1, dd2, max_val=max_val, nomax=nomax, exc=exc)
+        for d in [d1, d2]:
+            dup = d[0].duplicated()
+            if dup.any():
+                raise KeyError("Key '{}' present at least twice.".format(
+                    d[0][dup.values].iloc[0]))
+        return _l1_reg_max_keys(d1[0].values, d1[1].values, d2[0].values, d2[1].values,
+                                max_val=max_val, nomax=nomax, exc=exc)
     elif isinstance(exp, list) and isinstance(val, list):
         if len(exp) != len(val):
             raise ValueError(
@@ -0,0 +1,359 @@
+"""
+@file
+@brief Computes metrics on chunks of data without keeping them in memory.
+
+Every class consumes aligned chunks ``(expected, predicted)``
+with method *update* and only keeps accumulators,
+the memory does not depend on the number of rows.
+Two accumulators can be merged if the data was split
+between several workers.
+
+Tolerance with the exact metrics:
+
+* @see cl StreamingMSE, @see cl StreamingL1RegMax,
+  @see cl StreamingJaccard are equal up to floating-point
+  rounding (relative error below ``1e-9`` for 50 million rows)
+* @see cl StreamingRocAuc uses fixed-bin histograms, the difference
+  is bounded by @see me error_bound
+"""
+import numpy
+import pandas
+from .classification import reshape, one_hot, _label_sets, _jaccard_rows
+from .regression_custom import _l1_reg_max_errors
+
+
+def _chunk_values(chunk, keys=False):
+    """
+    Converts a chunk into an array. If *keys* is True and the chunk
+    is a dataframe with several columns, the first ones are keys
+    and the last one holds the values.
+    """
+    if isinstance(chunk, pandas.DataFrame):
+        if keys and chunk.shape[1] > 1:
+            return chunk.iloc[:, -1].values
+        chunk = chunk.values
+    elif isinstance(chunk, pandas.Series):
+        chunk = chunk.values
+    chunk = numpy.asarray(chunk)
+    if len(chunk.shape) == 2 and chunk.shape[1] == 1:
+        chunk = chunk.ravel()
+    return chunk
+
+
+class StreamingMetric:
+    """
+    Base class for the streaming metrics.
+    """
+
+    def update(self, exp, val):
+        """
+        Updates the accumulators with a chunk.
+
+        @param      exp     expected values
+        @param      val     predictions aligned with *exp*
+        @return             self
+        """
+        raise NotImplementedError()
+
+    def merge(self, other):
+        """
+        Adds the accumulators of another metric of the same type.
+
+        @param      other   @see cl StreamingMetric
+        @return             self
+        """
+        raise NotImplementedError()
+
+    def result(self):
+        """
+        Returns the metric.
+        """
+        raise NotImplementedError()
+
+    def _check_merge(self, other):
+        if type(other) is not type(self):
+            raise TypeError("Unable to merge {0} into {1}".format(
+                type(other), type(self)))
+
+
+class StreamingMSE(StreamingMetric):
+    """
+    Mean squared error, see @see fn mse, the average
+    is uniform over the columns.
+    """
+
+    def __init__(self):
+        self.sum = 0.
+        self.count = 0
+
+    def update(self, exp, val):
+        exp = _chunk_values(exp)
+        val = _chunk_values(val)
+        if exp.shape != val.shape:
+            raise ValueError("Dimension mismatch {0} != {1}".format(exp.shape, val.shape))
+        diff = exp.astype(numpy.float64) - val
+        self.sum += float(numpy.dot(diff.ravel(), diff.ravel()))
+        self.count += diff.size
+        return self
+
+    def merge(self, other):
+        self._check_merge(other)
+        self.sum += other.sum
+        self.count += other.count
+        return self
+
+    def result(self):
+        if self.count == 0:
+            raise ValueError("No data.")
+        return self.sum / self.count
+
+
+class StreamingL1RegMax(StreamingMetric):
+    """
+    Streaming version of @see fn l1_reg_max,
+    the rows of both chunks must be aligned.
+    """
+
+    def __init__(self, max_val=180, nomax=False):
+        """
+        @param      max_val     see @see fn l1_reg_max
+        @param      nomax       see @see fn l1_reg_max
+        """
+        self.max_val = max_val
+        self.nomax = nomax
+        self.sum = 0.
+        self.count = 0
+
+    def update(self, exp, val):
+        exp = _chunk_values(exp, keys=True)
+        val = _chunk_values(val, keys=True)
+        if exp.shape != val.shape:
+            raise ValueError("Dimension mismatch {0} != {1}".format(exp.shape, val.shape))
+        errors = _l1_reg_max_errors(exp, val, self.max_val, self.nomax)
+        self.sum += float(errors.sum())
+        self.count += errors.shape[0]
+        return self
+
+    def merge(self, other):
+        self._check_merge(other)
+        self.sum += other.sum
+        self.count += other.count
+        return self
+
+    def result(self):
+        return self.sum / self.count if self.count > 0 else 0.0
+
+
+class StreamingJaccard(StreamingMetric):
+    """
+    Streaming version of @see fn multi_label_jaccard,
+    the rows of both chunks must be aligned.
+    The intersection and the union of every row
+    are computed by @see fn _jaccard_rows, the class
+    keeps the sum of the ratios and the number of rows.
+    """
+
+    def __init__(self):
+        self.sum = 0.
+        self.count = 0
+
+    def update(self, exp, val):
+        exp = _chunk_values(exp, keys=True)
+        val = _chunk_values(val, keys=True)
+        if exp.shape[0] != val.shape[0]:
+            raise ValueError("Dimension mismatch {0} != {1}".format(exp.shape[0], val.shape[0]))
+        self.sum += float(_jaccard_rows(_label_sets(self._cells(exp)),
+                                        _label_sets(self._cells(val))).sum())
+        self.count += exp.shape[0]
+        return self
+
+    @staticmethod
+    def _cells(cells):
+        if cells.dtype != object:
+            return cells.astype(str).astype(object)
+        if all(isinstance(c, str) for c in cells):
+            return cells
+        return list(cells)
+
+    def merge(self, other):
+        self._check_merge(other)
+        self.sum += other.sum
+        self.count += other.count
+        return self
+
+    def result(self):
+        if self.count == 0:
+            raise ZeroDivisionError("exp is empty")
+        return self.sum / self.count
+
+
+class StreamingRocAuc(StreamingMetric):
+    """
+    Area under the ROC curve computed from fixed-bin histograms
+    of the scores of the positive and negative examples,
+    one per column. Two examples in different bins are compared
+    exactly, two examples in the same bin count for one half.
+    Scores outside ``[low, high]`` fall in the first or last bin.
+    """
+
+    def __init__(self, average='micro', bins=4096, low=0., high=1., pos_label=1):
+        """
+        @param      average     ``'micro'`` or ``'macro'``,
+                                see @see fn roc_auc_scores
+        @param      bins        number of bins
+        @param      low         lower bound of the scores
+        @param      high        upper bound of the scores
+        @param      pos_label   positive label if the expected values
+                                are a vector and the predictions
+                                hold one score per row
+        """
+        if average not in ('micro', 'macro'):
+            raise ValueError("Unexpected average '{0}'.".format(average))
+        if high <= low:
+            raise ValueError("high must be greater than low.")
+        self.average = average
+        self.bins = bins
+        self.low = low
+        self.high = high
+        self.pos_label = pos_label
+        self.positives = None
+        self.negatives = None
+
+    def update(self, exp, val):
+        exp = _chunk_values(exp)
+        val = _chunk_values(val)
+        if len(val.shape) == 2 and len(exp.shape) == 1:
+            exp = one_hot(exp, val.shape)
+        else:
+            exp, val = reshape(exp, val)
+        mask = exp == 1 if len(exp.shape) == 2 else exp == self.pos_label
+        if len(val.shape) == 1:
+            val = val.reshape((-1, 1))
+            mask = mask.reshape((-1, 1))
+        ncol = val.shape[1]
+        if self.positives is None:
+            self.positives = numpy.zeros((ncol, self.bins), dtype=numpy.int64)
+            self.negatives = numpy.zeros((ncol, self.bins), dtype=numpy.int64)
+        elif self.positives.shape[0] != ncol:
+            raise ValueError("Every chunk must have {0} column(s) not {1}.".format(
+                self.positives.shape[0], ncol))
+        scale = self.bins / (self.high - self.low)
+        idx = numpy.floor((val - self.low) * scale)
+        numpy.clip(idx, 0, self.bins - 1, out=idx)
+        idx = idx.astype(numpy.int64) + numpy.arange(ncol) * self.bins
+        size = ncol * self.bins
+        self.positives += numpy.bincount(idx[mask], minlength=size).reshape((ncol, self.bins))
+        self.negatives += numpy.bincount(idx[~mask], minlength=size).reshape((ncol, self.bins))
+        return self
+
+    def merge(self, other):
+        self._check_merge(other)
+        if (other.bins, other.low, other.high) != (self.bins, self.low, self.high):
+            raise ValueError("Both metrics must use the same bins.")
+        if other.positives is None:
+            return self
+        if self.positives is None:
+            self.positives = other.positives.copy()
+            self.negatives = other.negatives.copy()
+        else:
+            self.positives += other.positives
+            self.negatives += other.negatives
+        return self
+
+    def _histograms(self):
+        if self.positives is None:
+            raise ValueError("No data.")
+        if self.average == 'micro':
+            return [(self.positives.sum(axis=0), self.negatives.sum(axis=0))]
+        return list(zip(self.positives, self.negatives))
+
+    @staticmethod
+    def _auc(pos, neg):
+        npos = pos.sum()
+        nneg = neg.sum()
+        if npos == 0 or nneg == 0:
+            raise ValueError("Only one class present in y_true. ROC AUC score "
+                             "is not defined in that case.")
+        pos = pos.astype(numpy.float64)
+        neg = neg.astype(numpy.float64)
+        below = numpy.cumsum(neg) - neg
+        total = float(npos) * float(nneg)
+        same = float(numpy.dot(pos, neg))
+        return (float(numpy.dot(pos, below)) + 0.5 * same) / total, 0.5 * same / total
+
+    def result(self):
+        return float(numpy.mean([self._auc(p, n)[0] for p, n in self._histograms()]))
+
+    def error_bound(self):
+        """
+        Returns a bound of the difference with the exact metric,
+        half the proportion of pairs (positive, negative) falling
+        in the same bin, averaged over the columns for *macro*.
+        """
+        return float(numpy.mean([self._auc(p, n)[1] for p, n in self._histograms()]))
+
+
+_streaming_metrics = {
+    'mse': StreamingMSE,
+    'l1_reg_max': StreamingL1RegMax,
+    'multi_label_jaccard': StreamingJaccard,
+    'roc_auc_score_micro': lambda **kw: StreamingRocAuc(average='micro', **kw),
+    'roc_auc_score_macro': lambda **kw: StreamingRocAuc(average='macro', **kw),
+}
+
+
+def streaming_metric(met, **kwargs):
+    """
+    Returns the streaming version of a metric.
+
+    @param      met         metric name, ``'mse'``, ``'l1_reg_max'``,
+                            ``'multi_label_jaccard'``, ``'roc_auc_score_micro'``,
+                            ``'roc_auc_score_macro'``
+    @param      kwargs      parameters given to the constructor
+    @return                 @see cl StreamingMetric
+    """
+    if met not in _streaming_metrics:
+        raise ValueError("No streaming version for metric '{0}', available: {1}".format(
+            met, list(sorted(_streaming_metrics))))
+    return _streaming_metrics[met](**kwargs)
+
+
+def iter_csv_chunks(exp, val, chunksize=2 ** 16, **kwargs):
+    """
+    Reads two files by chunks of rows and returns aligned chunks.
+    Both files must have the same number of rows in the same order.
+
+    @param      exp         filename or stream (expected values)
+    @param      val         filename or stream (predictions)
+    @param      chunksize   number of rows per chunk
+    @param      kwargs      parameters given to :epkg:`pandas:read_csv`
+    @return                 iterator on ``(exp chunk, val chunk)``
+    """
+    rexp = pandas.read_csv(exp, chunksize=chunksize, **kwargs)
+    rval = pandas.read_csv(val, chunksize=chunksize, **kwargs)
+    with rexp, rval:
+        for cexp in rexp:
+            cval = next(rval, None)
+            if cval is None or cval.shape[0] != cexp.shape[0]:
+                raise ValueError("Dimension mismatch, the predictions have less rows.")
+            yield cexp, cval
+        if next(rval, None) is not None:
+            raise ValueError("Dimension mismatch, the predictions have more rows.")
+
+
+def streaming_scores(metrics, chunks, **kwargs):
+    """
+    Computes several metrics on a sequence of chunks,
+    see @see fn streaming_metric.
+
+    @param      metrics     list of metric names
+    @param      chunks      iterator on ``(expected values, predictions)``,
+                            see @see fn iter_csv_chunks
+    @param      kwargs      parameters for the metrics, ``{metric: {...}}``
+    @return                 dictionary ``{metric: value}``
+    """
+    accs = {met: streaming_metric(met, **kwargs.get(met, {})) for met in metrics}
+    for exp, val in chunks:
+        for acc in accs.values():
+            acc.update(exp, val)
+    return {met: acc.result() for met, acc in accs.items()}
@@ -0,0 +1,163 @@
+"""
+@file
+@brief Parses a ``multipart/form-data`` body while it is received.
+
+:epkg:`tornado` parses a form once the whole body is in memory.
+@see cl MultipartStreamParser consumes the body chunk by chunk
+and returns events, the content of a part is never accumulated
+by the parser, only a tail shorter than the boundary is kept
+between two chunks.
+"""
+import re
+
+
+_disposition_param = re.compile(r';\s*([a-zA-Z0-9_*-]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)')
+
+
+def parse_boundary(content_type):
+    """
+    Extracts the boundary of a ``multipart/form-data`` content type.
+
+    @param      content_type    value of header *Content-Type*
+    @return                     boundary (bytes)
+    """
+    if content_type is None or not content_type.lower().startswith("multipart/form-data"):
+        raise ValueError("Content-Type must be multipart/form-data not '{0}'.".format(content_type))
+    params = dict((k.lower(), v) for k, v in _disposition_param.findall(content_type))
+    boundary = params.get('boundary', '').strip().strip('"')
+    if not boundary or len(boundary) > 70:
+        raise ValueError("Invalid boundary in '{0}'.".format(content_type))
+    return boundary.encode('latin-1')
+
+
+def parse_disposition(value):
+    """
+    Parses header *Content-Disposition* of a part.
+
+    @param      value       header value, ``form-data; name="..."; filename="..."``
+    @return                 dictionary of parameters
+    """
+    res = {}
+    for k, v in _disposition_param.findall(value):
+        v = v.strip()
+        if len(v) >= 2 and v[0] == v[-1] == '"':
+            v = v[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+        res[k.lower()] = v
+    return res
+
+
+class MultipartStreamParser:
+    """
+    Incremental parser for a ``multipart/form-data`` body.
+    Method @see me feed returns a list of events:
+
+    * ``('begin', name, filename, headers)``: a part starts,
+      *filename* is None for a simple field
+    * ``('data', bytes)``: content of the current part
+    * ``('end', )``: the current part is complete
+
+    ::
+
+        parser = MultipartStreamParser(parse_boundary(content_type))
+        for chunk in chunks:
+            for event in parser.feed(chunk):
+                ...
+        parser.close()
+    """
+
+    def __init__(self, boundary, max_header_size=2 ** 14, max_parts=16):
+        """
+        @param      boundary            boundary (bytes)
+        @param      max_header_size     maximum size of the headers of a part
+        @param      max_parts           maximum number of parts
+        """
+        self._delim = b"\r\n--" + boundary
+        # the body starts with the boundary, the first delimiter
+        # is the only one not preceded by a new line
+        self._buffer = bytearray(b"\r\n")
+        self._state = 'preamble'
+        self.max_header_size = max_header_size
+        self.max_parts = max_parts
+        self.parts = 0
+
+    @property
+    def done(self):
+        "Tells if the closing boundary was received."
+        return self._state == 'epilogue'
+
+    def feed(self, chunk):
+        """
+        Parses a chunk.
+
+        @param      chunk       bytes
+        @return                 list of events
+        """
+        buf = self._buffer
+        buf += chunk
+        events = []
+        delim = self._delim
+        keep = len(delim) - 1
+        while True:
+            if self._state == 'preamble':
+                idx = buf.find(delim)
+                if idx == -1:
+                    del buf[:-keep]
+                    break
+                del buf[:idx + len(delim)]
+                self._state = 'delimiter'
+            elif self._state == 'delimiter':
+                if len(buf) < 2:
+                    break
+                if buf[:2] == b"--":
+                    self._state = 'epilogue'
+                elif buf[:2] == b"\r\n":
+                    del buf[:2]
+                    self._state = 'headers'
+                else:
+                    raise ValueError("Malformed multipart body after a boundary.")
+            elif self._state == 'headers':
+                idx = buf.find(b"\r\n\r\n")
+                if idx == -1:
+                    if len(buf) > self.max_header_size:
+                        raise ValueError("Headers of a part are too long.")
+                    break
+                if idx > self.max_header_size:
+                    raise ValueError("Headers of a part are too long.")
+                self.parts += 1
+                if self.parts > self.max_parts:
+                    raise ValueError("Too many parts (> {0}).".format(self.max_parts))
+                headers = {}
+                for line in bytes(buf[:idx]).decode('utf-8', errors='replace').split("\r\n"):
+                    if ':' in line:
+                        k, v = line.split(':', 1)
+                        headers[k.strip().lower()] = v.strip()
+                del buf[:idx + 4]
+                disp = parse_disposition(headers.get('content-disposition', ''))
+                if 'name' not in disp:
+                    raise ValueError("A part has no name.")
+                events.append(('begin', disp['name'], disp.get('filename', None), headers))
+                self._state = 'body'
+            elif self._state == 'body':
+                idx = buf.find(delim)
+                if idx == -1:
+                    if len(buf) > keep:
+                        events.append(('data', bytes(buf[:-keep])))
+                        del buf[:-keep]
+                    break
+                if idx > 0:
+                    events.append(('data', bytes(buf[:idx])))
+                events.append(('end', ))
+                del buf[:idx + len(delim)]
+                self._state = 'delimiter'
+            else:
+                # epilogue, ignored
+                buf.clear()
+                break
+        return events
+
+    def close(self):
+        """
+        Checks the body was complete.
+        """
+        if self._state != 'epilogue':
+            raise ValueError("The multipart body is truncated.")
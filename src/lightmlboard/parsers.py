@@ -0,0 +1,175 @@
+"""
+@file
+@brief Parses the predictions uploaded by the players.
+"""
+import csv
+import io
+import json
+import time
+import numpy
+import pandas
+
+
+class PredictionSchema:
+    """
+    Declares the expected format of a submission:
+    a :epkg:`CSV` file with a header, *columns* columns,
+    every value of type *dtype*, at most *max_bytes* bytes.
+    """
+
+    _dtypes = {'float64', 'float32', 'int64', 'int32'}
+
+    def __init__(self, columns=None, dtype='float64', names=None, max_bytes=None):
+        """
+        @param      columns     expected number of columns, None for any
+        @param      dtype       type of the values, ``'float64'``, ``'float32'``,
+                                ``'int64'`` or ``'int32'``
+        @param      names       expected column names, None for any
+        @param      max_bytes   maximum size of a submission, None for the limit
+                                of the application (option *upload_max_bytes*)
+        """
+        if dtype not in PredictionSchema._dtypes:
+            raise ValueError("dtype must be in {0} not '{1}'.".format(
+                list(sorted(PredictionSchema._dtypes)), dtype))
+        if names is not None:
+            names = list(names)
+            if columns is None:
+                columns = len(names)
+            elif columns != len(names):
+                raise ValueError("columns={0} but {1} names.".format(columns, len(names)))
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("max_bytes must be positive not {0}.".format(max_bytes))
+        self.columns = columns
+        self.dtype = dtype
+        self.names = names
+        self.max_bytes = max_bytes
+
+    def __eq__(self, other):
+        return isinstance(other, PredictionSchema) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return "PredictionSchema(columns={0!r}, dtype={1!r}, names={2!r}, max_bytes={3!r})".format(
+            self.columns, self.dtype, self.names, self.max_bytes)
+
+    def to_dict(self):
+        """
+        Returns the schema as a dictionary.
+        """
+        return dict(columns=self.columns, dtype=self.dtype, names=self.names,
+                    max_bytes=self.max_bytes)
+
+    def to_json(self):
+        """
+        Returns the schema as a :epkg:`JSON` string.
+        """
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    @staticmethod
+    def load(schema):
+        """
+        Builds a schema.
+
+        @param      schema      None, @see cl PredictionSchema, dictionary or JSON string
+        @return                 @see cl PredictionSchema or None
+        """
+        if schema is None or isinstance(schema, PredictionSchema):
+            return schema
+        if isinstance(schema, str):
+            if len(schema) == 0:
+                return None
+            schema = json.loads(schema)
+        if isinstance(schema, dict):
+            return PredictionSchema(**schema)
+        raise TypeError("Unexpected type for a schema: {0}".format(type(schema)))
+
+    def check_header(self, names):
+        """
+        Raises an exception if the header does not follow the schema.
+
+        @param      names       column names
+        """
+        if self.columns is not None and len(names) != self.columns:
+            raise ValueError("The submission must have {0} column(s) not {1}: {2}".format(
+                self.columns, len(names), names))
+        if self.names is not None and list(names) != self.names:
+            raise ValueError("The submission must have columns {0} not {1}".format(
+                self.names, names))
+
+
+def _read_header(buffer):
+    """
+    Returns the column names of the first line of a file.
+    """
+    line = buffer.readline()
+    buffer.seek(0)
+    if isinstance(line, bytes):
+        try:
+            line = line.decode('utf-8-sig')
+        except UnicodeDecodeError as e:
+            raise ValueError("The submission is not encoded in utf-8.") from e
+    line = line.strip()
+    if len(line) == 0:
+        raise ValueError("The submission is empty.")
+    return [c.strip().strip('"') for c in line.split(',')]
+
+
+def _check_first_row(buffer, names):
+    """
+    Raises an exception if the first row has more values than the header.
+    :epkg:`pandas` would use the first values as an index (or drop the last ones
+    with ``index_col=False``), the next rows are checked by the parser.
+    A trailing delimiter is accepted.
+    """
+    buffer.readline()
+    line = buffer.readline()
+    buffer.seek(0)
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', errors='replace')
+    fields = next(csv.reader([line]), [])
+    if len(fields) > len(names) and any(f.strip() for f in fields[len(names):]):
+        raise ValueError("The first row has {0} values but the header has {1} columns.".format(
+            len(fields), len(names)))
+
+
+def parse_predictions(data, schema=None):
+    """
+    Parses the predictions of a submission.
+    Bytes are given to the :epkg:`pandas` parser without being decoded
+    and every column is read with the type declared by the schema,
+    without any type inference. If that fails (missing values
+    in an integer column, text...), the file is read again
+    with the default type inference.
+
+    @param      data        bytes or str (CSV with a header)
+    @param      schema      @see cl PredictionSchema or anything
+                            @see me load accepts, None for a float schema
+                            accepting any number of columns
+    @return                 dataframe, dictionary with keys *method*
+                            (``'typed'`` or ``'pandas'``), *parse_time* (seconds),
+                            *rows*, *columns*, *nbytes*
+    """
+    begin = time.perf_counter()
+    schema = PredictionSchema.load(schema) or PredictionSchema()
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        buffer = io.BytesIO(data)
+    elif isinstance(data, str):
+        buffer = io.StringIO(data)
+    else:
+        raise TypeError("data must be bytes or str not {0}".format(type(data)))
+    names = _read_header(buffer)
+    schema.check_header(names)
+    _check_first_row(buffer, names)
+    try:
+        df = pandas.read_csv(buffer, dtype=numpy.dtype(schema.dtype), engine='c', index_col=False)
+        method = 'typed'
+    except (ValueError, TypeError):
+        buffer.seek(0)
+        df = pandas.read_csv(buffer, index_col=False)
+        method = 'pandas'
+    if df.shape[1] != len(names):
+        raise ValueError("Unable to parse the submission, {0} columns expected not {1}.".format(
+            len(names), df.shape[1]))
+    info = dict(method=method, parse_time=time.perf_counter() - begin,
+                rows=df.shape[0], columns=df.shape[1],
+                nbytes=int(df.memory_usage(index=False).sum()))
+    return df, info
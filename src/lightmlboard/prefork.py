@@ -0,0 +1,205 @@
+"""
+@file
+@brief Runs the application in several processes.
+
+:epkg:`tornado` provides ``fork_processes`` but the parent
+process only waits for its children: it does not forward signals
+and cannot restart the children one after another.
+@see cl PreforkSupervisor forks the processes sharing the listening
+sockets and keeps them running:
+
+* *SIGTERM*, *SIGINT*: the children are asked to stop (*SIGTERM*),
+  they finish the requests in progress, *SIGKILL* is sent
+  if they are still running after *timeout* seconds
+* *SIGHUP*: the children are restarted one after another,
+  the others keep serving the requests
+* a child which stops unexpectedly is replaced
+"""
+import logging
+import os
+import signal
+import time
+
+
+class PreforkSupervisor:
+    """
+    Forks and supervises the processes of the application.
+
+    ::
+
+        sockets = bind_sockets(port)
+        task_id = PreforkSupervisor(4).start()
+        if task_id is None:
+            # parent process, every child stopped
+            return
+        # child process
+        server = HTTPServer(app)
+        server.add_sockets(sockets)
+        IOLoop.current().start()
+    """
+
+    _signals = ('SIGTERM', 'SIGINT', 'SIGHUP')
+
+    def __init__(self, processes, on_exit=None, max_restarts=100, timeout=30.,
+                 interval=0.1):
+        """
+        @param      processes       number of processes, 0 or None
+                                    for the number of CPUs
+        @param      on_exit         function called in the parent process
+                                    with the process id of a stopped child
+        @param      max_restarts    every child is stopped if the children
+                                    stopped unexpectedly more than *max_restarts* times
+        @param      timeout         a child is killed if it is still running
+                                    *timeout* seconds after it was asked to stop
+        @param      interval        period in seconds used by the parent
+                                    to check its children
+        """
+        if not processes:
+            processes = os.cpu_count() or 1
+        if processes < 1:
+            raise ValueError("processes must be positive not {0}.".format(processes))
+        self.processes = processes
+        self.on_exit = on_exit
+        self.max_restarts = max_restarts
+        self.timeout = timeout
+        self.interval = interval
+        self.restarts = 0
+        self._children = {}
+        self._stopping = False
+        self._reload = False
+        self._to_restart = []
+        self._restarting = None
+        self._parent = None
+        self._log = logging.getLogger("lightmlboard")
+
+    @property
+    def children(self):
+        "Returns the process ids of the children."
+        return list(self._children)
+
+    def start(self):
+        """
+        Forks the processes. The function returns the task id
+        (between 0 and *processes - 1*) in a child process,
+        it returns None in the parent process once every child stopped.
+        """
+        if not hasattr(os, 'fork'):
+            raise NotImplementedError("Several processes require os.fork.")
+        self._parent = os.getpid()
+        previous = {name: signal.signal(getattr(signal, name), self._on_signal)
+                    for name in PreforkSupervisor._signals}
+        try:
+            for task_id in range(self.processes):
+                if self._spawn(task_id):
+                    return task_id
+            return self._supervise()
+        finally:
+            if os.getpid() == self._parent:
+                for name, handler in previous.items():
+                    signal.signal(getattr(signal, name), handler)
+
+    def _spawn(self, task_id):
+        """
+        Forks a child, returns True in the child.
+        """
+        pid = os.fork()
+        if pid == 0:
+            # The parent forwards the signals, a child ignores
+            # the ones sent to the whole group by a terminal.
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            self._children = {}
+            self._stopping = False
+            return True
+        self._children[pid] = [task_id, None]
+        self._log.info("[PreforkSupervisor] started process {0} (task {1})".format(pid, task_id))
+        return False
+
+    def _on_signal(self, signum, frame):  # pylint: disable=W0613
+        if signum == signal.SIGHUP:
+            self._reload = True
+        else:
+            self.stop()
+
+    def stop(self):
+        """
+        Asks every child to stop, it must be called in the parent process.
+        """
+        self._stopping = True
+        for pid in list(self._children):
+            self._kill(pid, signal.SIGTERM)
+
+    def _kill(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+        child = self._children.get(pid, None)
+        if child is not None:
+            child[1] = (time.monotonic() + self.timeout
+                        if signum == signal.SIGTERM and child[1] is None else float('inf'))
+
+    def _reap(self):
+        """
+        Returns the process id and the status of a stopped child,
+        ``(0, 0)`` if every child is running.
+        """
+        try:
+            return os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            # the children were collected by somebody else
+            return next(iter(self._children)), 0
+
+    def _supervise(self):
+        """
+        Supervises the children until all of them stopped.
+        Returns a task id if a child was restarted (in the child),
+        None in the parent.
+        """
+        while self._children:
+            pid, status = self._reap()
+            if pid in self._children:
+                task_id, _ = self._children.pop(pid)
+                if self.on_exit is not None:
+                    try:
+                        self.on_exit(pid)
+                    except Exception as e:  # pylint: disable=W0703
+                        self._log.exception("[PreforkSupervisor] on_exit failed: {0}".format(e))
+                if self._stopping:
+                    continue
+                if pid == self._restarting:
+                    self._restarting = None
+                else:
+                    self.restarts += 1
+                    self._log.warning("[PreforkSupervisor] process {0} (task {1}) stopped "
+                                      "unexpectedly with status {2}".format(pid, task_id, status))
+                    if self.restarts > self.max_restarts:
+                        self._log.error("[PreforkSupervisor] too many restarts, stopping.")
+                        self.stop()
+                        continue
+                if self._spawn(task_id):
+                    return task_id
+                if self._stopping:
+                    # a signal was received while forking
+                    self.stop()
+                continue
+
+            now = time.monotonic()
+            if self._reload:
+                self._reload = False
+                if not self._stopping:
+                    self._to_restart = list(self._children)
+            if not self._stopping and self._restarting is None:
+                while self._to_restart:
+                    old = self._to_restart.pop(0)
+                    if old in self._children:
+                        self._restarting = old
+                        self._kill(old, signal.SIGTERM)
+                        break
+            for child, (_, deadline) in list(self._children.items()):
+                if deadline is not None and deadline < now:
+                    self._log.warning("[PreforkSupervisor] process {0} killed".format(child))
+                    self._kill(child, signal.SIGKILL)
+            time.sleep(self.interval)
+        return None
@@ -0,0 +1,198 @@
+"""
+@file
+@brief Binary storage of arrays in a database.
+
+A blob starts with a magic number, the length of a
+:epkg:`JSON` header (4 bytes, little-endian) and the header itself
+(dtype, shape, column names, compression). It is followed by
+the raw little-endian bytes of the array, compressed or not.
+The header is padded so that the data starts on a multiple of 8 bytes.
+"""
+import hashlib
+import json
+import lzma
+import struct
+import zlib
+import numpy
+import pandas
+
+
+_MAGIC = b"LMBA"
+_COMPRESSIONS = {
+    None: (lambda b: b, lambda b: b),
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+}
+
+
+def is_blob(values):
+    """
+    Tells if *values* was produced by @see fn array_to_blob.
+    """
+    return (isinstance(values, (bytes, bytearray, memoryview)) and
+            bytes(values[:len(_MAGIC)]) == _MAGIC)
+
+
+def can_store_binary(df):
+    """
+    Tells if a dataframe can be stored with @see fn array_to_blob,
+    every column must be numerical or boolean.
+    """
+    return all(dt.kind in 'biuf' for dt in df.dtypes)
+
+
+def array_to_blob(values, compression=None):
+    """
+    Serializes an array or a dataframe into bytes.
+
+    @param      values          :epkg:`numpy:array` or :epkg:`pandas:DataFrame`
+    @param      compression     None, ``'zlib'`` or ``'lzma'``
+    @return                     bytes
+    """
+    if compression not in _COMPRESSIONS:
+        raise ValueError("Unknown compression '{0}', expected one of {1}.".format(
+            compression, list(sorted(filter(None, _COMPRESSIONS)))))
+    columns = None
+    if isinstance(values, pandas.DataFrame):
+        if not can_store_binary(values):
+            raise TypeError("Binary storage only supports numerical columns not {0}".format(
+                list(values.dtypes)))
+        columns = [str(c) for c in values.columns]
+        values = values.values
+    if not isinstance(values, numpy.ndarray):
+        raise TypeError("values must be an array not {0}".format(type(values)))
+    if values.dtype.kind not in 'biuf':
+        raise TypeError("Binary storage only supports numerical arrays not {0}".format(
+            values.dtype))
+    values = numpy.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<'))
+    header = dict(dtype=values.dtype.str, shape=list(values.shape),
+                  columns=columns, compression=compression)
+    header = json.dumps(header).encode('ascii')
+    pad = (-len(_MAGIC) - 4 - len(header)) % 8
+    header += b" " * pad
+    data = _COMPRESSIONS[compression][0](values.tobytes())
+    return b"".join([_MAGIC, struct.pack("<I", len(header)), header, data])
+
+
+def blob_to_array(blob):
+    """
+    Deserializes bytes produced by @see fn array_to_blob.
+    The array is a read-only view on *blob* (no copy)
+    if the data is not compressed.
+
+    @param      blob        bytes
+    @return                 array, column names (or None)
+    """
+    if not is_blob(blob):
+        raise ValueError("blob was not produced by array_to_blob.")
+    begin = len(_MAGIC) + 4
+    size = struct.unpack("<I", bytes(blob[len(_MAGIC):begin]))[0]
+    header = json.loads(bytes(blob[begin:begin + size]).decode('ascii'))
+    compression = header['compression']
+    if compression not in _COMPRESSIONS:
+        raise ValueError("Unknown compression '{0}'.".format(compression))
+    dtype = numpy.dtype(header['dtype'])
+    shape = tuple(header['shape'])
+    if compression is None:
+        arr = numpy.frombuffer(blob, dtype=dtype, offset=begin + size,
+                               count=int(numpy.prod(shape)))
+    else:
+        data = _COMPRESSIONS[compression][1](blob[begin + size:])
+        arr = numpy.frombuffer(data, dtype=dtype)
+    return arr.reshape(shape), header['columns']
+
+
+def payload_key(data):
+    """
+    Returns the key of a payload in a content-addressed store,
+    the :epkg:`SHA-256` of its bytes.
+
+    @param      data        str (encoded in utf-8) or bytes
+    @return                 hexadecimal string
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def compress_payload(data, compression='zlib'):
+    """
+    Compresses a payload.
+
+    @param      data            str (encoded in utf-8) or bytes
+    @param      compression     None, ``'zlib'`` or ``'lzma'``
+    @return                     bytes
+    """
+    if compression not in _COMPRESSIONS:
+        raise ValueError("Unknown compression '{0}'.".format(compression))
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return _COMPRESSIONS[compression][0](data)
+
+
+_STREAM_COMPRESSORS = {
+    None: None,
+    'zlib': zlib.compressobj,
+    'lzma': lzma.LZMACompressor,
+}
+
+
+def compress_stream(stream, compression='zlib', chunk_size=2 ** 20):
+    """
+    Compresses the content of a file object chunk by chunk,
+    the result is the same as @see fn compress_payload
+    but the uncompressed content is never entirely in memory.
+
+    @param      stream          file object opened in binary mode
+    @param      compression     None, ``'zlib'`` or ``'lzma'``
+    @param      chunk_size      size of the chunks
+    @return                     bytes, size of the uncompressed content
+    """
+    if compression not in _STREAM_COMPRESSORS:
+        raise ValueError("Unknown compression '{0}'.".format(compression))
+    comp = None if compression is None else _STREAM_COMPRESSORS[compression]()
+    parts = []
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        parts.append(chunk if comp is None else comp.compress(chunk))
+    if comp is not None:
+        parts.append(comp.flush())
+    return b"".join(parts), size
+
+
+def stream_key(stream, chunk_size=2 ** 20):
+    """
+    Same as @see fn payload_key for a file object,
+    the stream is read until the end and moved back
+    to its original position.
+
+    @param      stream          file object opened in binary mode
+    @param      chunk_size      size of the chunks
+    @return                     hexadecimal string
+    """
+    pos = stream.tell()
+    h = hashlib.sha256()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        h.update(chunk)
+    stream.seek(pos)
+    return h.hexdigest()
+
+
+def decompress_payload(blob, compression='zlib'):
+    """
+    Decompresses a payload compressed by @see fn compress_payload.
+
+    @param      blob            bytes
+    @param      compression     None, ``'zlib'`` or ``'lzma'``
+    @return                     bytes
+    """
+    if compression not in _COMPRESSIONS:
+        raise ValueError("Unknown compression '{0}'.".format(compression))
+    return _COMPRESSIONS[compression][1](blob)